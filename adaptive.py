@@ -0,0 +1,247 @@
+from models import ItemStatistic
+from grading import grading_engine, bank_version
+from bisect import bisect_left
+import numpy as np
+import threading
+import logging
+import random
+import math
+
+logger = logging.getLogger(__name__)
+
+# Ability grid for EAP estimation and the precomputed item tables
+THETA_GRID = np.round(np.arange(-4.0, 4.0001, 0.05), 2)
+LOG_PRIOR = -0.5 * THETA_GRID ** 2  # standard normal, up to a constant
+
+# Neighbours by difficulty considered on each side of the current ability
+CANDIDATE_WINDOW = 6
+
+
+# --- ITEM GENERATORS ---
+def _options(rng, answer, distractors):
+    options = [str(answer)] + [str(d) for d in dict.fromkeys(distractors) if str(d) != str(answer)][:2]
+    rng.shuffle(options)
+    return options
+
+
+def _gen_facts(rng):
+    op = rng.choice(['+', '-', '×', '/'])
+    size = rng.choice([10, 20, 50, 100])
+    a, b = rng.randint(1, size), rng.randint(1, min(size, 12) if op in '×/' else size)
+    if op == '+':
+        answer = a + b
+    elif op == '-':
+        a, b = max(a, b), min(a, b)
+        answer = a - b
+    elif op == '×':
+        answer = a * b
+    else:
+        a, answer = a * b, a
+    difficulty = {'+': -1.5, '-': -1.0, '×': 0.0, '/': 0.5}[op] + math.log10(max(a, b)) - 1
+    item = {'q': f'{a} {op} {b} = ?', 'options': _options(rng, answer, [answer + 1, answer - 1, answer + 10]), 'a': str(answer)}
+    return item, difficulty
+
+
+def _gen_magnitude(rng):
+    digits = rng.randint(1, 4)
+    a = rng.randint(10 ** (digits - 1), 10 ** digits - 1)
+    gap = max(1, int(a * rng.choice([0.02, 0.1, 0.5])))
+    b = a + gap if rng.random() < 0.5 else max(0, a - gap)
+    if a == b:
+        b = a + 1
+    larger = rng.random() < 0.5
+    word = 'larger' if larger else 'smaller'
+    answer = max(a, b) if larger else min(a, b)
+    difficulty = digits - 2.5 - math.log10(gap / max(a, b) + 1e-3) * 0.5 - 1
+    return {'q': f'Which is {word}: {a} or {b}?', 'options': [str(a), str(b)], 'a': str(answer)}, difficulty
+
+
+def _gen_sequencing(rng):
+    if rng.random() < 0.7:
+        start, step = rng.randint(0, 60), rng.choice([1, 2, 3, 4, 5, 10, -1, -2, -3, -5])
+        terms = [start + step * i for i in range(4)]
+        difficulty = -1.5 + (0.5 if step < 0 else 0) + (0.5 if abs(step) in (3, 4) else 0) + start / 60
+        nxt = terms[-1] + step
+        distractors = [nxt + 1, nxt - step]
+    else:
+        start, ratio = rng.randint(1, 10), rng.choice([2, 3])
+        terms = [start * ratio ** i for i in range(4)]
+        difficulty = 1.0 + (0.5 if ratio == 3 else 0)
+        nxt = terms[-1] * ratio
+        distractors = [terms[-1] + (terms[-1] - terms[-2]), nxt + ratio]
+    q = ', '.join(str(t) for t in terms) + ', ?'
+    return {'q': q, 'options': _options(rng, nxt, distractors), 'a': str(nxt)}, difficulty
+
+
+def _gen_estimation(rng):
+    a, b = rng.randint(10, 99), rng.randint(10, 99)
+    if rng.random() < 0.5:
+        exact, q = a + b, f'{a} + {b} is approximately?'
+    else:
+        a, b = max(a, b), min(a, b)
+        exact, q = a - b, f'{a} - {b} is approximately?'
+    answer = (exact + 5) // 10 * 10  # halves round up; round() would send 25 to 20 but 35 to 40
+    closeness = abs(exact - answer)  # near a 5 boundary is harder
+    difficulty = -0.5 + closeness * 0.3
+    return {'q': q, 'options': _options(rng, answer, [answer + 10, answer - 10]), 'a': str(answer)}, difficulty
+
+
+def _gen_memory(rng):
+    length = rng.randint(2, 7)
+    digits = [rng.randint(0, 9) for _ in range(length)]
+    position = rng.randrange(length)
+    names = {0: 'first', length - 1: 'last'}
+    which = names.get(position, f'digit number {position + 1}')
+    answer = digits[position]
+    others = [d for d in digits if d != answer] + [(answer + 1) % 10]
+    q = f"Recall: {', '.join(map(str, digits))}. What is the {which}?"
+    difficulty = (length - 4) * 0.6 + (0 if position in names else 0.5)
+    return {'q': q, 'options': _options(rng, answer, others), 'a': str(answer)}, difficulty
+
+
+GENERATORS = {
+    'facts': _gen_facts,
+    'magnitude': _gen_magnitude,
+    'sequencing': _gen_sequencing,
+    'estimation': _gen_estimation,
+    'memory': _gen_memory
+}
+
+
+# --- ITEM POOL ---
+class ItemPool:
+    """Items for one module with precomputed 2PL tables over THETA_GRID.
+
+    `log_p`/`log_q` hold log P(correct)/log P(incorrect) per (item, theta)
+    so an ability update is a vector add, and `info` holds Fisher
+    information for selection. `by_difficulty` orders item indices by b for
+    a bisect lookup around the current ability. `version` identifies the
+    pool's answer key and is stored with adaptive results.
+    """
+
+    def __init__(self, module, items, difficulties, discriminations):
+        self.module = module
+        self.items = items
+        self.version = bank_version(items)
+        self.index = {item['id']: i for i, item in enumerate(items)}
+        self.b = np.asarray(difficulties, dtype=np.float64)
+        self.a = np.asarray(discriminations, dtype=np.float64)
+
+        logits = self.a[:, np.newaxis] * (THETA_GRID[np.newaxis, :] - self.b[:, np.newaxis])
+        p = 1.0 / (1.0 + np.exp(-logits))
+        self.log_p = np.log(p)
+        self.log_q = np.log1p(-p)
+        self.info = self.a[:, np.newaxis] ** 2 * p * (1 - p)
+
+        self.by_difficulty = np.argsort(self.b, kind='stable')
+        self.sorted_b = self.b[self.by_difficulty].tolist()
+
+    def __len__(self):
+        return len(self.items)
+
+    def estimate(self, administered, responses):
+        """EAP ability estimate and posterior SD after the given responses"""
+        log_post = LOG_PRIOR.copy()
+        for item, correct in zip(administered, responses):
+            log_post += self.log_p[item] if correct else self.log_q[item]
+        post = np.exp(log_post - log_post.max())
+        post /= post.sum()
+        theta = float(post @ THETA_GRID)
+        se = float(math.sqrt(post @ (THETA_GRID - theta) ** 2))
+        return theta, se
+
+    def select(self, theta, administered, rng=random):
+        """Most informative unused item among the nearest difficulties to theta"""
+        used = set(administered)
+        grid_index = int(np.clip(np.rint((theta - THETA_GRID[0]) / 0.05), 0, len(THETA_GRID) - 1))
+        centre = bisect_left(self.sorted_b, theta)
+
+        candidates = []
+        left, right = centre - 1, centre
+        while len(candidates) < 2 * CANDIDATE_WINDOW and (left >= 0 or right < len(self.sorted_b)):
+            for position in (left, right):
+                if 0 <= position < len(self.sorted_b):
+                    item = int(self.by_difficulty[position])
+                    if item not in used:
+                        candidates.append(item)
+            left -= 1
+            right += 1
+        if not candidates:
+            return None
+
+        # Pick among the top few so the same item is not shown to everyone at the same ability
+        candidates.sort(key=lambda i: self.info[i, grid_index], reverse=True)
+        return rng.choice(candidates[:3])
+
+
+class AdaptiveEngine:
+    """Item pools for computerized adaptive testing, built from QUESTION_BANKS plus generated items"""
+
+    def __init__(self):
+        self.pool_size = 500
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Calibrate bank items from item statistics once the tables exist"""
+        with app.app_context():
+            self.calibrate()
+
+    def load(self, banks, pool_size=None, calibration=None):
+        """Build every pool; `calibration` maps (module, bank index) -> difficulty"""
+        if pool_size is not None:
+            self.pool_size = pool_size
+        calibration = calibration or {}
+        pools = {}
+        for module, questions in banks.items():
+            items, difficulties, discriminations = [], [], []
+            for index, question in enumerate(questions):
+                items.append({'id': f'{module}:b{index}', **question})
+                difficulties.append(calibration.get((module, index), 0.0))
+                discriminations.append(1.0)
+            generator = GENERATORS.get(module)
+            if generator is not None:
+                rng = random.Random(f'{module}-pool')
+                seen = {q['q'] for q in questions}
+                # Bounded so a generator with a small item space cannot spin forever
+                for _ in range(self.pool_size * 20):
+                    if len(items) >= self.pool_size + len(questions):
+                        break
+                    question, difficulty = generator(rng)
+                    if question['q'] in seen:
+                        continue
+                    seen.add(question['q'])
+                    items.append({'id': f'{module}:g{len(items)}', **question})
+                    difficulties.append(float(np.clip(difficulty, -3.5, 3.5)))
+                    discriminations.append(1.0)
+            pools[module] = ItemPool(module, items, difficulties, discriminations)
+        with self._lock:
+            self._banks = banks
+            self._pools = pools
+        logger.info(f"Adaptive pools: {', '.join(f'{m}={len(p)}' for m, p in pools.items())}")
+
+    def calibrate(self):
+        """Re-derive bank item difficulties from observed p-values (Rasch: b = ln((1 - p) / p))"""
+        banks = getattr(self, '_banks', None)
+        if not banks:
+            return
+        calibration = {}
+        for module in banks:
+            key = grading_engine.key(module)
+            if key is None:
+                continue
+            stats = ItemStatistic.query.filter_by(module_name=module, answer_key_version=key.version).all()
+            for stat in stats:
+                if stat.presented >= 30:
+                    p = min(max(stat.correct / stat.presented, 0.02), 0.98)
+                    calibration[(module, stat.item_index)] = math.log((1 - p) / p)
+        self.load(banks, calibration=calibration)
+
+    def pool(self, module):
+        return self._pools.get(module)
+
+    def modules(self):
+        return sorted(self._pools)
+
+
+adaptive_engine = AdaptiveEngine()
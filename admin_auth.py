@@ -0,0 +1,21 @@
+from flask import request, jsonify, current_app
+from functools import wraps
+import hmac
+
+
+def token_required(config_key, header='X-Admin-Token'):
+    """Guard an operator endpoint with a shared secret from app config.
+
+    The endpoint answers 403 unless `header` matches the configured value;
+    it is effectively disabled while the config value is unset.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            expected = current_app.config.get(config_key)
+            supplied = request.headers.get(header, '')
+            if not expected or not hmac.compare_digest(expected, supplied):
+                return jsonify({'error': f'{header} missing or invalid'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,195 @@
+from flask import request, jsonify, g
+from collections import OrderedDict
+from urllib.parse import urlparse
+import threading
+import logging
+import math
+import time
+
+try:
+    import redis
+except ImportError:  # optional; only needed for RATE_LIMIT_STORAGE_URL=redis://...
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Health checks, metrics scrapes and static files are never limited or counted against a budget
+EXEMPT_ENDPOINTS = frozenset({'health', 'metrics', 'serve_html', 'static', 'static_asset'})
+
+
+def parse_rate(text):
+    """'10/minute' -> (tokens per second, burst); the burst is the count itself"""
+    count, _, period = text.partition('/')
+    count = int(count)
+    return count / PERIODS[period.strip().rstrip('s')], count
+
+
+# --- TOKEN BUCKET BACKENDS ---
+class MemoryBackend:
+    """Token buckets in this process, evicting the least recently used keys beyond `max_keys`"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """Remove `cost` tokens if available; returns 0 when allowed, else seconds until it would be.
+
+        `cost=0` only checks that at least one token is left.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            needed = max(cost, 1)
+            allowed = tokens >= needed
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (needed - tokens) / rate
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class RedisBackend:
+    """Token buckets shared by every worker through Redis, updated atomically by a Lua script"""
+
+    SCRIPT = """
+    local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local needed = math.max(cost, 1)
+    local allowed = tokens >= needed
+    if allowed then tokens = tokens - cost end
+    redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    if allowed then return '0' end
+    return tostring((needed - tokens) / rate)
+    """
+
+    def __init__(self, url, prefix='numskill:rl:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL points at Redis but the redis package is not installed')
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        return float(self._script(keys=[self.prefix + key], args=[rate, burst, time.time(), cost]))
+
+    def reset(self, key):
+        self._client.delete(self.prefix + key)
+
+
+def backend_from_url(url):
+    """memory:// (default, per process) or redis://host:port/db (shared across workers)"""
+    scheme = urlparse(url or 'memory://').scheme
+    if scheme == 'memory':
+        return MemoryBackend()
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisBackend(url)
+    raise ValueError(f'Unsupported RATE_LIMIT_STORAGE_URL: {url}')
+
+
+def too_many_requests(retry_after, message='Too many requests'):
+    """Fast 429 telling the client when to retry"""
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+
+# --- ADMISSION CONTROL ---
+class AdmissionControl:
+    """Request rate limits and per-class concurrency budgets.
+
+    Rate limits are token buckets named in RATE_LIMITS ('N/period') and keyed
+    by client IP or account. Concurrency budgets cap in-flight requests per
+    endpoint class (CONCURRENCY_BUDGETS) so bcrypt-heavy auth traffic cannot
+    crowd out score submissions; a request over budget is refused at once.
+    Behind TRUSTED_PROXIES reverse proxies the client IP is read from
+    X-Forwarded-For, counting that many entries from the right.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trusted_proxies = 0
+        self.backend = MemoryBackend()
+        self.limits = {}
+        self._budgets = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.trusted_proxies = int(app.config.get('TRUSTED_PROXIES', self.trusted_proxies))
+        self.backend = backend_from_url(app.config.get('RATE_LIMIT_STORAGE_URL'))
+        self.limits = {name: parse_rate(rate) for name, rate in (app.config.get('RATE_LIMITS') or {}).items()}
+        self._budgets = {name: threading.BoundedSemaphore(size)
+                         for name, size in (app.config.get('CONCURRENCY_BUDGETS') or {}).items()}
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    def client_ip(self):
+        """The requesting client's address; entries left of the trusted proxies' could be forged"""
+        if self.trusted_proxies:
+            forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr or 'unknown'
+
+    def hit(self, name, key, cost=1):
+        """Charge the `name` bucket for `key`; returns 0 if allowed, else seconds to wait"""
+        if not self.enabled or name not in self.limits:
+            return 0
+        rate, burst = self.limits[name]
+        return self.backend.take(f'{name}:{key}', rate, burst, cost)
+
+    def check(self, name, key):
+        """Like hit() but without spending a token"""
+        return self.hit(name, key, cost=0)
+
+    def reset(self, name, key):
+        self.backend.reset(f'{name}:{key}')
+
+    @staticmethod
+    def endpoint_class():
+        """auth (runs bcrypt), bulk (operator imports/exports), write or read"""
+        endpoint = request.endpoint or ''
+        if endpoint in ('auth.login', 'auth.register'):
+            return 'auth'
+        if endpoint.startswith(('export.', 'onboarding.')):
+            return 'bulk'
+        return 'write' if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') else 'read'
+
+    def _admit(self):
+        if not self.enabled or request.method == 'OPTIONS' or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        endpoint_class = self.endpoint_class()
+
+        retry_after = self.hit(f'{endpoint_class}_ip', self.client_ip())
+        if retry_after:
+            logger.warning(f"Rate limited {endpoint_class} request from {self.client_ip()}")
+            return too_many_requests(retry_after)
+
+        budget = self._budgets.get(endpoint_class)
+        if budget is not None:
+            if not budget.acquire(blocking=False):
+                return too_many_requests(1, f'Server busy with {endpoint_class} requests, retry shortly')
+            g.admission_budget = budget
+        return None
+
+    @staticmethod
+    def _release(exc=None):
+        budget = g.pop('admission_budget', None)
+        if budget is not None:
+            budget.release()
+
+
+admission = AdmissionControl()
@@ -0,0 +1,200 @@
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from models import db, AssessmentScore, CandidateProfile, CohortNorm, JobWatermark
+from tenancy import tenant_router
+from datetime import datetime, timedelta
+import numpy as np
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+BINS = 101  # whole percentages 0..100
+
+# job_watermarks row whose updated_at is the time of the last recompute
+LEASE = 'cohort_norms'
+
+
+def _claim(min_age):
+    """Take the lease if the last recompute is at least `min_age` seconds old.
+
+    The conditional UPDATE is atomic, so of several workers whose timers fire
+    together exactly one wins, and the row stays locked until commit, so a
+    concurrent run (say from the CLI) waits instead of racing the delete + insert.
+    """
+    now = datetime.utcnow()
+    claim = update(JobWatermark).where(
+        JobWatermark.name == LEASE, JobWatermark.updated_at <= now - timedelta(seconds=min_age)
+    ).values(updated_at=now)
+    if db.session.execute(claim).rowcount == 1:
+        return True
+    if db.session.get(JobWatermark, LEASE) is not None:
+        return False
+    try:
+        with db.session.begin_nested():
+            db.session.add(JobWatermark(name=LEASE, last_id=0, updated_at=datetime(1970, 1, 1)))
+    except IntegrityError:
+        pass  # another worker created it first
+    return db.session.execute(claim).rowcount == 1
+
+
+def compute_norms(if_older_than=0):
+    """Recompute every (module, age) distribution from each child's latest attempt.
+
+    One query per shard pulls the latest percentage per (user, module) with
+    the child's age; histograms for all cohorts come from a single NumPy bincount.
+    With `if_older_than` (seconds) nothing happens and None is returned unless
+    the last recompute, by any worker, is at least that old.
+    """
+    if not _claim(if_older_than):
+        db.session.rollback()
+        return None
+
+    latest = db.session.query(
+        func.max(AssessmentScore.id).label('id')
+    ).group_by(AssessmentScore.user_id, AssessmentScore.module_name).subquery()
+
+    rows = []
+    for _ in tenant_router.each_shard():
+        rows += db.session.query(
+            AssessmentScore.module_name, CandidateProfile.child_age, AssessmentScore.percentage
+        ).join(latest, AssessmentScore.id == latest.c.id).join(
+            CandidateProfile, CandidateProfile.user_id == AssessmentScore.user_id
+        ).all()
+
+    CohortNorm.query.delete()
+    if rows:
+        modules, module_idx = np.unique(np.array([r[0] for r in rows]), return_inverse=True)
+        ages = np.array([r[1] for r in rows], dtype=np.int64)
+        age_values, age_idx = np.unique(ages, return_inverse=True)
+        bins = np.clip(np.rint(np.array([r[2] for r in rows], dtype=np.float64)), 0, BINS - 1).astype(np.int64)
+
+        cohort = module_idx * len(age_values) + age_idx
+        hist = np.bincount(cohort * BINS + bins, minlength=len(modules) * len(age_values) * BINS)
+        hist = hist.reshape(len(modules), len(age_values), BINS)
+
+        values = np.arange(BINS, dtype=np.float64)
+        counts = hist.sum(axis=2)
+        now = datetime.utcnow()
+        for m, module in enumerate(modules):
+            for a, age in enumerate(age_values):
+                n = int(counts[m, a])
+                if n == 0:
+                    continue
+                mean = float((hist[m, a] * values).sum() / n)
+                std = float(np.sqrt((hist[m, a] * (values - mean) ** 2).sum() / n))
+                norm = CohortNorm(module_name=str(module), child_age=int(age), count=n, mean=mean, std=std, computed_at=now)
+                norm.set_histogram(hist[m, a].tolist())
+                db.session.add(norm)
+    db.session.commit()
+    logger.info(f"Computed cohort norms from {len(rows)} latest scores")
+    return len(rows)
+
+
+class _Distribution:
+    __slots__ = ('count', 'mean', 'std', 'histogram', 'below', 'quartiles')
+
+    def __init__(self, norm):
+        self.count = norm.count
+        self.mean = norm.mean
+        self.std = norm.std
+        self.histogram = np.array(norm.get_histogram(), dtype=np.int64)
+        cumulative = np.cumsum(self.histogram)
+        self.below = cumulative - self.histogram  # rows strictly below each bin
+        self.quartiles = [int(np.searchsorted(cumulative, q * self.count)) for q in (0.25, 0.5, 0.75)]
+
+
+class CohortNorms:
+    """In-memory view of the cohort_norms table with O(1) percentile ranks.
+
+    The table is small (modules x ages x 101 counts). It is loaded in
+    init_app and re-read by a background thread every `refresh_interval`
+    seconds, so requests only ever read memory and may see norms that are
+    that much stale. When `recompute_interval` is set, the same thread also
+    rebuilds the table once it is older than that; one worker wins each
+    round (see compute_norms). Otherwise run `flask assessment compute-norms`.
+    """
+
+    def __init__(self):
+        self.refresh_interval = 60.0
+        self.recompute_interval = 0.0
+        self.min_cohort = 5
+        self._app = None
+        self._distributions = {}
+        self._computed_at = None
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def init_app(self, app):
+        """Read refresh settings from the app config"""
+        self.refresh_interval = float(app.config.get('ANALYTICS_REFRESH_INTERVAL', self.refresh_interval))
+        self.recompute_interval = float(app.config.get('ANALYTICS_RECOMPUTE_INTERVAL', self.recompute_interval))
+        self.min_cohort = int(app.config.get('ANALYTICS_MIN_COHORT', self.min_cohort))
+        self._app = app
+        with app.app_context():
+            self.load()
+
+    def load(self):
+        """Re-read all distributions from the cohort_norms table"""
+        norms = CohortNorm.query.all()
+        with self._lock:
+            self._distributions = {(n.module_name, n.child_age): _Distribution(n) for n in norms}
+            self._computed_at = max((n.computed_at for n in norms), default=None)
+
+    def _fresh(self):
+        self._ensure_worker()
+        return self._distributions
+
+    def percentile_rank(self, module, age, percentage):
+        """Midpoint percentile rank of a score within its age cohort, or None if the cohort is too small"""
+        dist = self._fresh().get((module, age))
+        if dist is None or dist.count < self.min_cohort or percentage is None:
+            return None
+        b = min(max(int(round(percentage)), 0), BINS - 1)
+        return round(float(dist.below[b] + 0.5 * dist.histogram[b]) / dist.count * 100, 1)
+
+    def stats(self, module, age, include_histogram=False):
+        """Summary statistics for one cohort, or None if it is too small"""
+        dist = self._fresh().get((module, age))
+        if dist is None or dist.count < self.min_cohort:
+            return None
+        result = {
+            'module_name': module,
+            'child_age': age,
+            'count': dist.count,
+            'mean': round(dist.mean, 2),
+            'std': round(dist.std, 2),
+            'p25': dist.quartiles[0],
+            'median': dist.quartiles[1],
+            'p75': dist.quartiles[2],
+            'computed_at': self._computed_at.isoformat() if self._computed_at else None
+        }
+        if include_histogram:
+            result['histogram'] = dist.histogram.tolist()
+        return result
+
+    def cohorts(self, age=None):
+        """(module, age) pairs with a stored distribution"""
+        return sorted(key for key in self._fresh() if age is None or key[1] == age)
+
+    def _ensure_worker(self):
+        # Started on first use rather than in init_app, so each forked gunicorn worker gets its own
+        if self.refresh_interval <= 0 or self._app is None or (self._worker is not None and self._worker.is_alive()):
+            return
+        self._worker = threading.Thread(target=self._refresh_loop, name='cohort-norms', daemon=True)
+        self._worker.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                with self._app.app_context():
+                    if self.recompute_interval > 0:
+                        compute_norms(if_older_than=self.recompute_interval)
+                    self.load()
+            except Exception as e:
+                logger.error(f"Cohort norm refresh failed: {e}")
+
+
+cohort_norms = CohortNorms()
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, send_file
+from flask import Flask, jsonify
 import logging
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -8,7 +8,26 @@ import os
 # Import blueprints
 from auth import auth_bp
 from assessment import assessment_bp
+from export import export_bp
+from onboarding import onboarding_bp
+from reports import reports_bp, report_jobs
 from models import db
+from schema import sync_schema
+from database import configure_database, install_sqlite_pragmas
+from write_buffer import game_score_buffer
+from password_hasher import password_hasher
+from identity_cache import user_cache
+from leaderboard import leaderboards
+from analytics import cohort_norms
+from adaptive import adaptive_engine
+from fast_json import FastJSONProvider
+from compression import response_compressor
+from admission import admission
+from metrics import metrics
+from query_profiler import query_profiler
+from static_assets import static_assets
+from tenancy import tenant_router
+from revocation import token_denylist
 
 def create_app(config_name='development'):
     """Application factory"""
@@ -16,9 +35,23 @@ def create_app(config_name='development'):
     
     # Load configuration
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
     
     # Initialize extensions
+    configure_database(app)
     db.init_app(app)
+    install_sqlite_pragmas(db, app)
+    metrics.init_app(app)
+    tenant_router.init_app(app, engine_hooks=[metrics.instrument, query_profiler.instrument])
+    # After the router, so its cached school lookup is not billed to the request's query budget
+    query_profiler.init_app(app)
+    game_score_buffer.init_app(app)
+    password_hasher.init_app(app)
+    user_cache.init_app(app)
+    response_compressor.init_app(app)
+    admission.init_app(app)
+    static_assets.init_app(app)
+    report_jobs.init_app(app)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     JWTManager(app)
     
@@ -37,9 +70,16 @@ def create_app(config_name='development'):
     def missing_token_callback(error):
         return jsonify({'error': 'Authorization header is missing'}), 401
 
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'error': 'Token has been revoked'}), 401
+
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(assessment_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(onboarding_bp)
+    app.register_blueprint(reports_bp)
     
     @app.route('/api/health', methods=['GET'])
     def health():
@@ -48,8 +88,8 @@ def create_app(config_name='development'):
     
     @app.route('/', methods=['GET'])
     def serve_html():
-        """Serve the main HTML file"""
-        return send_file('index.html')  # Or your HTML filename
+        """Serve the main HTML file (inline scripts and styles split into hashed /assets files)"""
+        return static_assets.serve_shell()
     
     @app.errorhandler(404)
     def not_found(error):
@@ -63,9 +103,14 @@ def create_app(config_name='development'):
     def handle_unprocessable_entity(e):
         return jsonify({'error': 'Missing or invalid Authorization header'}), 401
     
-    # Create database tables
+    # Create database tables (and columns/indexes added since they were created)
     with app.app_context():
-        db.create_all()
+        sync_schema(db)
+    
+    token_denylist.init_app(app, jwt)
+    leaderboards.init_app(app)
+    cohort_norms.init_app(app)
+    adaptive_engine.init_app(app)
     
     return app
 
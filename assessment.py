@@ -1,10 +1,35 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, CandidateProfile, AssessmentScore, ChecklistResponse, GameScore
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import update
+from models import db, CandidateProfile, AssessmentScore, ChecklistResponse, GameScore, GameScoreDaily, AdaptiveSession
+from write_buffer import game_score_buffer
+import report_summary
+import pagination
+from payload_cache import PayloadCache
+from grading import grading_engine
+from adaptive import adaptive_engine
+from leaderboard import leaderboards
+from analytics import cohort_norms, compute_norms
+from database import read_only
+from tenancy import tenant_router
+from idempotency import idempotent, purge_expired
+import delta_sync
+import retention
+import item_analysis
+from datetime import datetime, timedelta
+import click
 import json
+import uuid
 
 assessment_bp = Blueprint('assessment', __name__, url_prefix='/api/assessment')
 
+# Keep the per-user report summary in step with buffered game score inserts
+game_score_buffer.flush_hooks.append(report_summary.apply_game_scores)
+game_score_buffer.commit_hooks.append(leaderboards.record_batch)
+# Rows still buffered must reach the users' current database before they move
+tenant_router.before_move_hooks.append(game_score_buffer.flush)
+
 # Question banks
 QUESTION_BANKS = {
     'magnitude': [
@@ -62,9 +87,30 @@ CHECKLIST_QUESTIONS = [
     'Show high math anxiety or avoidance?'
 ]
 
+# Question banks and the checklist are static between reloads, so their
+# responses are serialized, compressed and ETagged once instead of per request
+question_payloads = PayloadCache()
+
+
+def reload_banks(app):
+    """Rebuild everything derived from the banks; call after editing them"""
+    grading_engine.load(QUESTION_BANKS)
+    adaptive_engine.load(QUESTION_BANKS, pool_size=app.config.get('ADAPTIVE_POOL_SIZE', 500))
+    payloads = {f'questions:{module}': {'questions': questions} for module, questions in QUESTION_BANKS.items()}
+    payloads['questions:all'] = {'modules': QUESTION_BANKS, 'checklist': CHECKLIST_QUESTIONS}
+    payloads['checklist:questions'] = {'questions': CHECKLIST_QUESTIONS}
+    question_payloads.build(app, payloads)
+
+
+@assessment_bp.record_once
+def _load_banks(state):
+    reload_banks(state.app)
+
+
 # --- CANDIDATE PROFILE ENDPOINTS ---
 @assessment_bp.route('/profile', methods=['POST'])
 @jwt_required()
+@idempotent
 def save_profile():
     """Save candidate profile"""
     try:
@@ -82,7 +128,10 @@ def save_profile():
         )
         
         db.session.add(profile)
+        db.session.flush()
+        report_summary.apply_profile(user_id, profile)
         db.session.commit()
+        leaderboards.set_age(user_id, profile.child_age)
         
         return jsonify({'message': 'Profile saved', 'profile': profile.to_dict()}), 201
     
@@ -114,11 +163,21 @@ def get_profile():
 def get_questions(module):
     """Get questions for a module"""
     try:
-        if module not in QUESTION_BANKS:
+        if f'questions:{module}' not in question_payloads:
             return jsonify({'error': 'Invalid module'}), 400
         
-        questions = QUESTION_BANKS[module]
-        return jsonify({'questions': questions}), 200
+        return question_payloads.respond(f'questions:{module}')
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@assessment_bp.route('/questions', methods=['GET'])
+@jwt_required()
+def get_all_questions():
+    """Get every module's questions and the checklist in one response"""
+    try:
+        return question_payloads.respond('questions:all')
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -126,6 +185,7 @@ def get_questions(module):
 
 @assessment_bp.route('/score', methods=['POST'])
 @jwt_required()
+@idempotent
 def save_score():
     """Save assessment score"""
     try:
@@ -133,22 +193,35 @@ def save_score():
         data = request.get_json()
         
         module = data.get('module')
-        score = data.get('score')
-        total = data.get('total')
         answers = data.get('answers', {})
         
-        percentage = (score / total * 100) if total > 0 else 0
+        # Grade on the server from the answers; the client's own score is only
+        # kept (flagged as ungraded) when the answers cannot be matched to a bank
+        result = grading_engine.grade(module, answers)
+        if result is not None:
+            score, total, percentage = result.score, result.total, result.percentage
+        elif current_app.config.get('GRADING_REQUIRE_SERVER'):
+            return jsonify({'error': 'Answers do not match the question bank'}), 400
+        else:
+            score = data.get('score')
+            total = data.get('total')
+            percentage = (score / total * 100) if total > 0 else 0
         
         score_record = AssessmentScore(
             user_id=user_id,
             module_name=module,
             score=score,
             total_questions=total,
-            percentage=percentage
+            percentage=percentage,
+            answer_key_version=result.version if result else None,
+            presented_mask=result.presented_mask if result else None,
+            correct_mask=result.correct_mask if result else None
         )
         score_record.set_answers(answers)
         
         db.session.add(score_record)
+        db.session.flush()
+        report_summary.apply_score(user_id, score_record)
         db.session.commit()
         
         return jsonify({'message': 'Score saved', 'score': score_record.to_dict()}), 201
@@ -160,17 +233,157 @@ def save_score():
 
 @assessment_bp.route('/scores', methods=['GET'])
 @jwt_required()
+@read_only
 def get_scores():
-    """Get all assessment scores for user"""
+    """Get a page of assessment scores for user (newest first; `limit`, `before`/`after`, `module`)"""
+    try:
+        user_id = get_jwt_identity()
+        query = AssessmentScore.query.filter_by(user_id=user_id)
+        if request.args.get('module'):
+            query = query.filter_by(module_name=request.args['module'])
+        
+        try:
+            scores, page = pagination.keyset_page(query, AssessmentScore, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'scores': [s.to_dict() for s in scores],
+            'page': page
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# --- ADAPTIVE TESTING ENDPOINTS ---
+def _adaptive_serializer():
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='adaptive-session')
+
+
+def _advance_session(session_id, *conditions, **values):
+    """Conditionally update an unfinished adaptive session; False when the token is stale"""
+    return db.session.execute(
+        update(AdaptiveSession).where(AdaptiveSession.id == session_id, AdaptiveSession.finished_at.is_(None), *conditions)
+        .values(**values)
+    ).rowcount == 1
+
+
+def _public_item(item):
+    return {'id': item['id'], 'q': item['q'], 'options': item['options']}
+
+
+@assessment_bp.route('/adaptive/<module>/next-item', methods=['POST'])
+@jwt_required()
+@idempotent
+def next_adaptive_item(module):
+    """Grade the pending adaptive item and return the next one, or the final result.
+
+    Start with {"session": null}; afterwards send back the returned `session`
+    together with `answer` for the item just shown. The session is a signed
+    token holding the administered items, so any worker can continue it;
+    its adaptive_sessions row records how many answers were accepted, so an
+    already-answered (or finished) token is rejected instead of re-graded.
+    Finished sessions are saved as an assessment score for `<module>_adaptive`.
+    """
     try:
         user_id = get_jwt_identity()
-        scores = AssessmentScore.query.filter_by(user_id=user_id).all()
+        pool = adaptive_engine.pool(module)
+        if pool is None:
+            return jsonify({'error': 'Unknown module'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        token = data.get('session')
+        if token:
+            try:
+                state = _adaptive_serializer().loads(token, max_age=current_app.config.get('ADAPTIVE_SESSION_MAX_AGE', 7200))
+            except BadSignature:
+                return jsonify({'error': 'Invalid or expired session'}), 400
+            if state['user'] != user_id or state['module'] != module or not state.get('sid'):
+                return jsonify({'error': 'Session belongs to another test'}), 400
+        else:
+            state = {'sid': uuid.uuid4().hex, 'user': user_id, 'module': module,
+                     'items': [], 'answers': [], 'correct': [], 'pending': None}
+            db.session.add(AdaptiveSession(id=state['sid'], user_id=int(user_id), module=module))
+        
+        if any(item_id not in pool.index for item_id in state['items'] + [state['pending']] if item_id):
+            return jsonify({'error': 'Item pool changed; start a new session'}), 409
+        
+        # Accept each step once: the row must still be at the step this token
+        # was issued for (checked in one conditional UPDATE below)
+        conditions, progress = [], {}
+        if state['pending'] and 'answer' in data:
+            conditions.append(AdaptiveSession.step == len(state['items']))
+            progress['step'] = AdaptiveSession.step + 1
+            item = pool.items[pool.index[state['pending']]]
+            answer = str(data['answer']).strip()
+            state['items'].append(state['pending'])
+            state['answers'].append(answer)
+            state['correct'].append(int(answer == item['a']))
+            state['pending'] = None
+        
+        administered = [pool.index[item_id] for item_id in state['items']]
+        theta, se = pool.estimate(administered, state['correct'])
+        answered = len(administered)
+        config = current_app.config
+        
+        next_index = None
+        finished = answered >= config.get('ADAPTIVE_MAX_ITEMS', 20) or (
+            answered >= config.get('ADAPTIVE_MIN_ITEMS', 5) and se <= config.get('ADAPTIVE_SE_TARGET', 0.4))
+        if not finished and not state['pending']:
+            next_index = pool.select(theta, administered)
+            if next_index is None:
+                finished = True
+            else:
+                state['pending'] = pool.items[next_index]['id']
         
+        if finished:
+            progress['finished_at'] = datetime.utcnow()
+        if progress and not _advance_session(state['sid'], *conditions, **progress):
+            db.session.rollback()
+            return jsonify({'error': 'Session step already answered; continue from the latest session'}), 409
+        
+        if finished:
+            correct = sum(state['correct'])
+            score_record = AssessmentScore(
+                user_id=user_id,
+                module_name=f'{module}_adaptive',
+                score=correct,
+                total_questions=answered,
+                percentage=correct / answered * 100 if answered else 0,
+                answer_key_version=pool.version  # graded here against the pool's own key
+            )
+            score_record.set_answers({
+                'theta': round(theta, 3),
+                'se': round(se, 3),
+                'items': [{'id': i, 'answer': a, 'correct': bool(c)}
+                          for i, a, c in zip(state['items'], state['answers'], state['correct'])]
+            })
+            db.session.add(score_record)
+            db.session.flush()
+            report_summary.apply_score(user_id, score_record)
+            db.session.commit()
+            
+            return jsonify({
+                'done': True,
+                'theta': round(theta, 3),
+                'se': round(se, 3),
+                'answered': answered,
+                'score': score_record.to_dict()
+            }), 201
+        
+        db.session.commit()
         return jsonify({
-            'scores': [s.to_dict() for s in scores]
+            'done': False,
+            'session': _adaptive_serializer().dumps(state),
+            'item': _public_item(pool.items[pool.index[state['pending']]]),
+            'theta': round(theta, 3),
+            'se': round(se, 3),
+            'answered': answered
         }), 200
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
@@ -179,11 +392,12 @@ def get_scores():
 @jwt_required()
 def get_checklist_questions():
     """Get checklist questions"""
-    return jsonify({'questions': CHECKLIST_QUESTIONS}), 200
+    return question_payloads.respond('checklist:questions')
 
 
 @assessment_bp.route('/checklist', methods=['POST'])
 @jwt_required()
+@idempotent
 def save_checklist():
     """Save checklist responses"""
     try:
@@ -197,13 +411,19 @@ def save_checklist():
         # Delete existing checklist
         ChecklistResponse.query.filter_by(user_id=user_id).delete()
         
+        answered_mask, yes_mask = item_analysis.pack_checklist(responses, CHECKLIST_QUESTIONS)
+        
         checklist = ChecklistResponse(
             user_id=user_id,
-            total_score=total_score
+            total_score=total_score,
+            answered_mask=answered_mask,
+            yes_mask=yes_mask
         )
         checklist.set_responses(responses)
         
         db.session.add(checklist)
+        db.session.flush()
+        report_summary.apply_checklist(user_id, checklist)
         db.session.commit()
         
         return jsonify({'message': 'Checklist saved', 'checklist': checklist.to_dict()}), 201
@@ -215,6 +435,7 @@ def save_checklist():
 
 @assessment_bp.route('/checklist', methods=['GET'])
 @jwt_required()
+@read_only
 def get_checklist():
     """Get user's checklist response"""
     try:
@@ -231,24 +452,78 @@ def get_checklist():
 
 
 # --- GAME SCORE ENDPOINTS ---
+def _game_score_row(user_id, data):
+    """Validate one game result and build its insert row"""
+    if not isinstance(data, dict):
+        raise ValueError('Each game score must be an object')
+    game_name = data.get('game_name')
+    score = data.get('score')
+    if not game_name or not isinstance(game_name, str):
+        raise ValueError('game_name is required')
+    if game_name not in leaderboards.game_names:
+        raise ValueError(f'Unknown game: {game_name}')
+    if not isinstance(score, int) or isinstance(score, bool):
+        raise ValueError('score must be an integer')
+    return {'user_id': int(user_id), 'game_name': game_name, 'score': score}
+
+
 @assessment_bp.route('/game-score', methods=['POST'])
 @jwt_required()
+@idempotent
 def save_game_score():
     """Save game score"""
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        game_score = GameScore(
-            user_id=user_id,
-            game_name=data.get('game_name'),
-            score=data.get('score')
-        )
+        try:
+            row = _game_score_row(user_id, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        db.session.add(game_score)
-        db.session.commit()
+        pending = game_score_buffer.submit([row])[0]
+        
+        if game_score_buffer.durability == 'async':
+            return jsonify({'message': 'Game score queued', 'game_score': pending.to_dict()}), 202
+        
+        return jsonify({'message': 'Game score saved', 'game_score': pending.to_dict()}), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@assessment_bp.route('/game-scores', methods=['POST'])
+@jwt_required()
+@idempotent
+def save_game_scores():
+    """Save a batch of game scores in one request"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        results = data.get('game_scores') if isinstance(data, dict) else data
+        if not isinstance(results, list) or not results:
+            return jsonify({'error': 'game_scores must be a non-empty list'}), 400
+        
+        bulk_max = current_app.config.get('GAME_SCORE_BULK_MAX', 500)
+        if len(results) > bulk_max:
+            return jsonify({'error': f'At most {bulk_max} game scores per request'}), 413
         
-        return jsonify({'message': 'Game score saved', 'game_score': game_score.to_dict()}), 201
+        rows = []
+        for index, item in enumerate(results):
+            try:
+                rows.append(_game_score_row(user_id, item))
+            except ValueError as e:
+                return jsonify({'error': f'game_scores[{index}]: {e}'}), 400
+        
+        pending = game_score_buffer.submit(rows)
+        
+        body = {'count': len(pending), 'game_scores': [p.to_dict() for p in pending]}
+        if game_score_buffer.durability == 'async':
+            return jsonify({'message': 'Game scores queued', **body}), 202
+        
+        return jsonify({'message': 'Game scores saved', **body}), 201
     
     except Exception as e:
         db.session.rollback()
@@ -257,14 +532,177 @@ def save_game_score():
 
 @assessment_bp.route('/game-scores', methods=['GET'])
 @jwt_required()
+@read_only
 def get_game_scores():
-    """Get all game scores for user"""
+    """Get a page of game scores for user (newest first; `limit`, `before`/`after`, `game_name`).
+
+    Rounds older than the retention window only exist as daily rollups.
+    They follow on the last page of raw rounds as `daily`; continue with
+    `daily_before=<page.daily_before>`.
+    """
     try:
         user_id = get_jwt_identity()
-        game_scores = GameScore.query.filter_by(user_id=user_id).all()
+        game_name = request.args.get('game_name')
+        query = GameScore.query.filter_by(user_id=user_id)
+        if game_name:
+            query = query.filter_by(game_name=game_name)
+        
+        daily_before = request.args.get('daily_before')
+        try:
+            if daily_before:
+                # Past the raw rounds already; page through rollups only
+                game_scores = []
+                page = {'limit': pagination.parse_limit(request.args.get('limit')), 'has_more': False,
+                        'before': None, 'after': None}
+            else:
+                game_scores, page = pagination.keyset_page(query, GameScore, request.args)
+            
+            daily = []
+            if not page['has_more'] and not request.args.get('after'):
+                daily, page['daily_has_more'] = retention.daily_page(user_id, game_name, daily_before, page['limit'])
+                page['daily_before'] = retention.encode_daily_cursor(daily[-1]) if page['daily_has_more'] else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'game_scores': [gs.to_dict() for gs in game_scores]
+            'game_scores': [gs.to_dict() for gs in game_scores],
+            'daily': [d.to_dict() for d in daily],
+            'page': page
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# --- LEADERBOARD ENDPOINTS ---
+def _leaderboard_band(user_id):
+    """Resolve the `age_band` query arg; 'mine' means the caller's own band"""
+    band = request.args.get('age_band')
+    if band == 'mine':
+        return leaderboards.band_of(user_id)
+    return band or None
+
+
+@assessment_bp.route('/leaderboard', methods=['GET'])
+@jwt_required()
+def get_leaderboard_games():
+    """List games with leaderboards and the configured age bands"""
+    try:
+        user_id = get_jwt_identity()
+        return jsonify({
+            'games': leaderboards.games(),
+            'age_bands': [f'{low}-{high}' for low, high in leaderboards.age_bands],
+            'your_age_band': leaderboards.band_of(user_id)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@assessment_bp.route('/leaderboard/<game_name>', methods=['GET'])
+@jwt_required()
+def get_leaderboard(game_name):
+    """Top-N best scores for a game, optionally within an age band"""
+    try:
+        user_id = int(get_jwt_identity())
+        if game_name not in leaderboards.game_names:
+            return jsonify({'error': 'Unknown game'}), 404
+        band = _leaderboard_band(user_id)
+        try:
+            limit = pagination.parse_limit(request.args.get('limit'), default=10, maximum=100)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        entries = leaderboards.top(game_name, limit=limit, band=band)
+        return jsonify({
+            'game_name': game_name,
+            'age_band': band,
+            'entries': [{'rank': rank, 'score': score, 'you': uid == user_id} for rank, uid, score in entries]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@assessment_bp.route('/leaderboard/<game_name>/rank', methods=['GET'])
+@jwt_required()
+def get_leaderboard_rank(game_name):
+    """The caller's rank for a game, overall and within their age band"""
+    try:
+        user_id = get_jwt_identity()
+        if game_name not in leaderboards.game_names:
+            return jsonify({'error': 'Unknown game'}), 404
+        band = leaderboards.band_of(user_id)
+        
+        def describe(result):
+            if result is None:
+                return None
+            rank, score, players = result
+            return {'rank': rank, 'score': score, 'players': players}
+        
+        return jsonify({
+            'game_name': game_name,
+            'overall': describe(leaderboards.rank(game_name, user_id)),
+            'age_band': band,
+            'in_age_band': describe(leaderboards.rank(game_name, user_id, band=band)) if band else None
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# --- COHORT ANALYTICS ENDPOINTS ---
+@assessment_bp.route('/cohort-stats', methods=['GET'])
+@jwt_required()
+def get_cohort_stats():
+    """Precomputed score distribution per module for a child age (default: the caller's child)"""
+    try:
+        user_id = get_jwt_identity()
+        age = request.args.get('age', type=int)
+        if age is None:
+            profile = CandidateProfile.query.filter_by(user_id=user_id).first()
+            if not profile:
+                return jsonify({'error': 'age is required when no profile exists'}), 400
+            age = profile.child_age
+        
+        include_histogram = request.args.get('histogram') in ('1', 'true')
+        modules = [request.args['module']] if request.args.get('module') else [m for m, _ in cohort_norms.cohorts(age)]
+        
+        return jsonify({
+            'child_age': age,
+            'cohorts': {module: cohort_norms.stats(module, age, include_histogram) for module in modules}
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# --- DELTA SYNC ENDPOINT ---
+@assessment_bp.route('/sync', methods=['GET'])
+@jwt_required()
+@read_only
+def sync():
+    """Return only what changed for the user since `since` (a watermark from the previous sync).
+
+    Omit `since` for a full sync. Keep calling with the returned `watermark`
+    while `has_more` is true; `limit` caps rows per table (default and max 500).
+    Re-graded scores and updated rollups come again, removed rows are listed
+    in `deleted`; `profile` and `checklist` are present only when they changed.
+    """
+    try:
+        user_id = get_jwt_identity()
+        try:
+            mark = delta_sync.decode_watermark(request.args.get('since'))
+            limit = pagination.parse_limit(request.args.get('limit'), default=pagination.MAX_LIMIT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        changes, new_mark, has_more = delta_sync.changes_since(user_id, mark, limit)
+        
+        return jsonify({
+            'changes': changes,
+            'watermark': delta_sync.encode_watermark(new_mark),
+            'has_more': has_more
         }), 200
     
     except Exception as e:
@@ -274,22 +712,158 @@ def get_game_scores():
 # --- REPORT ENDPOINT ---
 @assessment_bp.route('/report', methods=['GET'])
 @jwt_required()
+@read_only
 def get_report():
-    """Generate comprehensive report for user"""
+    """Generate comprehensive report for user.
+
+    Reads the materialized summary plus the most recent `recent` scores and
+    game rounds; pass `detail=full` to get the complete history instead,
+    with rounds past the retention window as daily rollups in `game_daily`.
+    """
     try:
         user_id = get_jwt_identity()
+        detail = request.args.get('detail', 'summary')
         
-        profile = CandidateProfile.query.filter_by(user_id=user_id).first()
-        scores = AssessmentScore.query.filter_by(user_id=user_id).all()
-        game_scores = GameScore.query.filter_by(user_id=user_id).all()
-        checklist = ChecklistResponse.query.filter_by(user_id=user_id).first()
+        summary = report_summary.get_or_build(user_id)
+        
+        scores_query = AssessmentScore.query.filter_by(user_id=user_id)
+        game_scores_query = GameScore.query.filter_by(user_id=user_id)
+        
+        game_daily = []
+        if detail == 'full':
+            scores = scores_query.all()
+            game_scores = game_scores_query.all()
+            game_daily = GameScoreDaily.query.filter_by(user_id=user_id).order_by(
+                GameScoreDaily.day.desc(), GameScoreDaily.game_name).all()
+        else:
+            max_recent = current_app.config.get('REPORT_RECENT_MAX', 100)
+            try:
+                recent = int(request.args.get('recent', current_app.config.get('REPORT_RECENT_DEFAULT', 10)))
+            except ValueError:
+                return jsonify({'error': 'recent must be an integer'}), 400
+            recent = max(0, min(recent, max_recent))
+            scores = scores_query.order_by(AssessmentScore.created_at.desc()).limit(recent).all()
+            game_scores = game_scores_query.order_by(GameScore.created_at.desc()).limit(recent).all()
+        
+        profile = summary.get_profile()
+        summary_dict = summary.to_dict()
+        age = profile['child_age'] if profile else None
+        for module, stats in summary_dict['modules'].items():
+            stats['percentile_rank'] = cohort_norms.percentile_rank(module, age, stats['latest']['percentage'])
         
         return jsonify({
-            'profile': profile.to_dict() if profile else None,
+            'profile': profile,
+            'summary': summary_dict,
             'assessment_scores': [s.to_dict() for s in scores],
             'game_scores': [gs.to_dict() for gs in game_scores],
-            'checklist': checklist.to_dict() if checklist else None
+            'game_daily': [d.to_dict() for d in game_daily],
+            'checklist': summary.get_checklist()
         }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@assessment_bp.cli.command('rebuild-summaries')
+@click.option('--user-id', type=int, default=None, help='Rebuild a single user instead of everyone')
+def rebuild_summaries_command(user_id):
+    """Recompute materialized report summaries from the raw score tables"""
+    rebuilt = 0
+    for shard, user_ids in tenant_router.users_by_shard().items():
+        if user_id is not None:
+            user_ids = [uid for uid in user_ids if uid == user_id]
+        with tenant_router.use_shard(shard):
+            for uid in user_ids:
+                report_summary.rebuild(uid)
+        rebuilt += len(user_ids)
+    click.echo(f'Rebuilt {rebuilt} report summaries')
+
+
+@assessment_bp.cli.command('compute-norms')
+def compute_norms_command():
+    """Rebuild cohort percentile distributions from each child's latest scores"""
+    count = compute_norms()
+    click.echo(f'Computed cohort norms from {count} scores')
+
+
+@assessment_bp.cli.command('regrade')
+@click.option('--module', default=None, help='Only re-grade this module')
+@click.option('--batch-size', default=2000, show_default=True, help='Rows scored per vectorized batch')
+def regrade_command(module, batch_size):
+    """Re-score stored assessment answers against the current question banks"""
+    checked = changed = refreshed = 0
+    for _ in tenant_router.each_shard():
+        shard_checked, shard_changed, affected = grading_engine.regrade(module=module, batch_size=batch_size)
+        for uid in affected:
+            report_summary.rebuild(uid)
+        checked, changed, refreshed = checked + shard_checked, changed + shard_changed, refreshed + len(affected)
+    if changed:
+        # Item statistics were accumulated from the old outcomes
+        item_analysis.reset_item_statistics()
+    click.echo(f'Checked {checked} scores, updated {changed}, refreshed {refreshed} report summaries')
+
+
+@assessment_bp.cli.command('migrate-item-responses')
+def migrate_item_responses_command():
+    """Pack stored answers and checklist responses into per-item bitmasks"""
+    checked = changed = 0
+    for _ in tenant_router.each_shard():
+        shard_checked, shard_changed, affected = grading_engine.regrade()
+        for uid in affected:
+            report_summary.rebuild(uid)
+        checked, changed = checked + shard_checked, changed + shard_changed
+    packed = item_analysis.pack_stored_checklists(CHECKLIST_QUESTIONS)
+    item_analysis.reset_item_statistics()
+    click.echo(f'Packed {changed} of {checked} assessment scores and {packed} checklists')
+
+
+@assessment_bp.cli.command('item-analysis')
+@click.option('--module', default=None, help='Only report this module')
+@click.option('--json', 'as_json', is_flag=True, help='Print JSON instead of a table')
+def item_analysis_command(module, as_json):
+    """Update item statistics incrementally and print p-values and discrimination"""
+    item_analysis.update_item_statistics()
+    report = item_analysis.item_report(module=module)
+    if as_json:
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    for item in report:
+        click.echo(f"{item['module_name']:<13} #{item['item_index']:<3} n={item['presented']:<7} "
+                   f"p={item['p_value']}  r={item['discrimination']}  {item['question']}")
+
+
+@assessment_bp.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys_command():
+    """Delete stored idempotent responses older than IDEMPOTENCY_TTL"""
+    deleted = sum(purge_expired(current_app.config.get('IDEMPOTENCY_TTL', 86400)) for _ in tenant_router.each_shard())
+    click.echo(f"Purged {deleted} idempotency keys")
+
+
+@assessment_bp.cli.command('purge-adaptive-sessions')
+def purge_adaptive_sessions_command():
+    """Delete adaptive session records whose tokens have expired (ADAPTIVE_SESSION_MAX_AGE)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('ADAPTIVE_SESSION_MAX_AGE', 7200))
+    deleted = 0
+    for _ in tenant_router.each_shard():
+        deleted += AdaptiveSession.query.filter(AdaptiveSession.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+    click.echo(f"Purged {deleted} adaptive sessions")
+
+
+@assessment_bp.cli.command('compact-game-scores')
+@click.option('--days', type=int, default=None, help='Retention window; defaults to GAME_SCORE_RETENTION_DAYS')
+@click.option('--archive-dir', default=None, help='Write archived rounds as gzipped NDJSON here instead of game_scores_archive')
+def compact_game_scores_command(days, archive_dir):
+    """Roll game rounds older than the retention window into daily rollups and archive them"""
+    days = days if days is not None else current_app.config.get('GAME_SCORE_RETENTION_DAYS', 90)
+    if days <= 0:
+        raise click.ClickException('Retention is disabled (GAME_SCORE_RETENTION_DAYS=0)')
+    compacted = touched = 0
+    for shard in tenant_router.each_shard():
+        shard_compacted, shard_touched = retention.compact_game_scores(
+            retention.retention_cutoff(days),
+            batch_size=current_app.config.get('GAME_SCORE_COMPACT_BATCH_SIZE', 5000),
+            archive_dir=archive_dir or current_app.config.get('GAME_SCORE_ARCHIVE_DIR')
+        )
+        compacted, touched = compacted + shard_compacted, touched + shard_touched
+    click.echo(f'Compacted {compacted} game rounds into {touched} daily rollups')
@@ -1,15 +1,29 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from werkzeug.exceptions import UnprocessableEntity
-from models import db, User
+from models import db, User, Tenant, TokenFamily
+from password_hasher import HasherBusy
+from identity_cache import user_cache
+from admission import admission, too_many_requests
+from tenancy import tenant_router
+from revocation import token_denylist, start_sign_in, issue_tokens
+from contextlib import nullcontext
 from datetime import datetime
+import report_summary
 import logging
-import jwt as pyjwt
 
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+
+def _busy_response(error):
+    """503 with Retry-After when the bcrypt pool is saturated"""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -26,24 +40,42 @@ def register():
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'error': 'Email already exists'}), 409
         
+        # Optional school; its users' data lives on the school's shard
+        school = data.get('school') if tenant_router.enabled else None
+        if school:
+            tenant = db.session.get(Tenant, school)
+            if tenant is None or tenant.status != 'active':
+                return jsonify({'error': 'Unknown school'}), 400
+        
         # Create new user
-        user = User(username=data['username'], email=data['email'])
+        user = User(username=data['username'], email=data['email'], tenant=school or None)
         user.set_password(data['password'])
         
         db.session.add(user)
+        db.session.flush()
+        # An empty summary now (on the school's shard), so the first report has nothing to build
+        with tenant_router.use_shard(tenant.shard) if school else nullcontext():
+            report_summary.start(user.id)
+            db.session.flush()
+        family = start_sign_in(user.id)
         db.session.commit()
         
-        # Create access token (use string identity to avoid subject-type issues)
-        access_token = create_access_token(identity=str(user.id))
+        # Short-lived access token plus a refresh token for /api/auth/refresh
+        access_token, refresh_token = issue_tokens(user, family)
         
         logger.info(f"User registered: {user.username}")
         
         return jsonify({
             'message': 'User registered successfully',
             'access_token': access_token,
+            'refresh_token': refresh_token,
             'user': user.to_dict()
         }), 201
     
+    except HasherBusy as e:
+        db.session.rollback()
+        return _busy_response(e)
+    
     except Exception as e:
         db.session.rollback()
         logger.error(f"Registration error: {str(e)}")
@@ -59,6 +91,14 @@ def login():
         if not data or not data.get('password'):
             return jsonify({'error': 'Missing username/email and password'}), 400
         
+        # Refuse accounts and addresses with too many recent failures before any bcrypt work
+        account = (data.get('username') or data.get('email') or '').strip().lower()
+        ip = admission.client_ip()
+        retry_after = admission.check('login_failures_account', account) or admission.check('login_failures_ip', ip)
+        if retry_after:
+            logger.warning(f"Login throttled for: {account} from {ip}")
+            return too_many_requests(retry_after, 'Too many failed login attempts, try again later')
+        
         # Accept either username or email
         user = User.query.filter(
             (User.username == data.get('username')) | 
@@ -66,65 +106,116 @@ def login():
         ).first()
         
         if not user or not user.check_password(data['password']):
+            admission.hit('login_failures_account', account)
+            admission.hit('login_failures_ip', ip)
             logger.warning(f"Failed login attempt for: {data.get('username') or data.get('email')}")
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        # Create access token (use string identity to avoid subject-type issues)
-        access_token = create_access_token(identity=str(user.id))
-
-        # Log token info for debugging (remove in production)
-        try:
-            logger.debug(f"Generated token for user {user.username}: {access_token}")
-            # Try to decode to ensure signature correctness
-            payload = pyjwt.decode(access_token, current_app.config.get('JWT_SECRET_KEY'), algorithms=['HS256'])
-            logger.debug(f"Token payload: {payload}")
-        except Exception as e:
-            logger.error(f"Token decode error after creation: {e}")
+        admission.reset('login_failures_account', account)
+        
+        # Transparently move the stored hash to the configured bcrypt cost
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            logger.info(f"Rehashed password for: {user.username}")
+        
+        family = start_sign_in(user.id)
+        db.session.commit()
+        
+        # Short-lived access token plus a refresh token for /api/auth/refresh
+        access_token, refresh_token = issue_tokens(user, family)
 
         logger.info(f"User logged in: {user.username}")
 
         return jsonify({
             'message': 'Login successful',
             'access_token': access_token,
+            'refresh_token': refresh_token,
             'user': user.to_dict()
         }), 200
     
+    except HasherBusy as e:
+        db.session.rollback()
+        return _busy_response(e)
+    
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Login error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """Exchange a refresh token for a new access token and a new refresh token"""
+    try:
+        claims = get_jwt()
+        family = db.session.query(TokenFamily).filter_by(id=claims.get('fam')).with_for_update().first()
+        
+        if not family or family.revoked_at is not None:
+            return jsonify({'error': 'Token has been revoked'}), 401
+        
+        now = datetime.utcnow()
+        if claims.get('gen') == family.generation:
+            # Rotate: from now on only the refresh token issued here is accepted
+            family.generation += 1
+            family.refreshed_at = now
+        else:
+            # An already rotated token: a client retry or two tabs refreshing at once when it
+            # was rotated moments ago, otherwise a leaked token, so end the whole sign-in
+            grace = current_app.config.get('JWT_REFRESH_REUSE_GRACE', 0)
+            if claims.get('gen') != family.generation - 1 or (now - family.refreshed_at).total_seconds() > grace:
+                logger.warning(f"Refresh token reuse for user {family.user_id}; revoking the sign-in")
+                token_denylist.revoke(family, 'reuse')
+                return jsonify({'error': 'Token has been revoked'}), 401
+        
+        user = db.session.get(User, family.user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        db.session.commit()
+        access_token, refresh_token = issue_tokens(user, family)
+        
+        return jsonify({'access_token': access_token, 'refresh_token': refresh_token}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Token refresh error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke the current sign-in (its access and refresh tokens) with either token"""
+    try:
+        family = db.session.get(TokenFamily, get_jwt().get('fam') or '')
+        
+        if family:
+            token_denylist.revoke(family, 'logout')
+        
+        return jsonify({'message': 'Logged out'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Logout error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @auth_bp.route('/verify', methods=['GET'])
 @jwt_required()
 def verify_token():
     """Verify JWT token and return user info"""
     try:
-        # Debug: log the Authorization header and attempt manual decode
-        auth_header = request.headers.get('Authorization')
-        logger.debug(f"Authorization header received: {auth_header}")
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ', 1)[1]
-            try:
-                decoded = pyjwt.decode(token, current_app.config.get('JWT_SECRET_KEY'), algorithms=['HS256'])
-                logger.debug(f"Manual JWT decode success: {decoded}")
-            except Exception as e:
-                logger.error(f"Manual JWT decode failed: {e}")
-
         raw_id = get_jwt_identity()
         logger.debug(f"Verifying token for raw identity: {raw_id}")
-        try:
-            user_id = int(raw_id)
-        except Exception:
-            user_id = raw_id
         
-        user = User.query.get(user_id)
+        user = user_cache.get(raw_id)
         
         if not user:
-            logger.warning(f"User not found for id: {user_id}")
+            logger.warning(f"User not found for id: {raw_id}")
             return jsonify({'error': 'User not found'}), 404
         
-        logger.debug(f"Token verified for: {user.username}")
-        return jsonify({'user': user.to_dict()}), 200
+        return jsonify({'user': user}), 200
     
     except Exception as e:
         logger.error(f"Token verification error: {str(e)}")
@@ -136,17 +227,12 @@ def verify_token():
 def get_profile():
     """Get current user profile"""
     try:
-        raw_id = get_jwt_identity()
-        try:
-            user_id = int(raw_id)
-        except Exception:
-            user_id = raw_id
-        user = User.query.get(user_id)
+        user = user_cache.get(get_jwt_identity())
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify(user.to_dict()), 200
+        return jsonify(user), 200
     
     except Exception as e:
         logger.error(f"Get profile error: {str(e)}")
@@ -0,0 +1,291 @@
+"""Concurrent load benchmark over every auth and assessment route.
+
+Builds the app with create_app('testing') on a file-backed database (a
+temporary SQLite file by default, or --database-url for PostgreSQL), seeds
+synthetic users with score and game history, then drives each endpoint from
+a pool of threads and reports throughput and p50/p95/p99 latency:
+
+    python -m benchmarks.load --users 200 --scores 20 --rounds 100 --concurrency 8 --json results.json
+    python -m benchmarks.load --compare results.json   # show the change against an earlier run
+"""
+from datetime import datetime, timedelta
+import concurrent.futures
+import subprocess
+import statistics
+import itertools
+import argparse
+import platform
+import tempfile
+import threading
+import random
+import json
+import time
+import sys
+import os
+
+MODULES = ['magnitude', 'estimation', 'facts', 'sequencing', 'spatial', 'memory']
+GAMES = ['neon_runner', 'aqua_math', 'fact_match']
+
+
+def build_app(database_url):
+    # TestingConfig reads TEST_DATABASE_URL when its class body runs, so set it before importing the app
+    os.environ['TEST_DATABASE_URL'] = database_url
+    from app import create_app
+    return create_app('testing')
+
+
+# --- SYNTHETIC DATA ---
+def seed(app, users, scores, rounds, rng):
+    """Create `users` accounts with profiles, `scores` graded assessments and `rounds` game rounds each"""
+    from sqlalchemy import insert
+    from models import db, User, AssessmentScore, GameScore, ChecklistResponse
+    from assessment import QUESTION_BANKS, CHECKLIST_QUESTIONS
+    from grading import grading_engine
+    from onboarding import import_users
+    from item_analysis import pack_checklist
+    from leaderboard import leaderboards
+    from analytics import cohort_norms, compute_norms
+    import report_summary
+
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    with app.app_context():
+        result = import_users([
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': 'bench-password',
+             'child_name': f'Child {i}', 'child_age': rng.randint(5, 13), 'parent_name': f'Parent {i}'}
+            for i in range(users)
+        ])
+        user_ids = [uid for (uid,) in db.session.query(User.id).order_by(User.id)]
+
+        score_rows, game_rows, checklist_rows = [], [], []
+        for user_id in user_ids:
+            for j in range(scores):
+                module = rng.choice(MODULES)
+                answers = [q['a'] if rng.random() < 0.7 else q['options'][-1] for q in QUESTION_BANKS[module]]
+                graded = grading_engine.grade(module, answers)
+                score_rows.append({
+                    'user_id': user_id, 'module_name': module, 'score': graded.score, 'total_questions': graded.total,
+                    'percentage': graded.percentage, 'answers_json': json.dumps(answers),
+                    'answer_key_version': graded.version, 'presented_mask': graded.presented_mask,
+                    'correct_mask': graded.correct_mask, 'created_at': now - timedelta(hours=j)
+                })
+            for j in range(rounds):
+                game_rows.append({'user_id': user_id, 'game_name': rng.choice(GAMES), 'score': rng.randint(0, 500),
+                                  'created_at': now - timedelta(minutes=j)})
+            responses = {str(k): rng.random() < 0.3 for k in range(len(CHECKLIST_QUESTIONS))}
+            answered, yes = pack_checklist(responses, CHECKLIST_QUESTIONS)
+            checklist_rows.append({'user_id': user_id, 'responses_json': json.dumps(responses), 'answered_mask': answered,
+                                   'yes_mask': yes, 'total_score': bin(yes).count('1'), 'created_at': now})
+
+        for model, rows in ((AssessmentScore, score_rows), (GameScore, game_rows), (ChecklistResponse, checklist_rows)):
+            for start in range(0, len(rows), 5000):
+                db.session.execute(insert(model), rows[start:start + 5000])
+        db.session.commit()
+
+        for user_id in user_ids:
+            report_summary.rebuild(user_id)
+        db.session.commit()
+        compute_norms()
+        cohort_norms.load()
+        leaderboards.load()
+    print(f"Seeded {result['created']} users, {len(score_rows)} scores, {len(game_rows)} rounds "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return user_ids
+
+
+def sign_in(app, user_ids, count):
+    """(access tokens, refresh tokens) of `count` separate sign-ins, cycling over the users"""
+    from models import db, User
+    from revocation import start_sign_in, issue_tokens
+
+    with app.app_context():
+        users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+        families = [(users[user_id], start_sign_in(user_id)) for user_id in itertools.islice(itertools.cycle(user_ids), count)]
+        db.session.commit()
+        pairs = [issue_tokens(user, family) for user, family in families]
+    return [access for access, _ in pairs], [refresh for _, refresh in pairs]
+
+
+# --- SCENARIOS ---
+def scenarios(rng, users):
+    """(name, method, path, json_body_factory, token kind); factories get a per-request counter.
+
+    The token kind is None (anonymous), 'access' (one sign-in per user), or
+    'refresh'/'logout', which use up a sign-in per request so rotation and
+    revocation never collide.
+    """
+    module = lambda: rng.choice(MODULES)
+    game = lambda: rng.choice(GAMES)
+    return [
+        ('auth.register', 'POST', lambda n: '/api/auth/register',
+         lambda n: {'username': f'load{n}', 'email': f'load{n}@example.com', 'password': 'load-password'}, None),
+        ('auth.login', 'POST', lambda n: '/api/auth/login',
+         lambda n: {'username': f'bench{n % users}', 'password': 'bench-password'}, None),
+        ('auth.refresh', 'POST', lambda n: '/api/auth/refresh', None, 'refresh'),
+        ('auth.logout', 'POST', lambda n: '/api/auth/logout', None, 'logout'),
+        ('auth.verify_token', 'GET', lambda n: '/api/auth/verify', None, 'access'),
+        ('auth.get_profile', 'GET', lambda n: '/api/auth/profile', None, 'access'),
+        ('assessment.save_profile', 'POST', lambda n: '/api/assessment/profile',
+         lambda n: {'child_name': 'Child', 'child_age': rng.randint(5, 13), 'parent_name': 'Parent'}, 'access'),
+        ('assessment.get_profile', 'GET', lambda n: '/api/assessment/profile', None, 'access'),
+        ('assessment.get_questions', 'GET', lambda n: f'/api/assessment/questions/{module()}', None, 'access'),
+        ('assessment.get_all_questions', 'GET', lambda n: '/api/assessment/questions', None, 'access'),
+        ('assessment.save_score', 'POST', lambda n: '/api/assessment/score',
+         lambda n: {'module': 'facts', 'answers': ['13', '40', '7', '5', '13']}, 'access'),
+        ('assessment.get_scores', 'GET', lambda n: '/api/assessment/scores?limit=50', None, 'access'),
+        ('assessment.next_adaptive_item', 'POST', lambda n: f'/api/assessment/adaptive/{module()}/next-item',
+         lambda n: {'session': None}, 'access'),
+        ('assessment.get_checklist_questions', 'GET', lambda n: '/api/assessment/checklist/questions', None, 'access'),
+        ('assessment.save_checklist', 'POST', lambda n: '/api/assessment/checklist',
+         lambda n: {'responses': {str(k): rng.random() < 0.3 for k in range(8)}}, 'access'),
+        ('assessment.get_checklist', 'GET', lambda n: '/api/assessment/checklist', None, 'access'),
+        ('assessment.save_game_score', 'POST', lambda n: '/api/assessment/game-score',
+         lambda n: {'game_name': game(), 'score': rng.randint(0, 500)}, 'access'),
+        ('assessment.save_game_scores', 'POST', lambda n: '/api/assessment/game-scores',
+         lambda n: {'game_scores': [{'game_name': game(), 'score': rng.randint(0, 500)} for _ in range(10)]}, 'access'),
+        ('assessment.get_game_scores', 'GET', lambda n: '/api/assessment/game-scores?limit=50', None, 'access'),
+        ('assessment.get_leaderboard_games', 'GET', lambda n: '/api/assessment/leaderboard', None, 'access'),
+        ('assessment.get_leaderboard', 'GET', lambda n: f'/api/assessment/leaderboard/{game()}?limit=10', None, 'access'),
+        ('assessment.get_leaderboard_rank', 'GET', lambda n: f'/api/assessment/leaderboard/{game()}/rank', None, 'access'),
+        ('assessment.get_cohort_stats', 'GET', lambda n: '/api/assessment/cohort-stats?age=8', None, 'access'),
+        ('assessment.sync', 'GET', lambda n: '/api/assessment/sync', None, 'access'),
+        ('assessment.get_report', 'GET', lambda n: '/api/assessment/report', None, 'access')
+    ]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def drive(app, scenario, tokens, requests, concurrency):
+    """Send `requests` calls of one scenario from `concurrency` threads; returns its stats"""
+    name, method, path, body, token_kind = scenario
+    token_list = tokens[token_kind] if token_kind else []
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+    local = threading.local()
+
+    def one(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        with lock:
+            n = next(counter)
+        headers = {'Authorization': f'Bearer {token_list[n % len(token_list)]}'} if token_kind else {}
+        started = time.perf_counter()
+        response = client.open(path(n), method=method, json=body(n) if body else None, headers=headers)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(requests / wall, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+    }
+
+
+def uncovered_routes(app, covered):
+    """Endpoints of the auth and assessment blueprints that no scenario drives"""
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.startswith(('auth.', 'assessment.'))}
+    return sorted(endpoints - covered)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print p50/p95/throughput change per endpoint against an earlier results file"""
+    print(f"\nagainst {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for name, row in results['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if not old:
+            continue
+        delta = lambda key: (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"  {name:<38} p50 {delta('p50_ms'):+7.1f}%  p95 {delta('p95_ms'):+7.1f}%  rps {delta('throughput_rps'):+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to benchmark (default: a temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=100, help='Synthetic users to create')
+    parser.add_argument('--scores', type=int, default=20, help='Assessment scores per user')
+    parser.add_argument('--rounds', type=int, default=100, help='Game rounds per user')
+    parser.add_argument('--requests', type=int, default=300, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads')
+    parser.add_argument('--only', action='append', help='Run only endpoints containing this text (repeatable)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for data and request bodies')
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    workdir = None
+    database_url = args.database_url
+    if not database_url:
+        workdir = tempfile.TemporaryDirectory(prefix='numskill-bench-')
+        database_url = f"sqlite:///{os.path.join(workdir.name, 'bench.db')}"
+
+    app = build_app(database_url)
+    user_ids = seed(app, args.users, args.scores, args.rounds, rng)
+    tokens = {'access': sign_in(app, user_ids, len(user_ids))[0],
+              'refresh': sign_in(app, user_ids, args.requests)[1],
+              'logout': sign_in(app, user_ids, args.requests)[0]}
+    all_scenarios = scenarios(rng, max(1, args.users))
+    selected = [s for s in all_scenarios if not args.only or any(text in s[0] for text in args.only)]
+    missing = uncovered_routes(app, {s[0] for s in all_scenarios})
+    if missing:
+        print(f"Warning: no scenario for {', '.join(missing)}", file=sys.stderr)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': database_url.split('@')[-1],
+            'args': {k: v for k, v in vars(args).items() if k not in ('json_path', 'compare', 'database_url')}
+        },
+        'endpoints': {}
+    }
+
+    print(f"{'endpoint':<38} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for scenario in selected:
+        row = drive(app, scenario, tokens, args.requests, args.concurrency)
+        results['endpoints'][scenario[0]] = row
+        print(f"{scenario[0]:<38} {row['throughput_rps']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if workdir is not None:
+        workdir.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Compare JSON encoders and response compression on a large get_report payload.
+
+Seeds one user with a long history in an in-memory database, fetches
+`/api/assessment/report?detail=full`, then times the stdlib encoder against
+the app's provider and measures each content encoding:
+
+    python -m benchmarks.report_payload --scores 2000 --rounds 20000 --json results.json
+"""
+from sqlalchemy import insert
+from datetime import datetime, timedelta
+import argparse
+import statistics
+import random
+import json
+import time
+import gzip
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from app import create_app
+from models import db, AssessmentScore, GameScore, CandidateProfile
+import report_summary
+
+MODULES = ['magnitude', 'estimation', 'facts', 'sequencing', 'spatial', 'memory']
+GAMES = ['neon_runner', 'aqua_math', 'fact_match']
+
+
+def seed(app, scores, rounds):
+    """Create one user with `scores` assessment rows and `rounds` game rounds; returns auth headers"""
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password'})
+    token = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench-password'}).get_json()['access_token']
+
+    rng = random.Random(1)
+    start = datetime.utcnow() - timedelta(days=365)
+    with app.app_context():
+        user_id = 1
+        db.session.add(CandidateProfile(user_id=user_id, child_name='Bench', child_age=8, parent_name='Parent'))
+        db.session.execute(insert(AssessmentScore), [
+            {'user_id': user_id, 'module_name': rng.choice(MODULES), 'score': (s := rng.randint(0, 5)), 'total_questions': 5,
+             'percentage': s * 20.0, 'answers_json': '{}', 'created_at': start + timedelta(minutes=i)}
+            for i in range(scores)
+        ])
+        db.session.execute(insert(GameScore), [
+            {'user_id': user_id, 'game_name': rng.choice(GAMES), 'score': rng.randint(0, 500),
+             'created_at': start + timedelta(seconds=30 * i)}
+            for i in range(rounds)
+        ])
+        db.session.commit()
+        report_summary.rebuild(user_id)
+        db.session.commit()
+    return {'Authorization': f'Bearer {token}'}
+
+
+def timed(fn, repeat):
+    """Median seconds per call"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run(scores, rounds, repeat):
+    app = create_app('testing')
+    headers = seed(app, scores, rounds)
+    client = app.test_client()
+
+    raw = client.get('/api/assessment/report?detail=full', headers={**headers, 'Accept-Encoding': 'identity'})
+    report = json.loads(raw.get_data())
+
+    results = {'scores': scores, 'rounds': rounds, 'encoders': {}, 'encodings': {}, 'requests': {}}
+
+    stdlib = lambda: json.dumps(report, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    provider = lambda: app.json.dumpb(report)
+    for name, encode in (('stdlib', stdlib), ('provider' if not app.json.fast else 'orjson', provider)):
+        body = encode()
+        results['encoders'][name] = {'bytes': len(body), 'ms': timed(encode, repeat) * 1000}
+
+    body = provider()
+    encoders = {
+        'identity': lambda: body,
+        'gzip-6': lambda: gzip.compress(body, compresslevel=6, mtime=0),
+        'gzip-9': lambda: gzip.compress(body, compresslevel=9, mtime=0)
+    }
+    if brotli is not None:
+        encoders['br-5'] = lambda: brotli.compress(body, quality=5)
+    for name, encode in encoders.items():
+        results['encodings'][name] = {'bytes': len(encode()), 'ms': timed(encode, repeat) * 1000}
+
+    for accept in ('identity', 'gzip', 'br'):
+        request_headers = {**headers, 'Accept-Encoding': accept}
+        response = client.get('/api/assessment/report?detail=full', headers=request_headers)
+        fetch = lambda: client.get('/api/assessment/report?detail=full', headers=request_headers)
+        results['requests'][accept] = {
+            'content_encoding': response.headers.get('Content-Encoding', 'identity'),
+            'bytes': len(response.get_data()),
+            'ms': timed(fetch, repeat) * 1000
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scores', type=int, default=2000, help='Assessment scores in the report')
+    parser.add_argument('--rounds', type=int, default=20000, help='Game rounds in the report')
+    parser.add_argument('--repeat', type=int, default=15, help='Timed repetitions per measurement')
+    parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+    args = parser.parse_args(argv)
+
+    results = run(args.scores, args.rounds, args.repeat)
+    for section in ('encoders', 'encodings', 'requests'):
+        print(f'{section}:')
+        for name, row in results[section].items():
+            extra = f"  ({row['content_encoding']})" if 'content_encoding' in row else ''
+            print(f"  {name:<10} {row['bytes']:>10,} bytes  {row['ms']:>8.2f} ms{extra}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
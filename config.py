@@ -5,10 +5,157 @@ class Config:
     """Base configuration"""
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///numskill.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')  # optional replica for read-only endpoints
+
+    # Applied to every new SQLite connection (see database.py)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),  # milliseconds
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    }
+
+    # Database per school (see tenancy.py): set to a URL template with {shard}, e.g. sqlite:///shards/{shard}.db
+    # or postgresql://host/numskill?options=-csearch_path%3D{shard}; unset keeps everyone in one database
+    TENANT_SHARD_URL = os.getenv('TENANT_SHARD_URL')
+    TENANT_ENGINE_CACHE_SIZE = int(os.getenv('TENANT_ENGINE_CACHE_SIZE', '32'))  # open shard engines per worker
+    TENANT_CACHE_TTL = float(os.getenv('TENANT_CACHE_TTL', '30'))  # seconds a worker trusts its school -> shard map
+
+    # Pool settings for server databases such as PostgreSQL
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+    # Short-lived access tokens renewed with rotating refresh tokens (see revocation.py)
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', '15')))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', '30')))
+    JWT_REFRESH_REUSE_GRACE = float(os.getenv('JWT_REFRESH_REUSE_GRACE', '10'))  # seconds a just-rotated refresh token still works
+    REVOCATION_SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', '2'))  # seconds for other workers to see a revocation
+    REVOCATION_BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000'))  # revocations before the filter is resized
+
     JSON_SORT_KEYS = False
 
+    # bcrypt cost and worker pool (see password_hasher.py); existing hashes are upgraded on login
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    BCRYPT_USE_PROCESS_POOL = os.getenv('BCRYPT_USE_PROCESS_POOL', 'true').lower() == 'true'
+    BCRYPT_POOL_WORKERS = int(os.getenv('BCRYPT_POOL_WORKERS', '0')) or None  # None = one per CPU
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '16'))
+    BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', '10'))
+
+    # Resolved-user cache for /api/auth/verify and /api/auth/profile (see identity_cache.py)
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))  # seconds
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+
+    # Prometheus metrics at /api/metrics (see metrics.py); scrapes need METRICS_TOKEN as a bearer token (403 while unset)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    # Query profiler (see query_profiler.py): slow-query log, N+1 warnings and per-route query budgets
+    QUERY_PROFILER_ENABLED = os.getenv('QUERY_PROFILER_ENABLED', 'false').lower() == 'true'
+    QUERY_SLOW_MS = float(os.getenv('QUERY_SLOW_MS', '100'))
+    QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', '5'))
+    QUERY_BUDGET = int(os.getenv('QUERY_BUDGET')) if os.getenv('QUERY_BUDGET') else None  # default per-request limit
+    QUERY_BUDGETS = {}  # endpoint name -> limit, overriding QUERY_BUDGET
+    QUERY_BUDGET_ENFORCE = os.getenv('QUERY_BUDGET_ENFORCE', 'false').lower() == 'true'
+
+    # Admission control (see admission.py): token buckets per client IP / account and
+    # in-flight budgets per endpoint class; memory:// buckets are per worker process
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_STORAGE_URL = os.getenv('RATE_LIMIT_STORAGE_URL', 'memory://')
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', '0'))  # reverse proxies that append to X-Forwarded-For
+    RATE_LIMITS = {
+        'auth_ip': os.getenv('RATE_LIMIT_AUTH_IP', '60/minute'),
+        'write_ip': os.getenv('RATE_LIMIT_WRITE_IP', '1200/minute'),
+        'read_ip': os.getenv('RATE_LIMIT_READ_IP', '2400/minute'),
+        'bulk_ip': os.getenv('RATE_LIMIT_BULK_IP', '30/minute'),
+        'login_failures_account': os.getenv('RATE_LIMIT_LOGIN_FAILURES_ACCOUNT', '10/hour'),
+        'login_failures_ip': os.getenv('RATE_LIMIT_LOGIN_FAILURES_IP', '100/hour')
+    }
+    # Request threads per worker process: keep in step with gunicorn --threads (the Dockerfile reads it too).
+    # Every budget stays below it so no class can occupy all threads, and bcrypt-heavy auth gets at most half
+    WORKER_THREADS = int(os.getenv('WORKER_THREADS', '4'))
+    CONCURRENCY_BUDGETS = {
+        'auth': int(os.getenv('CONCURRENCY_AUTH', str(max(1, WORKER_THREADS // 2)))),
+        'write': int(os.getenv('CONCURRENCY_WRITE', str(max(1, WORKER_THREADS - 1)))),
+        'read': int(os.getenv('CONCURRENCY_READ', str(max(1, WORKER_THREADS - 1)))),
+        'bulk': int(os.getenv('CONCURRENCY_BULK', str(max(1, WORKER_THREADS // 4))))
+    }
+
+    # In-memory game leaderboards (see leaderboard.py)
+    GAME_NAMES = os.getenv('GAME_NAMES', 'neon_runner,aqua_math,fact_match')  # games that accept scores and have leaderboards
+    LEADERBOARD_AGE_BANDS = os.getenv('LEADERBOARD_AGE_BANDS', '4-5,6-7,8-9,10-11,12-14')
+    LEADERBOARD_REFRESH_INTERVAL = float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', '300'))  # seconds; 0 disables
+
+    # Cohort percentile norms (see analytics.py)
+    ANALYTICS_REFRESH_INTERVAL = float(os.getenv('ANALYTICS_REFRESH_INTERVAL', '60'))  # re-read cohort_norms in the background, seconds; 0 disables
+    ANALYTICS_RECOMPUTE_INTERVAL = float(os.getenv('ANALYTICS_RECOMPUTE_INTERVAL', '3600'))  # rebuild in-process, one worker per round; 0 = CLI/cron only
+    ANALYTICS_MIN_COHORT = int(os.getenv('ANALYTICS_MIN_COHORT', '5'))  # smaller cohorts report no norms
+
+    # Research data export (see export.py); the HTTP endpoint is disabled unless a token is set
+    EXPORT_TOKEN = os.getenv('EXPORT_TOKEN')
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+    # Bulk school onboarding (see onboarding.py); the HTTP endpoint is disabled unless a token is set
+    ONBOARDING_TOKEN = os.getenv('ONBOARDING_TOKEN')
+    ONBOARDING_MAX_ROWS = int(os.getenv('ONBOARDING_MAX_ROWS', '2000'))
+    ONBOARDING_CHUNK_SIZE = int(os.getenv('ONBOARDING_CHUNK_SIZE', '500'))
+
+    # Reject score submissions whose answers cannot be graded against QUESTION_BANKS
+    GRADING_REQUIRE_SERVER = os.getenv('GRADING_REQUIRE_SERVER', 'false').lower() == 'true'
+
+    # Stored responses for writes retried with an Idempotency-Key header
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+    IDEMPOTENCY_PENDING_TIMEOUT = int(os.getenv('IDEMPOTENCY_PENDING_TIMEOUT', '60'))
+
+    # Adaptive testing (see adaptive.py): generated items per module and stopping rule
+    ADAPTIVE_POOL_SIZE = int(os.getenv('ADAPTIVE_POOL_SIZE', '500'))
+    ADAPTIVE_MIN_ITEMS = int(os.getenv('ADAPTIVE_MIN_ITEMS', '5'))
+    ADAPTIVE_MAX_ITEMS = int(os.getenv('ADAPTIVE_MAX_ITEMS', '20'))
+    ADAPTIVE_SE_TARGET = float(os.getenv('ADAPTIVE_SE_TARGET', '0.4'))
+    ADAPTIVE_SESSION_MAX_AGE = int(os.getenv('ADAPTIVE_SESSION_MAX_AGE', '7200'))
+
+    # Response encoding: orjson when installed, and gzip/brotli for bodies of at least COMPRESS_MIN_SIZE bytes
+    JSON_FAST_ENCODER = os.getenv('JSON_FAST_ENCODER', 'true').lower() == 'true'
+    COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+
+    # HTML shell (see static_assets.py): inline blocks of at least ASSET_INLINE_MAX bytes are served
+    # as content-hashed, precompressed /assets files with immutable caching
+    ASSET_SHELL = os.getenv('ASSET_SHELL', 'index.html')
+    ASSET_INLINE_MAX = int(os.getenv('ASSET_INLINE_MAX', '1024'))
+
+    # Cache-Control max-age for precomputed question bank responses
+    STATIC_PAYLOAD_MAX_AGE = int(os.getenv('STATIC_PAYLOAD_MAX_AGE', '3600'))
+
+    # Game score write-behind buffer (see write_buffer.py)
+    GAME_SCORE_DURABILITY = os.getenv('GAME_SCORE_DURABILITY', 'group')  # immediate | group | async
+    GAME_SCORE_FLUSH_INTERVAL = float(os.getenv('GAME_SCORE_FLUSH_INTERVAL', '0.05'))  # seconds
+    GAME_SCORE_FLUSH_BATCH_SIZE = int(os.getenv('GAME_SCORE_FLUSH_BATCH_SIZE', '200'))
+    GAME_SCORE_BULK_MAX = int(os.getenv('GAME_SCORE_BULK_MAX', '500'))
+
+    # Game score retention (see retention.py): `compact-game-scores` rolls rounds older than this many
+    # days into daily per-(user, game) rollups and moves them to game_scores_archive (or NDJSON files)
+    GAME_SCORE_RETENTION_DAYS = int(os.getenv('GAME_SCORE_RETENTION_DAYS', '90'))
+    GAME_SCORE_ARCHIVE_DIR = os.getenv('GAME_SCORE_ARCHIVE_DIR')
+    GAME_SCORE_COMPACT_BATCH_SIZE = int(os.getenv('GAME_SCORE_COMPACT_BATCH_SIZE', '5000'))
+
+    # /api/assessment/report recent-history window
+    REPORT_RECENT_DEFAULT = 10
+    REPORT_RECENT_MAX = 100
+
+    # Printable clinician reports (see reports.py): rendered on a local thread pool and cached by a hash of their data
+    REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+    REPORT_USE_PROCESS_POOL = os.getenv('REPORT_USE_PROCESS_POOL', 'true').lower() == 'true'  # render outside the GIL
+    REPORT_HISTORY_ROWS = int(os.getenv('REPORT_HISTORY_ROWS', '50'))  # most recent assessment scores listed
+    REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', '300'))  # seconds before an unfinished job is retried
+    REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR')  # defaults to <instance>/reports
+    REPORT_RETENTION_DAYS = int(os.getenv('REPORT_RETENTION_DAYS', '30'))  # for `flask reports purge`
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
@@ -22,7 +169,17 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite:///:memory:')
+    BCRYPT_ROUNDS = 4
+    BCRYPT_USE_PROCESS_POOL = False
+    REPORT_USE_PROCESS_POOL = False
+    ANALYTICS_RECOMPUTE_INTERVAL = 0
+    RATE_LIMIT_ENABLED = False
+    QUERY_PROFILER_ENABLED = True
+    QUERY_BUDGET = 10
+    # Bulk import: SQLite cannot batch an ordered INSERT ... RETURNING, so it runs one per row
+    QUERY_BUDGETS = {'onboarding.import_users_endpoint': None}
+    QUERY_BUDGET_ENFORCE = True
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,138 @@
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select, Join
+from contextlib import contextmanager
+from functools import wraps
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+
+# Tables whose rows all belong to one user; with tenancy enabled they live on
+# the user's school shard, everything else stays in the primary (catalog) database
+TENANT_TABLES = frozenset({
+    'candidate_profiles', 'assessment_scores', 'checklist_responses', 'game_scores', 'game_score_daily',
+    'game_scores_archive', 'user_summaries', 'idempotency_keys', 'report_jobs',
+    'adaptive_sessions', 'deleted_rows', 'summary_modules', 'summary_games'
+})
+
+
+def _is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def pool_options(config, uri):
+    """Connection pool settings for server databases; SQLite keeps Flask-SQLAlchemy's defaults"""
+    if _is_sqlite(uri):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING']
+    }
+
+
+def configure_database(app):
+    """Fill engine options and the optional read-replica bind; call before db.init_app"""
+    config = app.config
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.update(pool_options(config, config['SQLALCHEMY_DATABASE_URI']))
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_uri = config.get('DATABASE_READ_URL')
+    if replica_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_uri, **pool_options(config, replica_uri)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def install_sqlite_pragmas(db, app):
+    """Apply SQLITE_PRAGMAS to every new connection of each SQLite engine"""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        apply_sqlite_pragmas(engine, pragmas)
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+# --- READ/WRITE ROUTING ---
+def read_only(view):
+    """Mark a view as read-only so its queries may be served by the read replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    """Force the primary database inside a read-only view (e.g. for a lazy write)"""
+    previous = g.get('db_read_only', False)
+    g.db_read_only = False
+    try:
+        yield
+    finally:
+        g.db_read_only = previous
+
+
+def _tables(selectable):
+    if isinstance(selectable, Join):
+        return _tables(selectable.left) + _tables(selectable.right)
+    return [selectable]
+
+
+def is_tenant_statement(mapper, clause):
+    """True when a statement targets a TENANT_TABLES table"""
+    if mapper is not None:
+        tables = [mapper.local_table]
+    elif getattr(clause, 'table', None) is not None:  # INSERT / UPDATE / DELETE
+        tables = [clause.table]
+    elif isinstance(clause, Select):
+        tables = [t for f in clause.get_final_froms() for t in _tables(f)]
+    else:
+        return False
+    return any(getattr(table, 'name', None) in TENANT_TABLES for table in tables)
+
+
+class RoutingSession(Session):
+    """Route statements to a database engine.
+
+    Tenant tables go to the request's school shard when one is bound (see
+    tenancy.py). Plain reads from read-only views go to the replica bind.
+    Everything else goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shard_engine = g.get('db_shard_engine')
+            if shard_engine is not None and is_tenant_statement(mapper, clause):
+                return shard_engine
+        if (
+            bind is None
+            and not self._flushing
+            and has_app_context()
+            and g.get('db_read_only', False)
+            and REPLICA_BIND in self._db.engines
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,143 @@
+from sqlalchemy import func, literal, tuple_
+from models import CandidateProfile, AssessmentScore, ChecklistResponse, GameScore, GameScoreDaily, DeletedRow
+from datetime import date, datetime, timedelta
+import hashlib
+import base64
+import json
+
+# Watermark slot -> (response key, model, timestamp column) for insert-only
+# tables: the last id seen is a monotonic position in each user's history.
+# Deletions from synced tables are themselves appended, as tombstones
+APPENDED = {
+    'g': ('game_scores', GameScore, 'created_at'),
+    'x': ('deleted', DeletedRow, 'deleted_at')
+}
+
+# Watermark slot -> (response key, model, fallback timestamp column, key columns)
+# for tables whose rows change after insert (re-grading, game score compaction).
+# They are read in (updated_at, key) order; rows from before updated_at existed
+# use the fallback timestamp
+UPDATED = {
+    'a': ('assessment_scores', AssessmentScore, 'created_at', ('id',)),
+    'd': ('game_daily', GameScoreDaily, 'last_played_at', ('game_name', 'day'))
+}
+
+# Watermark slot -> (response key, model) for the one-row-per-user tables. They
+# are replaced on save (delete + insert), and SQLite reuses the freed rowid, so
+# they are versioned by a digest of their content instead of by id
+SINGLE_ROWS = {
+    'p': ('profile', CandidateProfile),
+    'c': ('checklist', ChecklistResponse)
+}
+
+# Rows this young may still have neighbours in flight (transactions that
+# commit out of order), so the watermark does not move past them yet
+SETTLE_SECONDS = 5
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _parse(value, python_type):
+    return python_type.fromisoformat(value) if python_type in (date, datetime) else python_type(value)
+
+
+def encode_watermark(mark):
+    raw = json.dumps({slot: [_plain(v) for v in value] if isinstance(value, tuple) else value
+                      for slot, value in mark.items()}, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_watermark(watermark):
+    """Inverse of encode_watermark; an empty watermark means everything; raises ValueError on malformed input"""
+    if not watermark:
+        return {}
+    try:
+        padded = watermark + '=' * (-len(watermark) % 4)
+        mark = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        for slot in APPENDED:
+            if slot in mark:
+                mark[slot] = int(mark[slot])
+        for slot, (_, model, _, keys) in UPDATED.items():
+            if not isinstance(mark.get(slot), list):
+                mark.pop(slot, None)  # missing, or an id from before the table was re-read by updated_at
+                continue
+            types = [datetime] + [model.__table__.c[key].type.python_type for key in keys]
+            if len(mark[slot]) != len(types):
+                raise ValueError
+            mark[slot] = tuple(_parse(value, python_type) for value, python_type in zip(mark[slot], types))
+        return mark
+    except Exception:
+        raise ValueError('Invalid watermark')
+
+
+def _row_version(row):
+    """Short digest of a single-row table's content"""
+    raw = json.dumps(row.to_dict(), sort_keys=True).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+
+def _changed_at(row, fallback):
+    return row.updated_at or getattr(row, fallback)
+
+
+def _settle(rows, limit, start, settle_before, stamp, position):
+    """(rows to send, new position, has_more) for one table's page of `limit + 1` rows.
+
+    The position stops before the first row younger than the settle window;
+    those rows are sent now and again next time. A page cut short there
+    does not report more, so the client does not re-poll the same rows.
+    """
+    full = len(rows) > limit
+    rows = rows[:limit]
+    settled = start
+    for row in rows:
+        if stamp(row) is not None and stamp(row) > settle_before:
+            return rows, settled, False
+        settled = position(row)
+    return rows, settled, full
+
+
+def changes_since(user_id, mark, limit):
+    """Rows added, changed or deleted for a user after `mark`, at most `limit` per table.
+
+    Returns (changes, new_mark, has_more). The profile and checklist are
+    included only when they differ from the versions recorded in the watermark.
+    """
+    changes = {}
+    new_mark = {}
+    has_more = False
+    settle_before = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+
+    for slot, (name, model, stamp) in APPENDED.items():
+        last_id = mark.get(slot, 0)
+        rows = model.query.filter(model.user_id == user_id, model.id > last_id).order_by(model.id).limit(limit + 1).all()
+        rows, new_mark[slot], more = _settle(rows, limit, last_id, settle_before,
+                                             lambda row: getattr(row, stamp), lambda row: row.id)
+        changes[name] = [row.to_dict() for row in rows]
+        has_more = has_more or more
+
+    for slot, (name, model, fallback, keys) in UPDATED.items():
+        changed_at = func.coalesce(model.updated_at, getattr(model, fallback))
+        order = [changed_at] + [getattr(model, key) for key in keys]
+        query = model.query.filter(model.user_id == user_id)
+        if slot in mark:
+            query = query.filter(tuple_(*order) > tuple_(*[literal(value, column.type) for value, column in zip(mark[slot], order)]))
+        rows = query.order_by(*order).limit(limit + 1).all()
+        rows, position, more = _settle(rows, limit, mark.get(slot), settle_before,
+                                       lambda row: _changed_at(row, fallback),
+                                       lambda row: (_changed_at(row, fallback),) + tuple(getattr(row, key) for key in keys))
+        changes[name] = [row.to_dict() for row in rows]
+        if position is not None:
+            new_mark[slot] = position
+        has_more = has_more or more
+
+    for slot, (name, model) in SINGLE_ROWS.items():
+        row = model.query.filter_by(user_id=user_id).order_by(model.id.desc()).first()
+        version = _row_version(row) if row else None
+        if version != mark.get(slot):
+            changes[name] = row.to_dict() if row else None
+        new_mark[slot] = version
+
+    return changes, new_mark, has_more
@@ -0,0 +1,168 @@
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from sqlalchemy import select
+from models import db, CandidateProfile, AssessmentScore, ChecklistResponse, GameScore, GameScoreArchive
+from admin_auth import token_required
+from tenancy import tenant_router, PRIMARY
+from datetime import datetime
+import json
+import csv
+import io
+import sys
+import click
+
+export_bp = Blueprint('export', __name__, url_prefix='/api/export')
+
+# table name -> (model, {json text column: decoded output field})
+EXPORTS = {
+    'candidate_profiles': (CandidateProfile, {}),
+    'assessment_scores': (AssessmentScore, {'answers_json': 'answers'}),
+    'checklist_responses': (ChecklistResponse, {'responses_json': 'responses'}),
+    'game_scores': (GameScore, {}),
+    'game_scores_archive': (GameScoreArchive, {})  # rounds compacted out of game_scores
+}
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+CHUNK_ROWS = 500
+
+
+def _parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date or datetime')
+
+
+def build_query(table, since=None, until=None, module=None, game_name=None):
+    """Core SELECT for one export table; ORM entities are avoided so memory stays flat"""
+    if table not in EXPORTS:
+        raise ValueError(f"Unknown table '{table}', expected one of {', '.join(EXPORTS)}")
+    model, _ = EXPORTS[table]
+    query = select(*model.__table__.columns).order_by(model.id)
+    if since:
+        query = query.where(model.created_at >= since)
+    if until:
+        query = query.where(model.created_at < until)
+    if module and table == 'assessment_scores':
+        query = query.where(model.module_name == module)
+    if game_name and table in ('game_scores', 'game_scores_archive'):
+        query = query.where(model.game_name == game_name)
+    return query
+
+
+def _records(table, query, batch_size):
+    _, decoded = EXPORTS[table]
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for row in result.mappings():
+        record = {}
+        for key, value in row.items():
+            if key in decoded:
+                record[decoded[key]] = json.loads(value) if value else None
+            elif isinstance(value, datetime):
+                record[key] = value.isoformat()
+            else:
+                record[key] = value
+        yield record
+
+
+def _columns(table):
+    model, decoded = EXPORTS[table]
+    return [decoded.get(c.name, c.name) for c in model.__table__.columns]
+
+
+def generate(table, fmt, query, batch_size=1000):
+    """Yield the export as text chunks of roughly CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=_columns(table))
+        writer.writeheader()
+
+    pending = 0
+    for record in _records(table, query, batch_size):
+        if writer is not None:
+            for key, value in record.items():
+                if isinstance(value, (dict, list)):
+                    record[key] = json.dumps(value)
+            writer.writerow(record)
+        else:
+            buffer.write(json.dumps(record))
+            buffer.write('\n')
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _resolve_shard(name):
+    """Shard to export from: PRIMARY (default) or a shard named in the tenants table"""
+    if not name or name == PRIMARY:
+        return None
+    if name not in tenant_router.shards():
+        raise ValueError(f"Unknown shard '{name}'")
+    return name
+
+
+def on_shard(shard, chunks):
+    """Run a lazy export generator with tenant tables bound to `shard`"""
+    with tenant_router.use_shard(shard):
+        yield from chunks
+
+
+@export_bp.route('/<table>', methods=['GET'])
+@token_required('EXPORT_TOKEN', header='X-Export-Token')
+def export_table(table):
+    """Stream a full table export as NDJSON or CSV (`format`, `since`, `until`, `module`, `game_name`, `shard`)"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        query = build_query(
+            table,
+            since=_parse_date(request.args.get('since'), 'since'),
+            until=_parse_date(request.args.get('until'), 'until'),
+            module=request.args.get('module'),
+            game_name=request.args.get('game_name')
+        )
+        shard = _resolve_shard(request.args.get('shard'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    chunks = on_shard(shard, generate(table, fmt, query, batch_size))
+    response = Response(stream_with_context(chunks), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={table}.{fmt}'
+    return response
+
+
+@export_bp.cli.command('run')
+@click.argument('table', type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='ndjson', show_default=True)
+@click.option('--since', default=None, help='Only rows created at or after this ISO date')
+@click.option('--until', default=None, help='Only rows created before this ISO date')
+@click.option('--module', default=None, help='assessment_scores module_name filter')
+@click.option('--game-name', default=None, help='game_scores game_name filter')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='Write here instead of stdout')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--shard', default=PRIMARY, show_default=True, help='Tenant shard to export per-user tables from')
+def export_command(table, fmt, since, until, module, game_name, output, batch_size, shard):
+    """Stream one table to stdout or a file"""
+    try:
+        query = build_query(table, _parse_date(since, 'since'), _parse_date(until, 'until'), module, game_name)
+        shard = _resolve_shard(shard)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in on_shard(shard, generate(table, fmt, query, batch_size)):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
@@ -0,0 +1,223 @@
+from sqlalchemy import update
+from models import db, AssessmentScore
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+import threading
+import hashlib
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+# Cell values in an encoded submission matrix (otherwise the chosen option index)
+NOT_PRESENTED = -1
+NO_VALID_ANSWER = -2
+
+# Item-level outcomes are packed into signed 64-bit masks keyed by answer-key position
+MAX_MASK_ITEMS = 63
+
+GradeResult = namedtuple('GradeResult', ['score', 'total', 'percentage', 'version', 'presented_mask', 'correct_mask'])
+
+
+def bank_version(questions):
+    """Short content hash identifying one revision of a question list"""
+    raw = json.dumps(questions, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+
+def _normalize(text):
+    return ' '.join(str(text).split()).lower()
+
+
+def item_id(module, index):
+    """Canonical id of a bank question ("magnitude:0"), independent of how a client words it"""
+    return f'{module}:{index}'
+
+
+def _answer_items(answers):
+    """Yield (position, item_id, question_text, answer, client_options) from any accepted answers shape.
+
+    Accepts the frontend's list of question objects ({id, q, options, userAnswer, ...}),
+    a plain list of answers by position, or a dict keyed by item id, question
+    text or position. client_options is the option list the client showed, if it sent one.
+    """
+    if isinstance(answers, dict):
+        for key, value in answers.items():
+            if isinstance(key, int) or (isinstance(key, str) and key.isdigit()):
+                yield int(key), None, None, value, None
+            else:
+                yield None, key, key, value, None
+    elif isinstance(answers, list):
+        for position, item in enumerate(answers):
+            if isinstance(item, dict):
+                answer = item.get('userAnswer', item.get('answer'))
+                options = item.get('options')
+                yield position, item.get('id'), item.get('q'), answer, options if isinstance(options, list) else None
+            else:
+                yield position, None, None, item, None
+
+
+class AnswerKey:
+    """Compiled answer key for one module at one bank version"""
+
+    def __init__(self, module, version, questions, ids, positional=True):
+        self.module = module
+        self.version = version
+        self.size = len(questions)
+        self.positional = positional
+        self.texts = [q['q'] for q in questions]
+        self.by_id = {item: i for i, item in enumerate(ids)}
+        self.by_text = {_normalize(q['q']): i for i, q in enumerate(questions)}
+        self.option_index = [{_normalize(opt): j for j, opt in enumerate(q['options'])} for q in questions]
+        self.correct = np.array([q['options'].index(q['a']) for q in questions], dtype=np.int16)
+        self._bits = np.left_shift(np.int64(1), np.arange(self.size, dtype=np.int64)) if self.size <= MAX_MASK_ITEMS else None
+
+    def encode(self, answers):
+        """One submission as a row of chosen option indices over this key's questions"""
+        row = np.full(self.size, NOT_PRESENTED, dtype=np.int16)
+        for position, item, text, answer, options in _answer_items(answers):
+            index = self.by_id.get(item) if isinstance(item, str) else None
+            if index is None and text is not None:
+                index = self.by_text.get(_normalize(text))
+            # Fall back to position for fixed-order modules whose client copy words questions differently
+            if index is None and self.positional and position is not None and position < self.size:
+                index = position
+            if index is None:
+                continue
+            choice = self.option_index[index].get(_normalize(answer)) if answer is not None else None
+            # The client may label options differently ("← Left" for "←"); map by option index then
+            if choice is None and answer is not None and options and len(options) == len(self.option_index[index]):
+                labels = [_normalize(option) for option in options]
+                choice = labels.index(_normalize(answer)) if _normalize(answer) in labels else None
+            row[index] = NO_VALID_ANSWER if choice is None else choice
+        return row
+
+    def score_matrix(self, matrix):
+        """Vectorized (scores, totals) for a stack of encoded submissions.
+
+        A fixed-order module is always out of its whole bank, so omitted items
+        count as wrong; the mixed module is out of the items presented. A
+        submission that matches nothing has a total of 0 either way.
+        """
+        presented = (matrix != NOT_PRESENTED).sum(axis=1)
+        correct = matrix == self.correct
+        totals = np.where(presented > 0, self.size, 0) if self.positional else presented
+        return correct.sum(axis=1), totals
+
+    def mask_matrix(self, matrix):
+        """Vectorized (presented_masks, correct_masks); None when the key is too long to pack"""
+        if self._bits is None:
+            return None, None
+        presented = (matrix != NOT_PRESENTED).astype(np.int64) @ self._bits
+        correct = (matrix == self.correct).astype(np.int64) @ self._bits
+        return presented, correct
+
+
+class GradingEngine:
+    """Answer-key index over QUESTION_BANKS, versioned by bank content"""
+
+    def __init__(self):
+        self._keys = {}  # (module, version) -> AnswerKey; old versions stay for re-grading audits
+        self._current = {}  # module -> current version
+        self._lock = threading.Lock()
+
+    def load(self, banks):
+        """Compile keys for every module plus the mixed 'consolidated' module"""
+        keys = {}
+        for module, questions in banks.items():
+            ids = [item_id(module, i) for i in range(len(questions))]
+            keys[module] = AnswerKey(module, bank_version(questions), questions, ids)
+        # The mixed module keeps each question's own id, which is how clients identify consolidated items
+        combined = [q for questions in banks.values() for q in questions]
+        combined_ids = [item_id(module, i) for module, questions in banks.items() for i in range(len(questions))]
+        keys['consolidated'] = AnswerKey('consolidated', bank_version(combined), combined, combined_ids, positional=False)
+
+        with self._lock:
+            for module, key in keys.items():
+                self._keys[(module, key.version)] = key
+            self._current = {module: key.version for module, key in keys.items()}
+
+    def key(self, module, version=None):
+        version = version or self._current.get(module)
+        return self._keys.get((module, version))
+
+    def grade(self, module, answers):
+        """Grade one submission; None when the answers match nothing in the bank"""
+        key = self.key(module)
+        if key is None or not answers:
+            return None
+        matrix = key.encode(answers)[np.newaxis, :]
+        scores, totals = key.score_matrix(matrix)
+        score, total = int(scores[0]), int(totals[0])
+        if total == 0:
+            return None
+        presented, correct = key.mask_matrix(matrix)
+        return GradeResult(score, total, score / total * 100, key.version,
+                           int(presented[0]) if presented is not None else None,
+                           int(correct[0]) if correct is not None else None)
+
+    def regrade(self, module=None, batch_size=2000):
+        """Re-score stored submissions against the current keys in vectorized batches.
+
+        Returns (rows_checked, rows_changed, affected_user_ids).
+        """
+        modules = [module] if module else list(self._current)
+        checked = changed = 0
+        affected = set()
+
+        for name in modules:
+            key = self.key(name)
+            rows = db.session.query(
+                AssessmentScore.id, AssessmentScore.user_id, AssessmentScore.score,
+                AssessmentScore.total_questions, AssessmentScore.answers_json, AssessmentScore.answer_key_version,
+                AssessmentScore.presented_mask
+            ).filter(AssessmentScore.module_name == name).order_by(AssessmentScore.id).yield_per(batch_size)
+
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    changed += self._regrade_batch(key, batch, affected)
+                    checked += len(batch)
+                    batch = []
+            if batch:
+                changed += self._regrade_batch(key, batch, affected)
+                checked += len(batch)
+            db.session.commit()
+
+        logger.info(f"Re-graded {checked} assessment scores, {changed} changed")
+        return checked, changed, affected
+
+    def _regrade_batch(self, key, batch, affected):
+        matrix = np.stack([key.encode(json.loads(r.answers_json) if r.answers_json else {}) for r in batch])
+        scores, totals = key.score_matrix(matrix)
+        presented, correct = key.mask_matrix(matrix)
+
+        old_scores = np.array([r.score for r in batch])
+        old_totals = np.array([r.total_questions for r in batch])
+        missing_masks = presented is not None
+        stale = np.array([r.answer_key_version != key.version or (missing_masks and r.presented_mask is None) for r in batch])
+        gradable = totals > 0
+        dirty = np.flatnonzero(gradable & ((scores != old_scores) | (totals != old_totals) | stale))
+
+        if dirty.size:
+            now = datetime.utcnow()
+            db.session.execute(update(AssessmentScore), [
+                {
+                    'id': batch[i].id,
+                    'score': int(scores[i]),
+                    'total_questions': int(totals[i]),
+                    'percentage': float(scores[i]) / float(totals[i]) * 100,
+                    'answer_key_version': key.version,
+                    'presented_mask': int(presented[i]) if presented is not None else None,
+                    'correct_mask': int(correct[i]) if correct is not None else None,
+                    'updated_at': now  # delta sync sends re-graded rows again
+                }
+                for i in dirty
+            ])
+            affected.update(batch[i].user_id for i in dirty)
+        return int(dirty.size)
+
+
+grading_engine = GradingEngine()
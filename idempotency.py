@@ -0,0 +1,115 @@
+from flask import request, jsonify, current_app, make_response, Response
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 100
+
+
+def _reserve(user_id, key, endpoint, request_hash):
+    """Claim the key for this request; returns the existing record when someone already holds it"""
+    db.session.add(IdempotencyKey(user_id=user_id, key=key, endpoint=endpoint, request_hash=request_hash))
+    try:
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+
+    record = db.session.get(IdempotencyKey, (user_id, key))
+    if record is None:
+        # The holder released the key between our insert and this read
+        return _reserve(user_id, key, endpoint, request_hash)
+
+    now = datetime.utcnow()
+    expired = record.created_at < now - timedelta(seconds=current_app.config.get('IDEMPOTENCY_TTL', 86400))
+    abandoned = record.status_code is None and record.created_at < now - timedelta(
+        seconds=current_app.config.get('IDEMPOTENCY_PENDING_TIMEOUT', 60))
+    if not (expired or abandoned):
+        return record
+
+    # The stored outcome is too old to matter, or its request died before finishing
+    record.endpoint = endpoint
+    record.request_hash = request_hash
+    record.status_code = None
+    record.response_body = None
+    record.created_at = now
+    db.session.commit()
+    return None
+
+
+def _replay(record, endpoint, request_hash):
+    if record.endpoint != endpoint or record.request_hash != request_hash:
+        return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+    if record.status_code is None:
+        response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    response = Response(record.response_body, status=record.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Make a JWT-protected write safe to retry with an Idempotency-Key header.
+
+    The first request claims (user, key) before running the view; once it
+    finishes, its response is stored and every retry with the same key and
+    body gets that response back instead of writing again. Server errors
+    release the key so the client can retry for real. Requests without the
+    header are unaffected.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = int(get_jwt_identity())
+        endpoint = request.endpoint
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        record = _reserve(user_id, key, endpoint, request_hash)
+        if record is not None:
+            return _replay(record, endpoint, request_hash)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _release(user_id, key)
+            raise
+
+        if response.status_code >= 500:
+            _release(user_id, key)
+            return response
+
+        record = db.session.get(IdempotencyKey, (user_id, key))
+        if record is not None:
+            record.status_code = response.status_code
+            record.response_body = response.get_data(as_text=True)
+            db.session.commit()
+        return response
+    return wrapper
+
+
+def _release(user_id, key):
+    db.session.rollback()
+    IdempotencyKey.query.filter_by(user_id=user_id, key=key, status_code=None).delete()
+    db.session.commit()
+
+
+def purge_expired(ttl_seconds):
+    """Delete stored outcomes older than the TTL; returns rows deleted"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete()
+    db.session.commit()
+    logger.info(f"Purged {deleted} idempotency keys")
+    return deleted
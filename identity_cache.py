@@ -0,0 +1,76 @@
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from collections import OrderedDict
+from models import db, User
+import threading
+import time
+
+
+class UserCache:
+    """Process-local TTL/LRU cache of `User.to_dict()` keyed by JWT identity.
+
+    Entries are dropped when the User row is updated or deleted through the
+    ORM in this process; other workers converge within `ttl` seconds.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read cache size and TTL from the app config"""
+        self.maxsize = int(app.config.get('USER_CACHE_SIZE', self.maxsize))
+        self.ttl = float(app.config.get('USER_CACHE_TTL', self.ttl))
+        self.clear()
+
+    def get(self, user_id):
+        """Return the cached user dict, loading it from the database on a miss"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        user_dict = user.to_dict()
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, user_dict)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return user_dict
+
+    def invalidate(self, user_id):
+        """Forget one user"""
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def clear(self):
+        """Forget every user"""
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+    # Drop it again once committed, in case a reader re-cached the old row meanwhile
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
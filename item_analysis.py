@@ -0,0 +1,188 @@
+from sqlalchemy import func, literal, tuple_, update
+from models import db, AssessmentScore, ChecklistResponse, ItemStatistic, JobWatermark
+from tenancy import tenant_router
+from grading import grading_engine
+from delta_sync import SETTLE_SECONDS
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'item_statistics'
+
+
+# --- CHECKLIST PACKING ---
+def pack_checklist(responses, questions):
+    """(answered_mask, yes_mask) for checklist responses keyed by position or question text"""
+    by_text = {q: i for i, q in enumerate(questions)}
+    answered = yes = 0
+    for key, value in (responses or {}).items():
+        index = int(key) if str(key).isdigit() else by_text.get(key)
+        if index is None or index >= len(questions) or value is None:
+            continue
+        answered |= 1 << index
+        if value is True or value == 'yes':
+            yes |= 1 << index
+    return answered, yes
+
+
+def pack_stored_checklists(questions, batch_size=2000):
+    """Fill masks for checklist rows saved before they existed, on every shard; returns rows updated"""
+    updated = 0
+    for _ in tenant_router.each_shard():
+        while True:
+            rows = db.session.query(ChecklistResponse.id, ChecklistResponse.responses_json).filter(
+                ChecklistResponse.answered_mask.is_(None)
+            ).order_by(ChecklistResponse.id).limit(batch_size).all()
+            if not rows:
+                break
+            values = []
+            for row_id, responses_json in rows:
+                answered, yes = pack_checklist(json.loads(responses_json) if responses_json else {}, questions)
+                values.append({'id': row_id, 'answered_mask': answered, 'yes_mask': yes})
+            db.session.execute(update(ChecklistResponse), values)
+            db.session.commit()
+            updated += len(rows)
+    return updated
+
+
+# --- INCREMENTAL ITEM STATISTICS ---
+def _unpack(masks, size):
+    return (masks[:, np.newaxis] >> np.arange(size, dtype=np.int64)) & 1
+
+
+def _accumulate(module, version, presented_masks, correct_masks):
+    key = grading_engine.key(module, version)
+    size = key.size if key is not None else int(presented_masks.max()).bit_length()
+    presented = _unpack(presented_masks, size)
+    correct = _unpack(correct_masks, size)
+    totals = correct.sum(axis=1)[:, np.newaxis]
+
+    sums = {
+        'presented': presented.sum(axis=0),
+        'correct': correct.sum(axis=0),
+        'sum_score': (presented * totals).sum(axis=0),
+        'sum_score_sq': (presented * totals ** 2).sum(axis=0),
+        'sum_correct_score': (correct * totals).sum(axis=0)
+    }
+
+    existing = {s.item_index: s for s in ItemStatistic.query.filter_by(module_name=module, answer_key_version=version)}
+    for index in np.flatnonzero(sums['presented']):
+        stat = existing.get(int(index))
+        if stat is None:
+            stat = ItemStatistic(module_name=module, answer_key_version=version, item_index=int(index),
+                                 presented=0, correct=0, sum_score=0, sum_score_sq=0, sum_correct_score=0)
+            db.session.add(stat)
+        for field, values in sums.items():
+            setattr(stat, field, getattr(stat, field) + int(values[index]))
+
+
+def _watermarks():
+    return db.or_(JobWatermark.name == WATERMARK, JobWatermark.name.like(f'{WATERMARK}:%'))
+
+
+def update_item_statistics(batch_size=5000):
+    """Fold graded submissions past each shard's watermark into item_statistics; returns rows consumed.
+
+    Rows are read in (created_at, id) order up to a cutoff SETTLE_SECONDS
+    ago (see delta_sync.py), so a transaction that commits after a higher id
+    is still picked up, and every shard's watermark ends the run at that same
+    cutoff. move_tenant keeps created_at, so a moved row is on the same side
+    of the watermark on both shards and is counted exactly once.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+    # A shard seen for the first time starts where the others are: older rows on it were moved there, already counted
+    baseline = db.session.query(func.max(JobWatermark.last_at)).filter(_watermarks()).scalar()
+    consumed = 0
+    for shard in tenant_router.each_shard():
+        consumed += _update_from_shard(f'{WATERMARK}:{shard}' if shard else WATERMARK, batch_size, cutoff, baseline)
+    logger.info(f"Item statistics updated from {consumed} submissions")
+    return consumed
+
+
+def _update_from_shard(watermark, batch_size, cutoff, baseline):
+    mark = db.session.get(JobWatermark, watermark)
+    if mark is None:
+        mark = JobWatermark(name=watermark, last_id=0, last_at=baseline)
+        db.session.add(mark)
+    # Watermarks from before created_at ordering hold only an id; it bounds this one run
+    legacy_id = mark.last_id if mark.last_at is None else 0
+
+    consumed = 0
+    while True:
+        query = db.session.query(
+            AssessmentScore.id, AssessmentScore.created_at, AssessmentScore.module_name,
+            AssessmentScore.answer_key_version, AssessmentScore.presented_mask, AssessmentScore.correct_mask
+        ).filter(
+            AssessmentScore.presented_mask.isnot(None), AssessmentScore.created_at < cutoff,
+            AssessmentScore.id > legacy_id
+        )
+        if mark.last_at is not None:
+            query = query.filter(tuple_(AssessmentScore.created_at, AssessmentScore.id) >
+                                 tuple_(literal(mark.last_at, AssessmentScore.created_at.type), literal(mark.last_id)))
+        rows = query.order_by(AssessmentScore.created_at, AssessmentScore.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        groups = defaultdict(list)
+        for row in rows:
+            groups[(row.module_name, row.answer_key_version)].append((row.presented_mask, row.correct_mask))
+        for (module, version), masks in groups.items():
+            masks = np.array(masks, dtype=np.int64)
+            _accumulate(module, version, masks[:, 0], masks[:, 1])
+
+        mark.last_at, mark.last_id = rows[-1].created_at, rows[-1].id
+        db.session.commit()
+        consumed += len(rows)
+
+    if mark.last_at is None or mark.last_at < cutoff:
+        mark.last_at, mark.last_id = cutoff, 0
+    db.session.commit()
+    return consumed
+
+
+def reset_item_statistics():
+    """Drop accumulated statistics so the next update starts over (e.g. after a re-grade)"""
+    ItemStatistic.query.delete()
+    JobWatermark.query.filter(_watermarks()).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def item_report(module=None, current_only=True):
+    """Per-question p-value and corrected item-total (point-biserial) discrimination"""
+    query = ItemStatistic.query
+    if module:
+        query = query.filter_by(module_name=module)
+
+    report = []
+    for stat in query.order_by(ItemStatistic.module_name, ItemStatistic.item_index):
+        key = grading_engine.key(stat.module_name, stat.answer_key_version)
+        if current_only and key is not grading_engine.key(stat.module_name):
+            continue
+        n, c = stat.presented, stat.correct
+        p = c / n if n else None
+
+        # Rest score R = T - x excludes the item itself; with x in {0, 1}, x^2 = x
+        sum_rest = stat.sum_score - c
+        sum_rest_sq = stat.sum_score_sq - 2 * stat.sum_correct_score + c
+        sum_item_rest = stat.sum_correct_score - c
+        discrimination = None
+        if n:
+            var_item = p * (1 - p)
+            var_rest = sum_rest_sq / n - (sum_rest / n) ** 2
+            if var_item > 0 and var_rest > 0:
+                discrimination = (sum_item_rest / n - p * sum_rest / n) / (var_item * var_rest) ** 0.5
+
+        report.append({
+            'module_name': stat.module_name,
+            'answer_key_version': stat.answer_key_version,
+            'item_index': stat.item_index,
+            'question': key.texts[stat.item_index] if key is not None else None,
+            'presented': n,
+            'p_value': round(p, 3) if p is not None else None,
+            'discrimination': round(discrimination, 3) if discrimination is not None else None
+        })
+    return report
@@ -0,0 +1,318 @@
+from sqlalchemy import func
+from models import db, GameScore, GameScoreDaily, CandidateProfile
+from tenancy import tenant_router
+from collections import defaultdict
+import threading
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# --- ORDER-STATISTICS TREE ---
+class _Node:
+    __slots__ = ('key', 'priority', 'size', 'left', 'right')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node, key):
+    """Split into (keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        return _update(node), right
+    left, right = _split(node.left, key)
+    node.left = right
+    return left, _update(node)
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key == node.key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    else:
+        node.right = _remove(node.right, key)
+    return _update(node)
+
+
+class OrderStatisticTree:
+    """Treap with subtree sizes: O(log n) insert, remove and rank"""
+
+    def __init__(self):
+        self._root = None
+
+    def __len__(self):
+        return _size(self._root)
+
+    def insert(self, key):
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        self._root = _remove(self._root, key)
+
+    def count_less(self, key):
+        """Number of stored keys strictly less than `key`"""
+        count, node = 0, self._root
+        while node is not None:
+            if node.key < key:
+                count += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def first(self, n):
+        """The n smallest keys in order"""
+        result, stack, node = [], [], self._root
+        while (stack or node is not None) and len(result) < n:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                result.append(node.key)
+                node = node.right
+        return result
+
+
+# --- LEADERBOARDS ---
+def parse_age_bands(spec):
+    """'4-5,6-7' -> [(4, 5), (6, 7)]"""
+    bands = []
+    for part in (spec or '').split(','):
+        if part.strip():
+            low, high = part.split('-')
+            bands.append((int(low), int(high)))
+    return bands
+
+
+def parse_game_names(spec):
+    """'neon_runner, aqua_math' -> frozenset({'neon_runner', 'aqua_math'})"""
+    return frozenset(name.strip() for name in (spec or '').split(',') if name.strip())
+
+
+class Leaderboards:
+    """Per-game rankings of each child's best score, overall and by age band.
+
+    Trees are keyed by (-best_score, user_id) so in-order traversal is
+    best-first and a child's rank is one more than the number of keys below
+    (-score, 0), i.e. children with a strictly higher best score. State is
+    process-local; a background thread reloads it from the database every
+    `refresh_interval` seconds so gunicorn workers converge on each other's
+    writes. The reload builds new trees off to the side and swaps them in,
+    so requests never wait for its queries.
+    """
+
+    def __init__(self):
+        self.age_bands = []
+        self.game_names = frozenset()  # boards are kept only for these, so clients cannot add more
+        self.refresh_interval = 300.0
+        self._app = None
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()  # one reload at a time
+        self._journal = None  # updates made while a reload runs, replayed onto its result
+        self._worker = None
+        self._reset()
+
+    def _reset(self):
+        self._best = defaultdict(dict)  # game -> {user_id: best score}
+        self._bands = {}  # user_id -> band label
+        self._trees = defaultdict(OrderStatisticTree)  # (game, band or None) -> tree
+
+    def init_app(self, app):
+        """Read age bands, games and refresh interval, then load rankings from the database"""
+        self.age_bands = parse_age_bands(app.config.get('LEADERBOARD_AGE_BANDS', ''))
+        self.game_names = parse_game_names(app.config.get('GAME_NAMES', ''))
+        self.refresh_interval = float(app.config.get('LEADERBOARD_REFRESH_INTERVAL', self.refresh_interval))
+        self._app = app
+        with app.app_context():
+            self.load()
+
+    def band_for(self, age):
+        if age is None:
+            return None
+        for low, high in self.age_bands:
+            if low <= age <= high:
+                return f'{low}-{high}'
+        return None
+
+    def load(self):
+        """Rebuild every tree from aggregate queries over raw rounds and compacted daily rollups on every shard"""
+        with self._load_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                fresh = self._build()
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self._best, self._bands, self._trees = fresh._best, fresh._bands, fresh._trees
+                # Rows committed after the queries read their snapshot
+                for update, args in journal:
+                    update(*args)
+        logger.info(f"Loaded leaderboards: {sum(len(scores) for scores in fresh._best.values())} entries")
+
+    def _build(self):
+        """A new Leaderboards holding the database's current rankings"""
+        ages = {}
+        best = {}
+        for _ in tenant_router.each_shard():
+            ages.update(db.session.query(CandidateProfile.user_id, CandidateProfile.child_age))
+            for query in (
+                db.session.query(GameScore.game_name, GameScore.user_id, func.max(GameScore.score))
+                .group_by(GameScore.game_name, GameScore.user_id),
+                db.session.query(GameScoreDaily.game_name, GameScoreDaily.user_id, func.max(GameScoreDaily.best))
+                .group_by(GameScoreDaily.game_name, GameScoreDaily.user_id)
+            ):
+                for game_name, user_id, score in query:
+                    if game_name not in self.game_names:
+                        continue
+                    key = (game_name, user_id)
+                    best[key] = max(score, best.get(key, score))
+
+        fresh = Leaderboards()
+        fresh.age_bands = self.age_bands
+        fresh.game_names = self.game_names
+        for user_id, age in ages.items():
+            fresh._bands[user_id] = fresh.band_for(age)
+        for (game_name, user_id), score in best.items():
+            fresh._place(game_name, user_id, score)
+        return fresh
+
+    def _place(self, game_name, user_id, best):
+        self._best[game_name][user_id] = best
+        key = (-best, user_id)
+        self._trees[(game_name, None)].insert(key)
+        band = self._bands.get(user_id)
+        if band:
+            self._trees[(game_name, band)].insert(key)
+
+    def _unplace(self, game_name, user_id):
+        best = self._best[game_name].pop(user_id, None)
+        if best is None:
+            return
+        key = (-best, user_id)
+        self._trees[(game_name, None)].remove(key)
+        band = self._bands.get(user_id)
+        if band:
+            self._trees[(game_name, band)].remove(key)
+
+    def _ensure_worker(self):
+        # Started on first use rather than in init_app, so each forked gunicorn worker gets its own
+        if self.refresh_interval <= 0 or self._app is None or (self._worker is not None and self._worker.is_alive()):
+            return
+        self._worker = threading.Thread(target=self._refresh_loop, name='leaderboards', daemon=True)
+        self._worker.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                with self._app.app_context():
+                    self.load()
+            except Exception as e:
+                logger.error(f"Leaderboard refresh failed: {e}")
+
+    # --- updates ---
+    def record(self, user_id, game_name, score):
+        if game_name not in self.game_names:
+            return
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((self.record, (user_id, game_name, score)))
+            current = self._best[game_name].get(user_id)
+            if current is not None and score <= current:
+                return
+            self._unplace(game_name, user_id)
+            self._place(game_name, user_id, score)
+
+    def record_batch(self, batch):
+        """Commit hook for the game score write buffer"""
+        for pending in batch:
+            self.record(pending.row['user_id'], pending.row['game_name'], pending.row['score'])
+
+    def set_age(self, user_id, age):
+        """Move a child between age bands after a profile change"""
+        user_id = int(user_id)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((self.set_age, (user_id, age)))
+            games = [game for game, scores in self._best.items() if user_id in scores]
+            bests = {game: self._best[game][user_id] for game in games}
+            for game in games:
+                self._unplace(game, user_id)
+            self._bands[user_id] = self.band_for(age)
+            for game, best in bests.items():
+                self._place(game, user_id, best)
+
+    # --- queries ---
+    def top(self, game_name, limit=10, band=None):
+        """[(rank, user_id, score)] best first, with competition ranking for ties"""
+        with self._lock:
+            self._ensure_worker()
+            tree = self._trees.get((game_name, band))
+            if tree is None:
+                return []
+            entries, rank, previous = [], 0, None
+            for position, (neg_score, user_id) in enumerate(tree.first(limit), start=1):
+                if neg_score != previous:
+                    rank, previous = position, neg_score
+                entries.append((rank, user_id, -neg_score))
+            return entries
+
+    def rank(self, game_name, user_id, band=None):
+        """(rank, best score, players) for one child, or None if they have not played"""
+        user_id = int(user_id)
+        with self._lock:
+            self._ensure_worker()
+            best = self._best.get(game_name, {}).get(user_id)
+            tree = self._trees.get((game_name, band))
+            if best is None or tree is None or (band and self._bands.get(user_id) != band):
+                return None
+            return tree.count_less((-best, 0)) + 1, best, len(tree)
+
+    def band_of(self, user_id):
+        with self._lock:
+            return self._bands.get(int(user_id))
+
+    def games(self):
+        with self._lock:
+            return sorted(game for game, scores in self._best.items() if scores)
+
+
+leaderboards = Leaderboards()
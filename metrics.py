@@ -0,0 +1,192 @@
+from flask import request, g, has_request_context, current_app
+from sqlalchemy import event
+from bisect import bisect_left
+import threading
+import logging
+import hmac
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_labels(self.labelnames, k)} {_number(v)}' for k, v in values]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is a bisect and three additions under a lock"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = self.header()
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+# --- APPLICATION METRICS ---
+class Metrics:
+    """Request, database and bcrypt instrumentation exposed in Prometheus text format.
+
+    Values are kept per worker process; with several workers, scrape each
+    one (Prometheus aggregates the series).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.request_seconds = Histogram('numskill_request_duration_seconds', 'Request latency by route',
+                                         ('method', 'route'))
+        self.requests = Counter('numskill_requests_total', 'Requests by route and status', ('method', 'route', 'status'))
+        self.in_flight = Gauge('numskill_requests_in_flight', 'Requests currently being handled')
+        self.request_db_seconds = Histogram('numskill_request_db_seconds', 'Database time per request by route',
+                                            ('method', 'route'))
+        self.request_queries = Histogram('numskill_request_db_queries', 'Database queries per request by route',
+                                         ('method', 'route'), buckets=QUERY_COUNT_BUCKETS)
+        self.query_seconds = Histogram('numskill_db_query_duration_seconds', 'Duration of individual queries')
+        self.bcrypt_seconds = Histogram('numskill_bcrypt_duration_seconds', 'bcrypt time including pool wait',
+                                        ('operation',), buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 10.0))
+        self._metrics = [self.request_seconds, self.requests, self.in_flight, self.request_db_seconds,
+                         self.request_queries, self.query_seconds, self.bcrypt_seconds]
+
+    def init_app(self, app):
+        """Hook requests and every database engine; call right after db.init_app"""
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.add_url_rule('/api/metrics', 'metrics', self.metrics_view)
+
+        with app.app_context():
+            engines = list(app.extensions['sqlalchemy'].engines.values())
+        for engine in engines:
+            self.instrument(engine)
+
+    def instrument(self, engine):
+        """Time queries on `engine` (also used for tenant shards opened later)"""
+        if self.enabled:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor)
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_db_seconds = 0.0
+        g.metrics_db_queries = 0
+        self.in_flight.inc()
+
+    def _finish(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        self.request_seconds.observe(time.perf_counter() - started, request.method, route)
+        self.requests.inc(request.method, route, str(response.status_code))
+        self.request_db_seconds.observe(g.metrics_db_seconds, request.method, route)
+        self.request_queries.observe(g.metrics_db_queries, request.method, route)
+        return response
+
+    def _teardown(self, exc=None):
+        if g.pop('metrics_started', None) is not None:
+            self.in_flight.dec()
+
+    @staticmethod
+    def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_started'].pop()
+        self.query_seconds.observe(elapsed)
+        if has_request_context() and 'metrics_started' in g:
+            g.metrics_db_seconds += elapsed
+            g.metrics_db_queries += 1
+
+    def observe_bcrypt(self, operation, seconds):
+        if self.enabled:
+            self.bcrypt_seconds.observe(seconds, operation)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>`, disabled while that is unset"""
+        token = current_app.config.get('METRICS_TOKEN')
+        if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return current_app.response_class('forbidden\n', status=403, mimetype='text/plain')
+        return current_app.response_class(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
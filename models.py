@@ -1,9 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import bcrypt
+from password_hasher import password_hasher
+from database import RoutingSession
 import json
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """User model for storing login credentials"""
@@ -13,23 +14,78 @@ class User(db.Model):
     username = db.Column(db.String(120), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    tenant = db.Column(db.String(64), index=True)  # school slug (see tenancy.py); NULL = primary database
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     profiles = db.relationship('CandidateProfile', backref='user', lazy=True, cascade='all, delete-orphan')
     scores = db.relationship('AssessmentScore', backref='user', lazy=True, cascade='all, delete-orphan')
+    summary = db.relationship('UserSummary', backref='user', uselist=False, lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hash and store password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash and store password (bcrypt runs in the hasher's worker pool)"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verify password"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return password_hasher.verify(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        """True when the stored hash predates the configured bcrypt cost"""
+        return password_hasher.needs_rehash(self.password_hash)
+    
+    def to_dict(self):
+        return {'id': self.id, 'username': self.username, 'email': self.email, 'school': self.tenant,
+                'created_at': self.created_at.isoformat()}
+
+
+class Tenant(db.Model):
+    """A school and the shard database holding its users' data"""
+    __tablename__ = 'tenants'
+    
+    slug = db.Column(db.String(64), primary_key=True)
+    name = db.Column(db.String(200))
+    shard = db.Column(db.String(64))  # NULL = the primary database
+    status = db.Column(db.String(16), nullable=False, default='active')  # active | moving
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
-        return {'id': self.id, 'username': self.username, 'email': self.email, 'created_at': self.created_at.isoformat()}
+        return {
+            'slug': self.slug,
+            'name': self.name,
+            'shard': self.shard,
+            'status': self.status,
+            'created_at': self.created_at.isoformat()
+        }
+
+
+class TokenFamily(db.Model):
+    """One sign-in: the chain of rotated refresh tokens issued from it (see revocation.py)"""
+    __tablename__ = 'token_families'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, the 'fam' claim of every token in the chain
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)  # 'gen' claim of the refresh token currently accepted
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revoked_at = db.Column(db.DateTime)
+
+
+class TokenRevocation(db.Model):
+    """A revoked token family, mirrored into every worker's in-memory denylist"""
+    __tablename__ = 'token_revocations'
+    __table_args__ = (
+        db.Index('ix_token_revocations_revoked', 'revoked_at'),
+        db.Index('ix_token_revocations_expires', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    family = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # logout | reuse | admin
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)  # every token of the family has expired by then
 
 
 class CandidateProfile(db.Model):
@@ -58,6 +114,10 @@ class CandidateProfile(db.Model):
 class AssessmentScore(db.Model):
     """Store assessment scores and results"""
     __tablename__ = 'assessment_scores'
+    __table_args__ = (
+        db.Index('ix_assessment_scores_user_created', 'user_id', 'created_at'),
+        db.Index('ix_assessment_scores_created', 'created_at', 'id'),  # item analysis watermark
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -66,7 +126,11 @@ class AssessmentScore(db.Model):
     total_questions = db.Column(db.Integer, nullable=False)
     percentage = db.Column(db.Float, nullable=False)
     answers_json = db.Column(db.Text)  # Store answers as JSON
+    answer_key_version = db.Column(db.String(16))  # Bank version used by server grading; NULL = client-reported score
+    presented_mask = db.Column(db.BigInteger)  # Bit i set: question i of the answer key was shown
+    correct_mask = db.Column(db.BigInteger)  # Bit i set: question i was answered correctly
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # moved by re-grading; NULL on older rows
     
     def set_answers(self, answers_dict):
         """Store answers as JSON"""
@@ -83,17 +147,33 @@ class AssessmentScore(db.Model):
             'score': self.score,
             'total_questions': self.total_questions,
             'percentage': self.percentage,
+            'graded': self.answer_key_version is not None,
             'created_at': self.created_at.isoformat()
         }
 
 
+class AdaptiveSession(db.Model):
+    """Server-side progress of one adaptive test, so its signed token can only be used once per step"""
+    __tablename__ = 'adaptive_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, the 'sid' in the session token
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    module = db.Column(db.String(50), nullable=False)
+    step = db.Column(db.Integer, nullable=False, default=0)  # answers accepted so far
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+
 class ChecklistResponse(db.Model):
     """Store symptom checklist responses"""
     __tablename__ = 'checklist_responses'
+    __table_args__ = (db.Index('ix_checklist_responses_user_created', 'user_id', 'created_at'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     responses_json = db.Column(db.Text)  # Store all responses as JSON
+    answered_mask = db.Column(db.Integer)  # Bit i set: CHECKLIST_QUESTIONS[i] was answered
+    yes_mask = db.Column(db.Integer)  # Bit i set: CHECKLIST_QUESTIONS[i] was answered yes
     total_score = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -116,6 +196,7 @@ class ChecklistResponse(db.Model):
 class GameScore(db.Model):
     """Store game scores"""
     __tablename__ = 'game_scores'
+    __table_args__ = (db.Index('ix_game_scores_user_created', 'user_id', 'created_at'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -130,3 +211,249 @@ class GameScore(db.Model):
             'score': self.score,
             'created_at': self.created_at.isoformat()
         }
+
+
+class GameScoreDaily(db.Model):
+    """Daily per-(user, game) rollup of rounds compacted out of game_scores (see retention.py)"""
+    __tablename__ = 'game_score_daily'
+    __table_args__ = (db.Index('ix_game_score_daily_user_day', 'user_id', 'day'),)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    game_name = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC
+    rounds = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.BigInteger, nullable=False, default=0)
+    best = db.Column(db.Integer, nullable=False)
+    worst = db.Column(db.Integer, nullable=False)
+    latest = db.Column(db.Integer, nullable=False)  # score of the day's last round
+    last_played_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # NULL on older rows
+    
+    def to_dict(self):
+        return {
+            'game_name': self.game_name,
+            'day': self.day.isoformat(),
+            'rounds': self.rounds,
+            'total': self.total,
+            'average': round(self.total / self.rounds, 2) if self.rounds else None,
+            'best': self.best,
+            'worst': self.worst,
+            'latest': self.latest,
+            'last_played_at': self.last_played_at.isoformat()
+        }
+
+
+class DeletedRow(db.Model):
+    """Tombstone for a row removed from a synced table, so delta sync can tell clients to drop it"""
+    __tablename__ = 'deleted_rows'
+    __table_args__ = (db.Index('ix_deleted_rows_user_id', 'user_id', 'id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    table_name = db.Column(db.String(50), nullable=False)  # e.g. game_scores
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'table': self.table_name,
+            'id': self.row_id
+        }
+
+
+class GameScoreArchive(db.Model):
+    """Raw rounds moved out of game_scores once rolled up; kept for research export only"""
+    __tablename__ = 'game_scores_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # original game_scores id
+    user_id = db.Column(db.Integer, nullable=False)
+    game_name = db.Column(db.String(50), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ItemStatistic(db.Model):
+    """Running sufficient statistics for one question of one answer-key version"""
+    __tablename__ = 'item_statistics'
+    
+    module_name = db.Column(db.String(50), primary_key=True)
+    answer_key_version = db.Column(db.String(16), primary_key=True)
+    item_index = db.Column(db.Integer, primary_key=True)
+    presented = db.Column(db.Integer, nullable=False, default=0)  # n
+    correct = db.Column(db.Integer, nullable=False, default=0)  # sum of x
+    sum_score = db.Column(db.BigInteger, nullable=False, default=0)  # sum of total score T
+    sum_score_sq = db.Column(db.BigInteger, nullable=False, default=0)  # sum of T^2
+    sum_correct_score = db.Column(db.BigInteger, nullable=False, default=0)  # sum of x*T
+
+
+class JobWatermark(db.Model):
+    """Position of the last source row consumed by an incremental job, or (cohort norms) when a job last ran"""
+    __tablename__ = 'job_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    last_at = db.Column(db.DateTime)  # with last_id, for jobs that read in (created_at, id) order
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class IdempotencyKey(db.Model):
+    """Outcome of a write sent with an Idempotency-Key header, replayed on retries"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.Index('ix_idempotency_keys_created', 'created_at'),)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)  # NULL while the first request is still running
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CohortNorm(db.Model):
+    """Precomputed percentage distribution for one (module, child age) cohort"""
+    __tablename__ = 'cohort_norms'
+    
+    module_name = db.Column(db.String(50), primary_key=True)
+    child_age = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    mean = db.Column(db.Float, nullable=False)
+    std = db.Column(db.Float, nullable=False)
+    histogram_json = db.Column(db.Text, nullable=False)  # 101 counts, one per whole percent
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_histogram(self):
+        return json.loads(self.histogram_json)
+    
+    def set_histogram(self, counts):
+        self.histogram_json = json.dumps(counts)
+
+
+class SummaryModule(db.Model):
+    """Report summary counters for one (user, module), folded in with atomic UPDATEs (see report_summary.py)"""
+    __tablename__ = 'summary_modules'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    module_name = db.Column(db.String(50), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    latest_score = db.Column(db.Integer, nullable=False)
+    latest_total_questions = db.Column(db.Integer, nullable=False)
+    latest_percentage = db.Column(db.Float, nullable=False)
+    latest_created_at = db.Column(db.DateTime, nullable=False)
+    best_score = db.Column(db.Integer, nullable=False)
+    best_total_questions = db.Column(db.Integer, nullable=False)
+    best_percentage = db.Column(db.Float, nullable=False)
+    best_created_at = db.Column(db.DateTime, nullable=False)
+    
+    def _entry(self, prefix):
+        return {
+            'score': getattr(self, f'{prefix}_score'),
+            'total_questions': getattr(self, f'{prefix}_total_questions'),
+            'percentage': getattr(self, f'{prefix}_percentage'),
+            'created_at': getattr(self, f'{prefix}_created_at').isoformat()
+        }
+    
+    def to_dict(self):
+        return {'attempts': self.attempts, 'latest': self._entry('latest'), 'best': self._entry('best')}
+
+
+class SummaryGame(db.Model):
+    """Report summary counters for one (user, game), folded in with atomic UPDATEs (see report_summary.py)"""
+    __tablename__ = 'summary_games'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    game_name = db.Column(db.String(50), primary_key=True)
+    rounds = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.BigInteger, nullable=False, default=0)
+    best = db.Column(db.Integer, nullable=False)
+    latest = db.Column(db.Integer, nullable=False)
+    last_played = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'rounds': self.rounds,
+            'total': self.total,
+            'best': self.best,
+            'latest': self.latest,
+            'last_played': self.last_played.isoformat()
+        }
+
+
+class UserSummary(db.Model):
+    """Materialized per-user report data, updated incrementally on every write"""
+    __tablename__ = 'user_summaries'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    profile_json = db.Column(db.Text)  # Snapshot of CandidateProfile.to_dict()
+    modules_json = db.Column(db.Text)  # Legacy counters, set until the row is rebuilt into summary_modules
+    games_json = db.Column(db.Text)  # Legacy counters, set until the row is rebuilt into summary_games
+    checklist_json = db.Column(db.Text)  # Snapshot of ChecklistResponse.to_dict()
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    module_stats = db.relationship('SummaryModule', primaryjoin='UserSummary.user_id == foreign(SummaryModule.user_id)',
+                                   order_by='SummaryModule.module_name', lazy='selectin', viewonly=True)
+    game_stats = db.relationship('SummaryGame', primaryjoin='UserSummary.user_id == foreign(SummaryGame.user_id)',
+                                 order_by='SummaryGame.game_name', lazy='selectin', viewonly=True)
+    
+    def get_profile(self):
+        return json.loads(self.profile_json) if self.profile_json else None
+    
+    def set_profile(self, profile_dict):
+        self.profile_json = json.dumps(profile_dict) if profile_dict is not None else None
+    
+    def get_modules(self):
+        return {stats.module_name: stats.to_dict() for stats in self.module_stats}
+    
+    def get_games(self):
+        return {stats.game_name: stats.to_dict() for stats in self.game_stats}
+    
+    def get_checklist(self):
+        return json.loads(self.checklist_json) if self.checklist_json else None
+    
+    def set_checklist(self, checklist_dict):
+        self.checklist_json = json.dumps(checklist_dict) if checklist_dict is not None else None
+    
+    @property
+    def is_legacy(self):
+        """True for rows written before the counters moved out of the JSON columns"""
+        return self.modules_json is not None or self.games_json is not None
+    
+    def to_dict(self):
+        games = self.get_games()
+        for stats in games.values():
+            stats['average'] = round(stats['total'] / stats['rounds'], 2) if stats['rounds'] else 0
+        checklist = self.get_checklist()
+        return {
+            'modules': self.get_modules(),
+            'games': games,
+            'checklist_total': checklist['total_score'] if checklist else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class ReportJob(db.Model):
+    """A printable report rendered in the background (see reports.py)"""
+    __tablename__ = 'report_jobs'
+    __table_args__ = (db.Index('ix_report_jobs_user_created', 'user_id', 'created_at'),)
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client for polling
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    format = db.Column(db.String(10), nullable=False)  # html | pdf
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued | running | done | failed
+    data_hash = db.Column(db.String(64), nullable=False)  # result cache key of the rendered file
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'format': self.format,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,220 @@
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import insert, select, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, User, CandidateProfile
+from password_hasher import password_hasher
+from leaderboard import leaderboards
+from admin_auth import token_required
+from tenancy import tenant_router
+from contextlib import nullcontext
+from datetime import datetime
+import report_summary
+import logging
+import click
+import json
+import csv
+import io
+
+logger = logging.getLogger(__name__)
+
+onboarding_bp = Blueprint('onboarding', __name__, url_prefix='/api/onboarding')
+
+REQUIRED_FIELDS = ('username', 'email', 'password', 'child_name', 'child_age', 'parent_name')
+
+
+def parse_records(text, fmt):
+    """Parse an upload as CSV (header row with REQUIRED_FIELDS) or JSON ({"users": [...]} or a list)"""
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    data = json.loads(text)
+    return data.get('users', []) if isinstance(data, dict) else data
+
+
+def _validate(record):
+    if not isinstance(record, dict):
+        raise ValueError('Row must be an object')
+    missing = [f for f in REQUIRED_FIELDS if not str(record.get(f) or '').strip()]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        child_age = int(record['child_age'])
+    except (TypeError, ValueError):
+        raise ValueError('child_age must be an integer')
+    return {
+        'username': str(record['username']).strip(),
+        'email': str(record['email']).strip(),
+        'password': str(record['password']),
+        'child_name': str(record['child_name']).strip(),
+        'child_age': child_age,
+        'parent_name': str(record['parent_name']).strip()
+    }
+
+
+def _error(row, error):
+    return {'row': row['row'], 'username': row.get('username'), 'error': error}
+
+
+def _drop_existing(chunk, errors):
+    """Remove rows whose username or email is taken, using one set-based query"""
+    usernames = [r['username'] for r in chunk]
+    emails = [r['email'] for r in chunk]
+    taken = db.session.execute(
+        select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+    ).all()
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken}
+
+    kept = []
+    for row in chunk:
+        if row['username'] in taken_usernames:
+            errors.append(_error(row, 'Username already exists'))
+        elif row['email'] in taken_emails:
+            errors.append(_error(row, 'Email already exists'))
+        else:
+            kept.append(row)
+    return kept
+
+
+def _insert_chunk(chunk, hashes, errors, school=None):
+    """Insert users and profiles with two executemany statements in one transaction"""
+    now = datetime.utcnow()
+    try:
+        user_ids = db.session.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{'username': r['username'], 'email': r['email'], 'password_hash': h, 'tenant': school,
+              'created_at': now, 'updated_at': now}
+             for r, h in zip(chunk, hashes)]
+        ).scalars().all()
+        db.session.execute(insert(CandidateProfile), [
+            {'user_id': uid, 'child_name': r['child_name'], 'child_age': r['child_age'],
+             'parent_name': r['parent_name'], 'created_at': now, 'updated_at': now}
+            for uid, r in zip(user_ids, chunk)
+        ])
+        report_summary.start_many(CandidateProfile.query.filter(CandidateProfile.user_id.in_(user_ids)))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Someone registered one of these names since the uniqueness check; retry row by row
+        return _insert_rows(chunk, hashes, errors, school)
+
+    for uid, row in zip(user_ids, chunk):
+        leaderboards.set_age(uid, row['child_age'])
+    return len(chunk)
+
+
+def _insert_rows(chunk, hashes, errors, school=None):
+    created = 0
+    for row, password_hash in zip(chunk, hashes):
+        try:
+            user = User(username=row['username'], email=row['email'], password_hash=password_hash, tenant=school)
+            db.session.add(user)
+            db.session.flush()
+            profile = CandidateProfile(user_id=user.id, child_name=row['child_name'],
+                                       child_age=row['child_age'], parent_name=row['parent_name'])
+            db.session.add(profile)
+            db.session.flush()
+            report_summary.start(user.id, profile.to_dict())
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            errors.append(_error(row, 'Username or email already exists'))
+        else:
+            leaderboards.set_age(user.id, row['child_age'])
+            created += 1
+    return created
+
+
+def import_users(records, chunk_size=500, school=None, hash_workers=None):
+    """Create accounts and candidate profiles in bulk.
+
+    Returns {'created', 'failed', 'errors'} where each error names its
+    1-based input row. Rows are checked for uniqueness per chunk with one
+    query, passwords are hashed across the bcrypt process pool, and each
+    chunk is written in its own transaction. With `school`, the accounts
+    belong to that tenant and their profiles go to its shard.
+    `hash_workers` caps concurrent hashes (see PasswordHasher.hash_many).
+    """
+    errors = []
+    valid = []
+    seen_usernames, seen_emails = set(), set()
+    for index, record in enumerate(records, start=1):
+        try:
+            row = _validate(record)
+        except ValueError as e:
+            errors.append({'row': index, 'username': record.get('username') if isinstance(record, dict) else None, 'error': str(e)})
+            continue
+        row['row'] = index
+        if row['username'] in seen_usernames:
+            errors.append(_error(row, 'Duplicate username in upload'))
+        elif row['email'] in seen_emails:
+            errors.append(_error(row, 'Duplicate email in upload'))
+        else:
+            seen_usernames.add(row['username'])
+            seen_emails.add(row['email'])
+            valid.append(row)
+
+    created = 0
+    with tenant_router.use_tenant(school) if school else nullcontext():
+        for start in range(0, len(valid), chunk_size):
+            chunk = _drop_existing(valid[start:start + chunk_size], errors)
+            if not chunk:
+                continue
+            hashes = password_hasher.hash_many([r['password'] for r in chunk], workers=hash_workers)
+            created += _insert_chunk(chunk, hashes, errors, school)
+            logger.info(f"Onboarding: {created} accounts created so far")
+
+    errors.sort(key=lambda e: e['row'])
+    return {'created': created, 'failed': len(errors), 'errors': errors}
+
+
+@onboarding_bp.route('/users', methods=['POST'])
+@token_required('ONBOARDING_TOKEN')
+def import_users_endpoint():
+    """Bulk-create accounts with profiles from a JSON body or a text/csv upload (`school` as query arg or JSON key)"""
+    try:
+        school = request.args.get('school')
+        if request.mimetype == 'text/csv':
+            records = parse_records(request.get_data(as_text=True), 'csv')
+        else:
+            data = request.get_json()
+            records = data.get('users', []) if isinstance(data, dict) else data
+            if isinstance(data, dict):
+                school = data.get('school', school)
+        if not isinstance(records, list) or not records:
+            return jsonify({'error': 'No users supplied'}), 400
+
+        max_rows = current_app.config.get('ONBOARDING_MAX_ROWS', 2000)
+        if len(records) > max_rows:
+            return jsonify({'error': f'At most {max_rows} users per request; use the CLI for larger imports'}), 413
+
+        try:
+            result = import_users(records, chunk_size=current_app.config.get('ONBOARDING_CHUNK_SIZE', 500), school=school)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Onboarding error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@onboarding_bp.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default=None, help='Defaults to the file extension')
+@click.option('--chunk-size', default=500, show_default=True, help='Rows per transaction')
+@click.option('--school', default=None, help='Create the accounts in this school (see `flask tenants`)')
+def import_users_command(path, fmt, chunk_size, school):
+    """Create accounts and profiles from a CSV or JSON file"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'json')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        records = parse_records(f.read(), fmt)
+
+    try:
+        # Nothing else uses this process's pool, so the import may take every worker
+        result = import_users(records, chunk_size=chunk_size, school=school, hash_workers=password_hasher.workers)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for error in result['errors']:
+        click.echo(f"row {error['row']} ({error['username']}): {error['error']}", err=True)
+    click.echo(f"Created {result['created']} accounts, {result['failed']} rows failed")
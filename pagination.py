@@ -0,0 +1,76 @@
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(row):
+    """Opaque cursor for a row's (created_at, id) position"""
+    raw = f'{row.created_at.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, maximum)
+
+
+def keyset_page(query, model, args):
+    """Return one newest-first page of `query` and its cursors.
+
+    Pages are addressed by (created_at, id) so each page is a bounded index
+    range scan on (user_id, created_at) no matter how deep the history is.
+    `before` walks towards older rows, `after` towards newer ones.
+    """
+    limit = parse_limit(args.get('limit'))
+    before = args.get('before')
+    after = args.get('after')
+    if before and after:
+        raise ValueError('Use either before or after, not both')
+
+    if after:
+        created_at, row_id = decode_cursor(after)
+        query = query.filter(or_(
+            model.created_at > created_at,
+            and_(model.created_at == created_at, model.id > row_id)
+        )).order_by(model.created_at.asc(), model.id.asc())
+    else:
+        if before:
+            created_at, row_id = decode_cursor(before)
+            query = query.filter(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < row_id)
+            ))
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows.reverse()
+
+    return rows, {
+        'limit': limit,
+        'has_more': has_more,
+        'before': encode_cursor(rows[-1]) if rows else None,
+        'after': encode_cursor(rows[0]) if rows else None
+    }
@@ -0,0 +1,141 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from metrics import metrics
+import multiprocessing
+import threading
+import logging
+import bcrypt
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """Raised when the bcrypt pool queue is full; callers should answer 503"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Password service is busy, try again shortly')
+        self.retry_after = retry_after
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_cost(password_hash):
+    """Work factor encoded in a bcrypt hash ("$2b$12$..." -> 12)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Run bcrypt in a dedicated process pool so request threads stay free.
+
+    At most `workers` hashes run at once and at most `max_pending` more may
+    wait for a slot; beyond that callers get HasherBusy straight away rather
+    than tying up a request thread.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.use_pool = False
+        self.workers = 2
+        self.max_pending = 16
+        self.timeout = 10.0
+        self._slots = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read bcrypt cost and pool limits from the app config"""
+        self.rounds = int(app.config.get('BCRYPT_ROUNDS', self.rounds))
+        self.use_pool = bool(app.config.get('BCRYPT_USE_PROCESS_POOL', self.use_pool))
+        self.workers = int(app.config.get('BCRYPT_POOL_WORKERS') or os.cpu_count() or self.workers)
+        self.max_pending = int(app.config.get('BCRYPT_MAX_PENDING', self.max_pending))
+        self.timeout = float(app.config.get('BCRYPT_TIMEOUT', self.timeout))
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+
+    def hash(self, password):
+        """Return a bcrypt hash of `password` at the configured cost"""
+        return self._timed('hash', _hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        """Check `password` against a stored bcrypt hash"""
+        return self._timed('verify', _check, password, password_hash)
+
+    def hash_many(self, passwords, workers=None):
+        """Hash a batch for bulk jobs, at most `workers` at a time (default half the pool).
+
+        Each running hash holds one of the same slots as hash() and verify(),
+        so a large import shares the pool with logins instead of queueing
+        ahead of them; it waits for free slots rather than raising HasherBusy.
+        Offline jobs with no logins to leave room for pass `self.workers`.
+        """
+        if not self.use_pool:
+            return [_hash(password, self.rounds) for password in passwords]
+        step = max(1, min(workers or self.workers // 2, self.workers))
+        hashes = []
+        for start in range(0, len(passwords), step):
+            futures = []
+            for password in passwords[start:start + step]:
+                self._slots.acquire()
+                futures.append(self._submit(_hash, password, self.rounds))
+            hashes.extend(future.result() for future in futures)
+        return hashes
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different cost than configured"""
+        return hash_cost(password_hash) != self.rounds
+
+    def _timed(self, operation, fn, *args):
+        started = time.perf_counter()
+        try:
+            return self._run(fn, *args)
+        finally:
+            metrics.observe_bcrypt(operation, time.perf_counter() - started)
+
+    def _run(self, fn, *args):
+        if not self.use_pool:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HasherBusy()
+
+    def _submit(self, fn, *args):
+        """Run `fn` in the pool on a slot the caller holds; the slot is freed when the job finishes.
+
+        A caller that times out stops waiting, but the job keeps its worker
+        until it is done, so the slot must not be handed on any earlier.
+        """
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _executor(self):
+        # One pool per process: a pool inherited across a gunicorn fork is unusable
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+                    logger.info(f"Started bcrypt pool with {self.workers} workers")
+        return self._pool
+
+
+password_hasher = PasswordHasher()
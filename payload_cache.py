@@ -0,0 +1,55 @@
+from flask import request, current_app
+import hashlib
+import threading
+import gzip
+
+
+class Payload:
+    """A JSON body serialized and gzip-compressed once, with strong ETags per encoding"""
+    __slots__ = ('body', 'gzip_body', 'etag', 'gzip_etag')
+
+    def __init__(self, body):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = digest
+        self.gzip_etag = f'{digest}-gz'
+
+
+class PayloadCache:
+    """Named, precomputed JSON responses for data that only changes on reload"""
+
+    def __init__(self):
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def build(self, app, payloads):
+        """Serialize {name: obj} with the app's JSON provider and swap them in atomically"""
+        built = {name: Payload(app.json.dumps(obj).encode('utf-8')) for name, obj in payloads.items()}
+        with self._lock:
+            self._payloads = built
+
+    def __contains__(self, name):
+        return name in self._payloads
+
+    def respond(self, name):
+        """Serve a cached payload, answering 304 when the client already holds it"""
+        payload = self._payloads[name]
+        use_gzip = 'gzip' in request.accept_encodings
+        etag = payload.gzip_etag if use_gzip else payload.etag
+
+        if request.if_none_match.contains(payload.etag) or request.if_none_match.contains(payload.gzip_etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(
+                payload.gzip_body if use_gzip else payload.body,
+                status=200,
+                mimetype='application/json'
+            )
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f"private, max-age={current_app.config.get('STATIC_PAYLOAD_MAX_AGE', 3600)}"
+        response.vary.add('Accept-Encoding')
+        return response
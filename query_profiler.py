@@ -0,0 +1,160 @@
+from flask import request, g, has_request_context
+from sqlalchemy import event
+from collections import Counter
+from contextlib import contextmanager
+import threading
+import logging
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+# Expanded IN lists and literal-heavy statements collapse to one shape
+_PLACEHOLDER_RUN = re.compile(r'(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block ran more queries than its budget allows"""
+
+
+def statement_shape(statement):
+    """Normalize SQL so repeats of the same query with different parameters compare equal"""
+    return _PLACEHOLDER_RUN.sub('?', _WHITESPACE.sub(' ', statement).strip())
+
+
+class _Collector:
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = []  # (shape, seconds)
+        self.seconds = 0.0
+
+
+class QueryProfiler:
+    """Development/staging profiler for SQL issued per request.
+
+    Logs queries slower than QUERY_SLOW_MS with their parameters, warns when
+    one statement shape repeats QUERY_N_PLUS_ONE_THRESHOLD times in a request
+    (a lazy-load or per-row query inside a loop), and checks each route
+    against QUERY_BUDGETS / QUERY_BUDGET. With QUERY_BUDGET_ENFORCE an
+    over-budget request raises QueryBudgetExceeded, which fails tests.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_seconds = 0.1
+        self.repeat_threshold = 5
+        self.budget = None
+        self.budgets = {}
+        self.enforce = False
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QUERY_PROFILER_ENABLED', False)
+        if not self.enabled:
+            return
+        self.slow_seconds = app.config.get('QUERY_SLOW_MS', 100) / 1000
+        self.repeat_threshold = app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        self.budget = app.config.get('QUERY_BUDGET')
+        self.budgets = dict(app.config.get('QUERY_BUDGETS') or {})
+        self.enforce = app.config.get('QUERY_BUDGET_ENFORCE', False)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            engines = list(app.extensions['sqlalchemy'].engines.values())
+        for engine in engines:
+            self.instrument(engine)
+        logger.info('Query profiler enabled')
+
+    def instrument(self, engine):
+        """Collect queries from `engine` (also used for tenant shards opened later)"""
+        if self.enabled:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor)
+
+    # --- collection ---
+    def _collectors(self):
+        collectors = getattr(self._local, 'collectors', None)
+        if collectors is None:
+            collectors = self._local.collectors = []
+        return collectors
+
+    @staticmethod
+    def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_query_started', []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['profiler_query_started'].pop()
+        if elapsed >= self.slow_seconds:
+            where = request.endpoint if has_request_context() else 'no request'
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms, {where}): {statement} -- params {str(parameters)[:500]}")
+        collectors = self._collectors()
+        if collectors:
+            shape = statement_shape(statement)
+            for collector in collectors:
+                collector.queries.append((shape, elapsed))
+                collector.seconds += elapsed
+
+    @contextmanager
+    def collect(self):
+        """Record every query this thread runs inside the block"""
+        collector = _Collector()
+        self._collectors().append(collector)
+        try:
+            yield collector
+        finally:
+            self._collectors().remove(collector)
+
+    @contextmanager
+    def assert_max_queries(self, limit, label='block'):
+        """Raise QueryBudgetExceeded if the block runs more than `limit` queries (usable in tests and scripts)"""
+        with self.collect() as collector:
+            yield collector
+        if len(collector.queries) > limit:
+            raise QueryBudgetExceeded(self._describe(label, collector, limit))
+
+    def repeated_shapes(self, collector):
+        """Statement shapes run at least repeat_threshold times, most frequent first"""
+        counts = Counter(shape for shape, _ in collector.queries)
+        return [(shape, n) for shape, n in counts.most_common() if n >= self.repeat_threshold]
+
+    def _describe(self, label, collector, limit):
+        lines = [f"{label} ran {len(collector.queries)} queries (budget {limit})"]
+        lines += [f"  {n} x {shape[:200]}" for shape, n in Counter(s for s, _ in collector.queries).most_common(5)]
+        return '\n'.join(lines)
+
+    # --- per request ---
+    def _start_request(self):
+        collector = _Collector()
+        self._collectors().append(collector)
+        g.query_profile = collector
+
+    def _finish_request(self, response):
+        collector = g.get('query_profile')
+        if collector is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        response.headers['X-Query-Count'] = str(len(collector.queries))
+        response.headers['X-Query-Time-Ms'] = f'{collector.seconds * 1000:.2f}'
+
+        for shape, n in self.repeated_shapes(collector):
+            logger.warning(f"Possible N+1 in {endpoint}: {n} x {shape[:300]}")
+
+        budget = self.budgets.get(endpoint, self.budget)
+        if budget is not None and len(collector.queries) > budget:
+            message = self._describe(endpoint, collector, budget)
+            if self.enforce:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def _teardown_request(self, exc=None):
+        collector = g.pop('query_profile', None)
+        if collector is not None and collector in self._collectors():
+            self._collectors().remove(collector)
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,213 @@
+from sqlalchemy import and_, bindparam, case, delete, insert, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import (db, UserSummary, SummaryModule, SummaryGame, CandidateProfile, AssessmentScore,
+                    ChecklistResponse, GameScore, GameScoreDaily)
+from database import use_primary
+from datetime import datetime
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+# Counters are never read back and rewritten: every fold is one UPDATE that
+# adds to the stored values (SET attempts = attempts + 1, ...), so concurrent
+# writers (request threads and the game score flush thread) cannot lose each
+# other's updates, and on SQLite the transaction takes the write lock on its
+# first statement instead of upgrading a read lock (SQLITE_BUSY)
+SUMMARIES = UserSummary.__table__
+MODULES = SummaryModule.__table__
+GAMES = SummaryGame.__table__
+
+
+def _insert_missing(table, rows):
+    """INSERT `rows` whose primary key is not taken yet, leaving existing rows alone"""
+    if not rows:
+        return
+    dialect = db.session.get_bind(clause=table.insert()).dialect.name
+    dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    db.session.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+
+
+def _entry(prefix, score, total_questions, percentage, created_at):
+    return {f'{prefix}_score': score, f'{prefix}_total_questions': total_questions,
+            f'{prefix}_percentage': percentage, f'{prefix}_created_at': created_at}
+
+
+def _fold_score(modules, module_name, score, total_questions, percentage, created_at):
+    stats = modules.get(module_name)
+    if stats is None:
+        stats = modules[module_name] = {'attempts': 0, **_entry('latest', score, total_questions, percentage, created_at),
+                                        **_entry('best', score, total_questions, percentage, created_at)}
+    stats['attempts'] += 1
+    if created_at >= stats['latest_created_at']:
+        stats.update(_entry('latest', score, total_questions, percentage, created_at))
+    if (percentage, stats['best_created_at']) > (stats['best_percentage'], created_at):  # ties go to the earliest
+        stats.update(_entry('best', score, total_questions, percentage, created_at))
+
+
+def _fold_game(games, game_name, rounds, total, best, latest, last_played):
+    stats = games.get(game_name)
+    if stats is None:
+        stats = games[game_name] = {'rounds': 0, 'total': 0, 'best': best, 'latest': latest, 'last_played': last_played}
+    stats['rounds'] += rounds
+    stats['total'] += total
+    if best > stats['best']:
+        stats['best'] = best
+    if last_played >= stats['last_played']:
+        stats['latest'] = latest
+        stats['last_played'] = last_played
+
+
+def _new(column):
+    return bindparam(f'new_{column.name}', type_=column.type)
+
+
+def _if_newer(stamp, column):
+    """SET value for `column`: the folded value when it is at least as recent as the row's `stamp`"""
+    return case((stamp <= _new(stamp), _new(column)), else_=column)
+
+
+def _if_better(measure, column, tie=None):
+    """SET value for `column`: the folded value when it beats the row's `measure` (or ties it, and is older by `tie`)"""
+    better = measure < _new(measure)
+    if tie is not None:
+        better = or_(better, and_(measure == _new(measure), _new(tie) < tie))
+    return case((better, _new(column)), else_=column)
+
+
+# One executemany UPDATE per table. A missing row is first inserted holding
+# the folded values with zero counts, so the same statement applies to it
+_add_scores = update(MODULES).where(
+    MODULES.c.user_id == bindparam('key_user_id'), MODULES.c.module_name == bindparam('key_module_name')
+).values(
+    attempts=MODULES.c.attempts + _new(MODULES.c.attempts),
+    **{column.name: _if_newer(MODULES.c.latest_created_at, column)
+       for column in MODULES.c if column.name.startswith('latest_')},
+    **{column.name: _if_better(MODULES.c.best_percentage, column, tie=MODULES.c.best_created_at)
+       for column in MODULES.c if column.name.startswith('best_')}
+)
+
+_add_games = update(GAMES).where(
+    GAMES.c.user_id == bindparam('key_user_id'), GAMES.c.game_name == bindparam('key_game_name')
+).values(
+    rounds=GAMES.c.rounds + _new(GAMES.c.rounds),
+    total=GAMES.c.total + _new(GAMES.c.total),
+    best=_if_better(GAMES.c.best, GAMES.c.best),
+    latest=_if_newer(GAMES.c.last_played, GAMES.c.latest),
+    last_played=_if_newer(GAMES.c.last_played, GAMES.c.last_played)
+)
+
+# Counters a freshly inserted row starts from; the UPDATE then adds the folded counts
+COUNTERS = ('attempts', 'rounds', 'total')
+
+
+def _apply(table, statement, keys, folded):
+    """Fold `folded` ({key tuple: stats}) into `table`'s rows with one INSERT and one UPDATE"""
+    items = sorted(folded.items())  # a fixed row order, so concurrent batches lock rows in the same order
+    _insert_missing(table, [{**stats, **dict(zip(keys, key)), **{count: 0 for count in COUNTERS if count in stats}}
+                            for key, stats in items])
+    db.session.execute(statement, [dict({f'key_{name}': value for name, value in zip(keys, key)},
+                                        **{f'new_{name}': value for name, value in stats.items()})
+                                   for key, stats in items])
+
+
+def _set(user_id, **values):
+    """Overwrite snapshot columns of the summary row; a missing row is built on first read"""
+    db.session.execute(update(SUMMARIES).where(SUMMARIES.c.user_id == int(user_id))
+                       .values(updated_at=datetime.utcnow(), **values))
+
+
+# --- NEW ACCOUNTS (so a first report reads a row instead of building one) ---
+def start(user_id, profile=None):
+    """Add the summary row for a new account; `profile` is a CandidateProfile.to_dict() if it has one"""
+    summary = UserSummary(user_id=int(user_id))
+    summary.set_profile(profile)
+    db.session.add(summary)
+    return summary
+
+
+def start_many(profiles):
+    """Add summary rows for freshly imported accounts with one executemany INSERT"""
+    now = datetime.utcnow()
+    db.session.execute(insert(UserSummary), [
+        {'user_id': profile.user_id, 'profile_json': json.dumps(profile.to_dict()), 'updated_at': now}
+        for profile in profiles
+    ])
+
+
+# --- INCREMENTAL UPDATES (called inside the writing transaction, before commit) ---
+def apply_profile(user_id, profile):
+    _set(user_id, profile_json=json.dumps(profile.to_dict()))
+
+
+def apply_score(user_id, score_record):
+    modules = {}
+    _fold_score(modules, score_record.module_name, score_record.score, score_record.total_questions,
+                score_record.percentage, score_record.created_at)
+    _apply(MODULES, _add_scores, ('user_id', 'module_name'),
+           {(int(user_id), name): stats for name, stats in modules.items()})
+
+
+def apply_checklist(user_id, checklist):
+    _set(user_id, checklist_json=json.dumps(checklist.to_dict()))
+
+
+def apply_game_scores(batch):
+    """Flush hook for the game score write buffer; folds a batch of PendingWrite rows"""
+    games = {}
+    for pending in batch:
+        row = pending.row
+        _fold_game(games, (int(row['user_id']), row['game_name']), 1, row['score'], row['score'], row['score'],
+                   row['created_at'])
+    _apply(GAMES, _add_games, ('user_id', 'game_name'), games)
+
+
+# --- FULL REBUILD (backfill for rows written before summaries existed) ---
+def rebuild(user_id):
+    """Recompute a user's summary from the raw tables and commit it"""
+    user_id = int(user_id)
+    now = datetime.utcnow()
+    _insert_missing(SUMMARIES, [{'user_id': user_id, 'updated_at': now}])
+    # Write before reading, so the row lock (PostgreSQL) or the database write
+    # lock (SQLite) keeps other writers of this user out until the commit
+    db.session.execute(update(SUMMARIES).where(SUMMARIES.c.user_id == user_id)
+                       .values(modules_json=None, games_json=None, updated_at=now))
+    db.session.execute(delete(MODULES).where(MODULES.c.user_id == user_id))
+    db.session.execute(delete(GAMES).where(GAMES.c.user_id == user_id))
+
+    modules = {}
+    score_rows = db.session.query(
+        AssessmentScore.module_name, AssessmentScore.score, AssessmentScore.total_questions,
+        AssessmentScore.percentage, AssessmentScore.created_at
+    ).filter_by(user_id=user_id).yield_per(1000)
+    for row in score_rows:
+        _fold_score(modules, *row)
+
+    games = {}
+    game_rows = db.session.query(GameScore.game_name, GameScore.score, GameScore.created_at).filter_by(user_id=user_id).yield_per(1000)
+    for game_name, score, created_at in game_rows:
+        _fold_game(games, game_name, 1, score, score, score, created_at)
+    for rollup in GameScoreDaily.query.filter_by(user_id=user_id):  # compacted days (see retention.py)
+        _fold_game(games, rollup.game_name, rollup.rounds, rollup.total, rollup.best, rollup.latest, rollup.last_played_at)
+
+    profile = CandidateProfile.query.filter_by(user_id=user_id).first()
+    checklist = ChecklistResponse.query.filter_by(user_id=user_id).first()
+    _set(user_id, profile_json=json.dumps(profile.to_dict()) if profile else None,
+         checklist_json=json.dumps(checklist.to_dict()) if checklist else None)
+    if modules:
+        db.session.execute(insert(MODULES), [dict(stats, user_id=user_id, module_name=name) for name, stats in modules.items()])
+    if games:
+        db.session.execute(insert(GAMES), [dict(stats, user_id=user_id, game_name=name) for name, stats in games.items()])
+    db.session.commit()
+    return db.session.get(UserSummary, user_id, populate_existing=True)
+
+
+def get_or_build(user_id):
+    """Return the user's summary, building it on first access"""
+    summary = db.session.get(UserSummary, int(user_id))
+    if summary is None or summary.is_legacy:
+        logger.info(f"Building report summary for user {user_id}")
+        # Build and load it back on the primary: a lagging replica may not have the row yet
+        with use_primary():
+            summary = rebuild(user_id)
+    return summary
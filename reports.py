@@ -0,0 +1,491 @@
+from flask import Blueprint, request, jsonify, g, has_app_context, send_file, url_for
+from flask.cli import AppGroup
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import update, or_, and_
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from models import db, ReportJob, AssessmentScore, ChecklistResponse
+from assessment import CHECKLIST_QUESTIONS
+from analytics import cohort_norms
+from tenancy import tenant_router
+from datetime import datetime, timedelta
+from html import escape
+import report_summary
+import multiprocessing
+import threading
+import hashlib
+import logging
+import click
+import json
+import time
+import uuid
+import os
+
+try:
+    from weasyprint import HTML
+except ImportError:  # optional; only HTML reports are offered without it
+    HTML = None
+
+logger = logging.getLogger(__name__)
+
+reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
+
+# Part of every cache key: bump it when the layout changes so cached reports are rendered again
+RENDERER_VERSION = 1
+
+MEDIA_TYPES = {'html': 'text/html', 'pdf': 'application/pdf'}
+
+
+# --- REPORT DATA ---
+def collect(user_id, history=50):
+    """Everything a report shows, cohort percentiles included so they are part of the cache key"""
+    summary = report_summary.get_or_build(user_id)
+    scores = db.session.query(
+        AssessmentScore.module_name, AssessmentScore.score, AssessmentScore.total_questions,
+        AssessmentScore.percentage, AssessmentScore.created_at
+    ).filter_by(user_id=user_id).order_by(AssessmentScore.created_at.desc(), AssessmentScore.id.desc()).limit(history).all()
+    checklist = ChecklistResponse.query.filter_by(user_id=user_id).first()
+    profile = summary.get_profile()
+    modules = summary.get_modules()
+    age = (profile or {}).get('child_age')
+    percentiles = {module: cohort_norms.percentile_rank(module, age, stats['latest']['percentage']) for module, stats in modules.items()}
+    return {
+        'user_id': int(user_id),
+        'profile': profile,
+        'modules': modules,
+        'norms': {
+            'computed_at': cohort_norms._computed_at.isoformat() if cohort_norms._computed_at else None,
+            'percentiles': percentiles
+        },
+        'games': summary.get_games(),
+        'scores': [dict(row._mapping, created_at=row.created_at.isoformat()) for row in scores],
+        'checklist': {
+            'total_score': checklist.total_score,
+            'answered_mask': checklist.answered_mask,
+            'yes_mask': checklist.yes_mask,
+            'created_at': checklist.created_at.isoformat()
+        } if checklist else None
+    }
+
+
+def data_hash(data, fmt):
+    """Result cache key: changes whenever the user's profile, scores, games, checklist or the cohort norms do"""
+    material = json.dumps({'version': RENDERER_VERSION, 'format': fmt, 'data': data}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+# --- RENDERING ---
+STYLE = '''
+body { font-family: Helvetica, Arial, sans-serif; color: #222; margin: 2em; }
+h1 { font-size: 1.6em; margin-bottom: 0.2em; }
+h2 { font-size: 1.15em; border-bottom: 1px solid #999; padding-bottom: 0.2em; margin-top: 1.6em; }
+table { border-collapse: collapse; width: 100%; font-size: 0.9em; }
+th, td { text-align: left; padding: 0.3em 0.6em; border-bottom: 1px solid #ddd; }
+th { background: #f2f2f2; }
+.meta { color: #555; }
+.empty { color: #777; font-style: italic; }
+@page { size: A4; margin: 1.5cm; }
+@media print { body { margin: 0; } h2 { break-after: avoid; } tr { break-inside: avoid; } }
+'''
+
+
+def _label(name):
+    return escape(name.replace('_', ' ').title())
+
+
+def _date(value):
+    return datetime.fromisoformat(value).strftime('%d %b %Y') if value else ''
+
+
+def _pct(value):
+    return '' if value is None else f'{round(value, 1):g}%'
+
+
+def _table(headers, rows, empty):
+    if not rows:
+        return f'<p class="empty">{escape(empty)}</p>'
+    head = ''.join(f'<th>{escape(h)}</th>' for h in headers)
+    body = ''.join('<tr>' + ''.join(f'<td>{cell}</td>' for cell in row) + '</tr>' for row in rows)
+    return f'<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'
+
+
+def render_html(data):
+    """Standalone printable HTML page for one user's results"""
+    profile = data['profile'] or {}
+    age = profile.get('child_age')
+    percentiles = data['norms']['percentiles']
+
+    modules = []
+    for module, stats in sorted(data['modules'].items()):
+        latest, best = stats['latest'], stats['best']
+        rank = percentiles.get(module)
+        modules.append([
+            _label(module), stats['attempts'], f"{latest['score']}/{latest['total_questions']}",
+            _pct(latest['percentage']), _pct(best['percentage']), '' if rank is None else f'{rank:g}', _date(latest['created_at'])
+        ])
+
+    history = [
+        [_date(s['created_at']), _label(s['module_name']), f"{s['score']}/{s['total_questions']}", _pct(s['percentage'])]
+        for s in data['scores']
+    ]
+
+    games = []
+    for game, stats in sorted(data['games'].items()):
+        average = round(stats['total'] / stats['rounds'], 1) if stats['rounds'] else 0
+        games.append([_label(game), stats['rounds'], stats['best'], f'{average:g}', stats['latest'], _date(stats['last_played'])])
+
+    checklist = data['checklist']
+    if checklist:
+        answered, yes = checklist['answered_mask'] or 0, checklist['yes_mask'] or 0
+        items = [
+            [escape(question), ('Yes' if yes >> i & 1 else 'No') if answered >> i & 1 else 'Not answered']
+            for i, question in enumerate(CHECKLIST_QUESTIONS)
+        ]
+        checklist_html = (f"<p>{checklist['total_score']} of {len(CHECKLIST_QUESTIONS)} indicators present "
+                          f"(completed {_date(checklist['created_at'])}).</p>" + _table(['Question', 'Answer'], items, ''))
+    else:
+        checklist_html = '<p class="empty">Checklist not completed.</p>'
+
+    name = escape(profile.get('child_name') or 'Unnamed child')
+    details = ', '.join(part for part in [
+        f'age {age}' if age is not None else '',
+        f"parent/guardian {escape(profile['parent_name'])}" if profile.get('parent_name') else ''
+    ] if part)
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Assessment report - {name}</title><style>{STYLE}</style></head>
+<body>
+<h1>Assessment report: {name}</h1>
+<p class="meta">{details}{'; ' if details else ''}generated {datetime.utcnow():%d %b %Y %H:%M} UTC</p>
+<h2>Assessment modules</h2>
+{_table(['Module', 'Attempts', 'Latest score', 'Latest', 'Best', 'Percentile (age cohort)', 'Last taken'], modules, 'No assessments taken yet.')}
+<h2>Recent assessments</h2>
+{_table(['Date', 'Module', 'Score', 'Percentage'], history, 'No assessments taken yet.')}
+<h2>Games</h2>
+{_table(['Game', 'Rounds', 'Best', 'Average', 'Latest', 'Last played'], games, 'No games played yet.')}
+<h2>Symptom checklist</h2>
+{checklist_html}
+</body>
+</html>
+'''
+
+
+def render(data, fmt):
+    """Report bytes in `fmt` (html, or pdf when weasyprint is installed); needs no app context"""
+    page = render_html(data)
+    if fmt == 'pdf':
+        return HTML(string=page).write_pdf()
+    return page.encode('utf-8')
+
+
+# --- RESULT CACHE ---
+class ReportCache:
+    """Rendered reports on disk, one file per data hash"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    def path(self, key, fmt):
+        return os.path.join(self.directory, f'{key}.{fmt}')
+
+    def has(self, key, fmt):
+        return os.path.exists(self.path(key, fmt))
+
+    def put(self, key, fmt, content):
+        # Write then rename, so a concurrent reader never sees a partial file
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key, fmt)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def touch(self, key, fmt):
+        try:
+            os.utime(self.path(key, fmt))
+        except OSError:
+            pass
+
+    def prune(self, max_age):
+        """Delete files not rendered or served for `max_age` seconds; returns how many"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+
+# --- JOBS ---
+class ReportJobs:
+    """Background report jobs on a local thread pool, rendered in a process pool.
+
+    The threads claim jobs and collect their data; render() itself is CPU
+    bound (weasyprint especially), so it runs in separate processes and does
+    not hold the GIL that request threads need.
+    Jobs are rows in report_jobs, so any worker process can answer a poll.
+    A worker claims a job with a conditional UPDATE before rendering it, and
+    a job left queued or running for longer than REPORT_JOB_TIMEOUT (its
+    process died) is dispatched again by the next poll.
+    """
+
+    def __init__(self):
+        self.workers = 2
+        self.use_processes = False
+        self.history = 50
+        self.timeout = 300
+        self.retention_days = 30
+        self.cache = ReportCache()
+        self._app = None
+        self._executor = None
+        self._renderers = None
+        self._pid = None
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config.get('REPORT_WORKERS', self.workers)
+        self.use_processes = bool(app.config.get('REPORT_USE_PROCESS_POOL', self.use_processes))
+        self.history = app.config.get('REPORT_HISTORY_ROWS', self.history)
+        self.timeout = app.config.get('REPORT_JOB_TIMEOUT', self.timeout)
+        self.retention_days = app.config.get('REPORT_RETENTION_DAYS', self.retention_days)
+        self.cache.directory = app.config.get('REPORT_CACHE_DIR') or os.path.join(app.instance_path, 'reports')
+        self._app = app
+        app.cli.add_command(reports_cli)
+
+    @staticmethod
+    def formats():
+        return ('html', 'pdf') if HTML is not None else ('html',)
+
+    def submit(self, user_id, fmt):
+        """Job for a report of the user's current data; already done when that data was rendered before"""
+        key = data_hash(collect(user_id, self.history), fmt)
+        existing = ReportJob.query.filter(
+            ReportJob.user_id == int(user_id), ReportJob.format == fmt,
+            ReportJob.data_hash == key, ReportJob.status != 'failed'
+        ).order_by(ReportJob.created_at.desc()).first()
+        if existing is not None and (existing.status != 'done' or self.cache.has(key, fmt)):
+            return existing
+
+        job = ReportJob(id=uuid.uuid4().hex, user_id=int(user_id), format=fmt, data_hash=key, status='queued')
+        if self.cache.has(key, fmt):
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+        db.session.add(job)
+        db.session.commit()
+        if job.status == 'queued':
+            self._dispatch(job.id)
+        return job
+
+    def find(self, user_id, job_id):
+        """The user's job, dispatched again here if the process that took it seems to have died"""
+        job = ReportJob.query.filter_by(id=job_id, user_id=int(user_id)).first()
+        if job is not None and job.status in ('queued', 'running') and self._stalled(job):
+            logger.warning(f"Report job {job.id} stalled while {job.status}; dispatching it again")
+            self._dispatch(job.id)
+        return job
+
+    def artifact(self, job):
+        """Path of a done job's file, or None after queueing it again because the file is gone"""
+        if self.cache.has(job.data_hash, job.format):
+            self.cache.touch(job.data_hash, job.format)
+            return self.cache.path(job.data_hash, job.format)
+        job.status = 'queued'
+        job.created_at = datetime.utcnow()  # restarts the stall clock
+        db.session.commit()
+        self._dispatch(job.id)
+        return None
+
+    def _stalled(self, job):
+        if job.id in self._inflight:
+            return False
+        since = job.started_at if job.status == 'running' else job.created_at
+        return since is None or since < datetime.utcnow() - timedelta(seconds=self.timeout)
+
+    def _pool(self):
+        # Created lazily (and again after fork) so gunicorn workers each own their threads and processes
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report')
+                self._renderers = None
+                self._inflight = set()
+                self._pid = os.getpid()
+            return self._executor
+
+    def _render(self, data, fmt):
+        if not self.use_processes:
+            return render(data, fmt)
+        self._pool()
+        with self._lock:
+            if self._renderers is None:
+                self._renderers = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                logger.info(f"Started report renderer pool with {self.workers} processes")
+            renderers = self._renderers
+        return renderers.submit(render, data, fmt).result(timeout=self.timeout)
+
+    def _dispatch(self, job_id):
+        shard = g.get('db_shard') if has_app_context() else None
+        executor = self._pool()
+        self._inflight.add(job_id)
+        executor.submit(self._run, job_id, shard)
+
+    def _run(self, job_id, shard):
+        try:
+            with self._app.app_context(), tenant_router.use_shard(shard):
+                self.process(job_id)
+        except Exception as e:
+            logger.error(f"Report job {job_id} crashed: {e}")
+        finally:
+            self._inflight.discard(job_id)
+
+    def process(self, job_id):
+        """Claim and render one job; returns False if another worker holds it or it is finished"""
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(ReportJob).where(ReportJob.id == job_id, or_(
+                ReportJob.status == 'queued',
+                and_(ReportJob.status == 'running', ReportJob.started_at < now - timedelta(seconds=self.timeout))
+            )).values(status='running', started_at=now, attempts=ReportJob.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return False
+
+        job = db.session.get(ReportJob, job_id)
+        started = time.perf_counter()
+        try:
+            # Re-read the data: rows written since submission are included and keyed accordingly
+            data = collect(job.user_id, self.history)
+            key = data_hash(data, job.format)
+            if not self.cache.has(key, job.format):
+                self.cache.put(key, job.format, self._render(data, job.format))
+            job.data_hash = key
+            job.status = 'done'
+            job.error = None
+            logger.info(f"Rendered {job.format} report {job.id} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ReportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)[:500]
+            logger.error(f"Report job {job_id} failed: {e}")
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return True
+
+    def run_pending(self):
+        """Render queued and stalled jobs on every shard in this process; returns how many ran"""
+        ran = 0
+        for _ in tenant_router.each_shard():
+            cutoff = datetime.utcnow() - timedelta(seconds=self.timeout)
+            job_ids = [job_id for (job_id,) in db.session.query(ReportJob.id).filter(or_(
+                ReportJob.status == 'queued',
+                and_(ReportJob.status == 'running', ReportJob.started_at < cutoff)
+            )).order_by(ReportJob.created_at)]
+            ran += sum(1 for job_id in job_ids if self.process(job_id))
+        return ran
+
+    def purge(self, days=None):
+        """Delete finished jobs and unused cached files older than `days`; returns (jobs, files)"""
+        days = self.retention_days if days is None else days
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        jobs = 0
+        for _ in tenant_router.each_shard():
+            jobs += ReportJob.query.filter(
+                ReportJob.status.in_(('done', 'failed')), ReportJob.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        files = self.cache.prune(days * 86400)
+        return jobs, files
+
+
+report_jobs = ReportJobs()
+
+
+# --- ENDPOINTS ---
+def _job_response(job, status):
+    response = jsonify({'job': job.to_dict()})
+    response.headers['Location'] = url_for('reports.get_report_job', job_id=job.id)
+    if job.status in ('queued', 'running'):
+        response.headers['Retry-After'] = '1'
+    return response, status
+
+
+@reports_bp.route('', methods=['POST'])
+@jwt_required()
+def submit_report():
+    """Queue a printable report of the current results (`format`: html or pdf)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        fmt = data.get('format', 'html')
+        if fmt not in report_jobs.formats():
+            return jsonify({'error': f"format must be one of: {', '.join(report_jobs.formats())}"}), 400
+
+        job = report_jobs.submit(get_jwt_identity(), fmt)
+        return _job_response(job, 200 if job.status == 'done' else 202)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Report submit error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report_job(job_id):
+    """Status of a report job"""
+    try:
+        job = report_jobs.find(get_jwt_identity(), job_id)
+        if job is None:
+            return jsonify({'error': 'Report not found'}), 404
+        return _job_response(job, 200)
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/<job_id>/file', methods=['GET'])
+@jwt_required()
+def get_report_file(job_id):
+    """The rendered report; 202 with the job while it is still being rendered"""
+    try:
+        job = report_jobs.find(get_jwt_identity(), job_id)
+        if job is None:
+            return jsonify({'error': 'Report not found'}), 404
+        if job.status == 'failed':
+            return jsonify({'error': f'Report rendering failed: {job.error}', 'job': job.to_dict()}), 409
+        path = report_jobs.artifact(job) if job.status == 'done' else None
+        if path is None:
+            return _job_response(job, 202)
+
+        response = send_file(
+            path, mimetype=MEDIA_TYPES[job.format], conditional=True, etag=job.data_hash,
+            as_attachment=job.format == 'pdf', download_name=f'numskill-report-{job.id}.{job.format}'
+        )
+        response.cache_control.private = True
+        return response
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# --- CLI ---
+reports_cli = AppGroup('reports', help='Background clinician reports')
+
+
+@reports_cli.command('run-pending')
+def run_pending_command():
+    """Render queued and stalled report jobs in this process (e.g. after a restart)"""
+    click.echo(f'Rendered {report_jobs.run_pending()} report jobs')
+
+
+@reports_cli.command('purge')
+@click.option('--days', type=int, default=None, help='Defaults to REPORT_RETENTION_DAYS')
+def purge_command(days):
+    """Delete old finished jobs and cached reports nobody fetched recently"""
+    jobs, files = report_jobs.purge(days)
+    click.echo(f'Deleted {jobs} report jobs and {files} cached files')
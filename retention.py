@@ -0,0 +1,147 @@
+from sqlalchemy import insert, and_, or_
+from models import db, GameScore, GameScoreDaily, GameScoreArchive, DeletedRow
+from datetime import datetime, date, timedelta, time
+import base64
+import logging
+import json
+import gzip
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def retention_cutoff(days, now=None):
+    """Start of the UTC day `days` days ago; rounds before it are compacted whole days at a time"""
+    now = now or datetime.utcnow()
+    return datetime.combine((now - timedelta(days=days)).date(), time.min)
+
+
+def _fold(rollup, score, created_at):
+    rollup.rounds += 1
+    rollup.total += score
+    rollup.best = max(rollup.best, score)
+    rollup.worst = min(rollup.worst, score)
+    if created_at >= rollup.last_played_at:
+        rollup.latest = score
+        rollup.last_played_at = created_at
+
+
+def _roll_up(rows):
+    """Fold raw (id, user_id, game_name, score, created_at) rows into new or stored daily rollups"""
+    users = {row.user_id for row in rows}
+    days = {row.created_at.date() for row in rows}
+    rollups = {
+        (r.user_id, r.game_name, r.day): r
+        for r in GameScoreDaily.query.filter(GameScoreDaily.user_id.in_(users), GameScoreDaily.day.in_(days))
+    }
+    written = set()
+    for row in rows:
+        key = (row.user_id, row.game_name, row.created_at.date())
+        written.add(key)
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = GameScoreDaily(
+                user_id=row.user_id, game_name=row.game_name, day=key[2], rounds=1, total=row.score,
+                best=row.score, worst=row.score, latest=row.score, last_played_at=row.created_at
+            )
+            db.session.add(rollup)
+        else:
+            _fold(rollup, row.score, row.created_at)
+    return len(written)
+
+
+class _FileArchive:
+    """Appends archived rounds to one gzipped NDJSON file per compaction run"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'game_scores_{datetime.utcnow():%Y%m%dT%H%M%S}.ndjson.gz')
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            record = dict(row._mapping, created_at=row.created_at.isoformat())
+            self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _TableArchive:
+    def write(self, rows):
+        db.session.execute(insert(GameScoreArchive), [dict(row._mapping) for row in rows])
+
+    def close(self):
+        pass
+
+
+def compact_game_scores(cutoff, batch_size=5000, archive_dir=None):
+    """Roll raw rounds older than `cutoff` into game_score_daily and move them out of game_scores.
+
+    Each batch folds, archives and deletes in one transaction, so the job can
+    be stopped and rerun at any point. Rounds go to game_scores_archive, or
+    to gzipped NDJSON files under `archive_dir` when it is set (a failed
+    commit can then leave a batch in the file twice). Returns
+    (rounds compacted, rollup rows written).
+    """
+    archive = _FileArchive(archive_dir) if archive_dir else _TableArchive()
+    compacted = touched = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.session.query(
+                GameScore.id, GameScore.user_id, GameScore.game_name, GameScore.score, GameScore.created_at
+            ).filter(GameScore.created_at < cutoff, GameScore.id > last_id).order_by(GameScore.id).limit(batch_size).all()
+            if not rows:
+                break
+            try:
+                touched += _roll_up(rows)
+                archive.write(rows)
+                ids = [row.id for row in rows]
+                GameScore.query.filter(GameScore.id.in_(ids)).delete(synchronize_session=False)
+                # Tombstones, so delta sync tells clients to drop the rounds now in the rollups
+                db.session.execute(insert(DeletedRow), [
+                    {'user_id': row.user_id, 'table_name': 'game_scores', 'row_id': row.id} for row in rows
+                ])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            compacted += len(rows)
+            last_id = rows[-1].id
+    finally:
+        archive.close()
+    logger.info(f"Compacted {compacted} game rounds older than {cutoff:%Y-%m-%d} into {touched} daily rollups")
+    return compacted, touched
+
+
+def encode_daily_cursor(rollup):
+    """Opaque cursor for a rollup's (day, game_name) position"""
+    raw = f'{rollup.day.isoformat()}|{rollup.game_name}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_daily_cursor(cursor):
+    """Inverse of encode_daily_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        day, game_name = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|', 1)
+        return date.fromisoformat(day), game_name
+    except Exception:
+        raise ValueError('Invalid daily cursor')
+
+
+def daily_page(user_id, game_name=None, before=None, limit=50):
+    """Newest-first rollups for one user after the `before` cursor position; returns (rows, has_more)"""
+    query = GameScoreDaily.query.filter_by(user_id=user_id)
+    if game_name:
+        query = query.filter_by(game_name=game_name)
+    if before:
+        day, last_game = decode_daily_cursor(before)
+        query = query.filter(or_(
+            GameScoreDaily.day < day,
+            and_(GameScoreDaily.day == day, GameScoreDaily.game_name > last_game)
+        ))
+    rows = query.order_by(GameScoreDaily.day.desc(), GameScoreDaily.game_name).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,256 @@
+from flask import current_app
+from flask.cli import AppGroup
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy.exc import IntegrityError
+from models import db, TokenFamily, TokenRevocation
+from tenancy import tenant_router
+from datetime import datetime, timedelta
+import threading
+import logging
+import click
+import random
+import math
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+WORD_BITS = 30
+PATTERN_HASHES = 5
+PATTERN_BITS = 12
+PATTERN_MASK = (1 << PATTERN_BITS) - 1
+
+# Each sync re-reads this much recent history, so a revocation whose transaction
+# committed late (or on a host with a slightly different clock) is still picked up
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+# --- SIGN-INS ---
+def start_sign_in(user_id):
+    """New token family for a sign-in (added to the session; the caller commits)"""
+    family = TokenFamily(id=uuid.uuid4().hex, user_id=int(user_id), generation=0, refreshed_at=datetime.utcnow())
+    db.session.add(family)
+    return family
+
+
+def issue_tokens(user, family):
+    """(access token, refresh token) for a sign-in; both carry its family id, the refresh token its generation"""
+    access_token = create_access_token(identity=str(user.id), additional_claims={**tenant_router.claims(user), 'fam': family.id})
+    refresh_token = create_refresh_token(identity=str(user.id), additional_claims={'fam': family.id, 'gen': family.generation})
+    return access_token, refresh_token
+
+
+# --- DENYLIST ---
+class BloomFilter:
+    """Blocked Bloom filter: no false negatives, about `error_rate` false positives at `capacity` keys.
+
+    All of a key's bits sit in one 30-bit word, and which bits they are comes
+    from a precomputed table of patterns. One reduction of the key's hash
+    picks both, so a lookup is a hash, a modulo, two list reads and a mask
+    test. 30 bits is one CPython int digit, which keeps that arithmetic on
+    the fast path (so does a span under 2**30, up to ~200k keys).
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        bits = -self.capacity * math.log(error_rate) / math.log(2) ** 2
+        # Confining a key to one small word costs accuracy; 2.5x the space buys it back
+        self.words = max(1, math.ceil(2.5 * bits / WORD_BITS))
+        self.count = 0
+        self._span = self.words << PATTERN_BITS
+        self._table = [0] * self.words
+        rng = random.Random(0)
+        self._patterns = [sum(1 << bit for bit in rng.sample(range(WORD_BITS), PATTERN_HASHES))
+                          for _ in range(1 << PATTERN_BITS)]
+
+    def add(self, key):
+        # str hashes are salted per interpreter, which is fine: each process builds its own filter
+        h = hash(key) % self._span
+        self._table[h >> PATTERN_BITS] |= self._patterns[h & PATTERN_MASK]
+        self.count += 1
+
+    def might_contain(self, key):
+        h = hash(key) % self._span
+        pattern = self._patterns[h & PATTERN_MASK]
+        return self._table[h >> PATTERN_BITS] & pattern == pattern
+
+    __contains__ = might_contain
+
+
+class TokenDenylist:
+    """Revoked token families, held in memory so @jwt_required never queries for revocation.
+
+    A token carries its sign-in's family id ('fam' claim). The check is a
+    Bloom filter lookup, and only its positives are confirmed against the
+    exact set. Both are fed from the token_revocations table: a revocation
+    made in this process applies at once, and a background thread picks up
+    other workers' every `sync_interval` seconds. Bloom filters cannot
+    forget, so the whole structure is rebuilt without expired rows every
+    `rebuild_interval` seconds, or sooner once it outgrows its capacity.
+    """
+
+    def __init__(self):
+        self.sync_interval = 2.0
+        self.rebuild_interval = 3600.0
+        self.capacity = 100000
+        self.lifetime = timedelta(days=30)
+        self._app = None
+        self._state = (BloomFilter(self.capacity), set())
+        self._synced_through = datetime.min
+        self._rebuilt_at = 0.0
+        self._added_during_rebuild = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._fork_hook = False
+
+    def init_app(self, app, jwt):
+        """Register the JWT blocklist check and load the table (call once the schema exists)"""
+        self.sync_interval = float(app.config.get('REVOCATION_SYNC_INTERVAL', self.sync_interval))
+        self.capacity = int(app.config.get('REVOCATION_BLOOM_CAPACITY', self.capacity))
+        # A revocation can be forgotten once every token of the family has expired
+        self.lifetime = max(app.config['JWT_ACCESS_TOKEN_EXPIRES'], app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+        self._app = app
+        jwt.token_in_blocklist_loader(self._token_revoked)
+        app.cli.add_command(tokens_cli)
+        with app.app_context():
+            self.rebuild()
+        self._start_sync()
+        if not self._fork_hook:
+            # Threads do not survive fork, so each gunicorn worker (with --preload) starts its own
+            os.register_at_fork(after_in_child=self._start_sync)
+            self._fork_hook = True
+
+    # --- CHECKS ---
+    def is_revoked(self, family):
+        """Constant time, no I/O"""
+        bloom, exact = self._state
+        return bloom.might_contain(family) and family in exact
+
+    def _token_revoked(self, jwt_header, jwt_payload):
+        family = jwt_payload.get('fam')
+        return family is not None and self.is_revoked(family)
+
+    # --- REVOKING ---
+    def revoke(self, family, reason):
+        """Revoke every token issued to a TokenFamily and commit"""
+        if family.revoked_at is None:
+            now = datetime.utcnow()
+            family.revoked_at = now
+            db.session.add(TokenRevocation(family=family.id, user_id=family.user_id, reason=reason,
+                                           revoked_at=now, expires_at=now + self.lifetime))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()  # revoked concurrently by another request
+            logger.info(f"Revoked token family {family.id} of user {family.user_id} ({reason})")
+        self._add(family.id)
+
+    def revoke_user(self, user_id, reason='admin'):
+        """Revoke every live sign-in of a user; returns how many"""
+        cutoff = datetime.utcnow() - current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        families = TokenFamily.query.filter(
+            TokenFamily.user_id == user_id, TokenFamily.revoked_at.is_(None), TokenFamily.refreshed_at > cutoff
+        ).all()
+        for family in families:
+            self.revoke(family, reason)
+        return len(families)
+
+    def _add(self, family):
+        with self._lock:
+            bloom, exact = self._state
+            if family in exact:
+                return
+            exact.add(family)  # before the filter, so a filter hit always finds it here
+            bloom.add(family)
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append(family)
+            if bloom.count > bloom.capacity:
+                self._rebuilt_at = 0.0  # resize on the next sync
+
+    # --- SYNC ---
+    def rebuild(self):
+        """Reload every unexpired revocation into a filter sized for it.
+
+        The query runs outside the lock, so checks keep using the old state;
+        families revoked meanwhile are merged in when the new state is swapped in.
+        """
+        with self._lock:
+            self._added_during_rebuild = []
+        try:
+            started = datetime.utcnow()
+            families = {family for (family,) in db.session.query(TokenRevocation.family).filter(
+                TokenRevocation.expires_at > started)}
+            bloom = BloomFilter(max(self.capacity, 2 * len(families)))
+            for family in families:
+                bloom.add(family)
+        except Exception:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+        with self._lock:
+            for family in self._added_during_rebuild:
+                families.add(family)
+                bloom.add(family)
+            self._added_during_rebuild = None
+            self._state = (bloom, families)
+            self._synced_through = started
+            self._rebuilt_at = time.monotonic()
+        return len(families)
+
+    def sync(self):
+        """Pick up revocations recorded by other workers since the last sync; returns how many were new"""
+        started = datetime.utcnow()
+        families = [family for (family,) in db.session.query(TokenRevocation.family).filter(
+            TokenRevocation.revoked_at >= self._synced_through - SYNC_OVERLAP)]
+        new = [family for family in families if family not in self._state[1]]
+        for family in new:
+            self._add(family)
+        self._synced_through = started
+        return len(new)
+
+    def _start_sync(self):
+        if self._app is None or self.sync_interval <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._sync_loop, name='token-denylist', daemon=True)
+        self._thread.start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                with self._app.app_context():
+                    if time.monotonic() - self._rebuilt_at > self.rebuild_interval:
+                        self.rebuild()
+                    else:
+                        self.sync()
+            except Exception as e:
+                logger.error(f"Token denylist sync failed: {e}")
+
+
+token_denylist = TokenDenylist()
+
+
+# --- CLI ---
+tokens_cli = AppGroup('tokens', help='Refresh token sign-ins and revocations')
+
+
+@tokens_cli.command('revoke-user')
+@click.argument('user_id', type=int)
+def revoke_user_command(user_id):
+    """Sign a user out everywhere (takes effect within REVOCATION_SYNC_INTERVAL)"""
+    click.echo(f'Revoked {token_denylist.revoke_user(user_id)} sign-ins of user {user_id}')
+
+
+@tokens_cli.command('purge')
+def purge_command():
+    """Delete revocations and sign-ins whose tokens have all expired"""
+    now = datetime.utcnow()
+    revocations = TokenRevocation.query.filter(TokenRevocation.expires_at <= now).delete(synchronize_session=False)
+    families = TokenFamily.query.filter(
+        TokenFamily.refreshed_at <= now - current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {revocations} expired revocations and {families} expired sign-ins')
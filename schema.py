@@ -0,0 +1,37 @@
+from sqlalchemy import inspect
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def sync_schema(db):
+    """Create missing tables, nullable columns and indexes.
+
+    There is no migration tool in this project, and create_all only creates
+    tables that do not exist yet, so columns and indexes added to existing
+    models are applied here on startup. Only the primary is touched; a read
+    replica gets its schema through replication.
+    """
+    db.create_all(bind_key=None)
+    sync_tables(db.engine, db.metadata.sorted_tables)
+
+
+def sync_tables(engine, tables):
+    """Add missing nullable columns and indexes to existing `tables` on `engine`"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.warning(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                logger.info(f"Added column {table.name}.{column.name}")
+
+    for table in tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
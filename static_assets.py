@@ -0,0 +1,156 @@
+from flask import request, current_app, jsonify
+import hashlib
+import threading
+import logging
+import click
+import gzip
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip variants are built without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_PREFIX = '/assets/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+INLINE_BLOCK = re.compile(r'<(script|style)>(.*?)</\1>', re.S)
+MIMETYPES = {'js': 'text/javascript', 'css': 'text/css', 'html': 'text/html'}
+
+
+class Asset:
+    """A file held in memory with gzip/brotli variants compressed once at maximum level"""
+    __slots__ = ('mimetype', 'digest', 'variants')
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {None: body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+
+    def etag(self, encoding):
+        return f'{self.digest}-{encoding}' if encoding else self.digest
+
+    def respond(self, cache_control):
+        """Serve the best variant the client accepts, or 304 if it holds any of them"""
+        encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in self.variants])
+        if any(request.if_none_match.contains(self.etag(e)) for e in self.variants):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(self.variants[encoding], status=200, mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(self.etag(encoding))
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class StaticAssets:
+    """Build pipeline and server for the single-page HTML shell.
+
+    Inline <script>/<style> blocks larger than ASSET_INLINE_MAX bytes move
+    to /assets/<name>.<hash>.<ext>, served with immutable caching; the
+    rewritten shell is served with `no-cache` so browsers revalidate it with
+    a cheap 304. Every body is precompressed once when the shell is built.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.inline_max = 1024
+        self.shell = None
+        self.assets = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.path = os.path.join(app.root_path, app.config.get('ASSET_SHELL', 'index.html'))
+        self.inline_max = app.config.get('ASSET_INLINE_MAX', self.inline_max)
+        app.add_url_rule(f'{ASSET_PREFIX}<path:name>', 'static_asset', self.serve_asset)
+        app.cli.add_command(build_assets_command)
+        self.reload()
+
+    def build(self, html):
+        """Split `html` into (shell Asset, {name: Asset}) without touching the served set"""
+        stem = os.path.splitext(os.path.basename(self.path))[0]
+        assets = {}
+
+        def extract(match):
+            tag, content = match.group(1), match.group(2)
+            if len(content.encode('utf-8')) < self.inline_max:
+                return match.group(0)
+            ext = 'js' if tag == 'script' else 'css'
+            asset = Asset(content.strip('\n').encode('utf-8') + b'\n', MIMETYPES[ext])
+            name = f'{stem}.{asset.digest[:12]}.{ext}'
+            assets[name] = asset
+            if tag == 'script':
+                return f'<script src="{ASSET_PREFIX}{name}"></script>'
+            return f'<link rel="stylesheet" href="{ASSET_PREFIX}{name}">'
+
+        shell = Asset(INLINE_BLOCK.sub(extract, html).encode('utf-8'), MIMETYPES['html'])
+        return shell, assets
+
+    def reload(self):
+        """Rebuild from the shell file on disk and swap the result in"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding='utf-8') as f:
+                shell, assets = self.build(f.read())
+        except OSError as e:
+            logger.warning(f"HTML shell not available: {e}")
+            return
+        with self._lock:
+            self.shell, self.assets, self._mtime = shell, assets, mtime
+        logger.info(f"Built HTML shell with {len(assets)} hashed assets")
+
+    def _refresh(self):
+        # Pick up edits to the shell while developing
+        if current_app.debug:
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.reload()
+            except OSError:
+                pass
+
+    def serve_shell(self):
+        self._refresh()
+        if self.shell is None:
+            return jsonify({'error': 'Not found'}), 404
+        return self.shell.respond('no-cache')
+
+    def serve_asset(self, name):
+        asset = self.assets.get(name)
+        if asset is None:
+            return jsonify({'error': 'Not found'}), 404
+        return asset.respond(IMMUTABLE)
+
+    def write(self, directory):
+        """Write the shell and assets, with .gz/.br siblings, for a CDN or front proxy to serve"""
+        files = {os.path.basename(self.path): self.shell}
+        files.update({os.path.join(ASSET_PREFIX.strip('/'), name): asset for name, asset in self.assets.items()})
+        for relative, asset in files.items():
+            target = os.path.join(directory, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            for encoding, body in asset.variants.items():
+                suffix = {None: '', 'gzip': '.gz', 'br': '.br'}[encoding]
+                with open(target + suffix, 'wb') as f:
+                    f.write(body)
+        return len(files)
+
+
+static_assets = StaticAssets()
+
+
+@click.command('build-assets')
+@click.argument('directory', default='build')
+def build_assets_command(directory):
+    """Write the hashed, precompressed HTML shell and assets to DIRECTORY"""
+    static_assets.reload()
+    if static_assets.shell is None:
+        raise click.ClickException(f'Cannot read {static_assets.path}')
+    count = static_assets.write(directory)
+    click.echo(f'Wrote {count} files (plus compressed variants) to {directory}')
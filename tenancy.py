@@ -0,0 +1,388 @@
+from flask import request, jsonify, g
+from flask.cli import AppGroup
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from sqlalchemy import MetaData, create_engine, select, delete
+from sqlalchemy.engine import make_url
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from models import db, User, Tenant
+from identity_cache import user_cache
+from database import TENANT_TABLES, pool_options, apply_sqlite_pragmas
+from schema import sync_tables
+import threading
+import logging
+import click
+import time
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'primary'  # CLI name for the primary database
+SHARD_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+COPY_CHUNK = 500  # users per copy/delete statement when moving a tenant
+
+
+def tenant_tables():
+    """TENANT_TABLES in dependency order"""
+    return [table for table in db.metadata.sorted_tables if table.name in TENANT_TABLES]
+
+
+def shard_tables():
+    """Copies of the tenant tables for creating them on a shard.
+
+    Their foreign keys into catalog tables (users.id) are dropped: those
+    tables live in the primary database, so the reference could not be
+    created, and under a PostgreSQL search_path per shard not even resolved.
+    """
+    metadata = MetaData()
+    tables = [table.to_metadata(metadata) for table in tenant_tables()]
+    for table in tables:
+        for constraint in list(table.foreign_key_constraints):
+            if any(element.target_fullname.split('.')[0] not in TENANT_TABLES for element in constraint.elements):
+                table.constraints.discard(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+                    table.foreign_keys.discard(element)
+    return tables
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _advance_sequences(connection):
+    # Rows are copied with their ids; PostgreSQL sequences must be moved past
+    # them, SQLite continues from MAX(rowid) by itself
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in tenant_tables():
+        column = table.autoincrement_column
+        if column is not None:
+            connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                f"COALESCE(MAX({column.name}), 1)) FROM {table.name}"
+            )
+
+
+class TenantRouter:
+    """Database-per-school routing.
+
+    Accounts and tenants stay in the primary database; a user's profile,
+    scores, games and summaries (TENANT_TABLES) live on their school's shard,
+    named by the `tenant` claim of the access token. Shard engines are opened
+    on first use from the TENANT_SHARD_URL template and kept in an LRU of
+    TENANT_ENGINE_CACHE_SIZE; each worker caches the school -> shard map for
+    TENANT_CACHE_TTL seconds. Users without a school use the primary.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.url_template = None
+        self.cache_size = 32
+        self.cache_ttl = 30.0
+        self.engine_hooks = []
+        self.before_move_hooks = []  # called before users change school or shard, e.g. to flush buffered writes
+        self.pragmas = {}
+        self._app = None
+        self._engines = OrderedDict()
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, engine_hooks=()):
+        """`engine_hooks` are called with each shard engine once its tables exist (instrumentation)"""
+        self.url_template = app.config.get('TENANT_SHARD_URL')
+        self.enabled = bool(self.url_template)
+        self.cache_size = app.config.get('TENANT_ENGINE_CACHE_SIZE', self.cache_size)
+        self.cache_ttl = app.config.get('TENANT_CACHE_TTL', self.cache_ttl)
+        self.pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+        self.engine_hooks = list(engine_hooks)
+        self._app = app
+        app.cli.add_command(tenants_cli)
+        if self.enabled:
+            app.before_request(self._route_request)
+
+    # --- ENGINES ---
+    def shard_url(self, shard):
+        if not self.enabled:
+            raise RuntimeError('Tenancy is disabled; set TENANT_SHARD_URL')
+        if not SHARD_NAME.match(shard) or shard == PRIMARY:
+            raise ValueError(f'Invalid shard name: {shard!r}')
+        url = make_url(self.url_template.format(shard=shard))
+        if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+            # Relative paths are under the instance folder, like SQLALCHEMY_DATABASE_URI
+            path = os.path.join(self._app.instance_path, url.database)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            url = url.set(database=path)
+        return url
+
+    def engine(self, shard):
+        """Engine for a shard (None = primary), opened and schema-synced on first use"""
+        if shard is None:
+            return db.engine
+        with self._lock:
+            engine = self._engines.pop(shard, None)
+            if engine is None:
+                engine = self._open(shard)
+            self._engines[shard] = engine
+            while len(self._engines) > self.cache_size:
+                evicted_shard, evicted = self._engines.popitem(last=False)
+                evicted.dispose()  # checked-out connections close when returned
+                logger.info(f"Closed idle shard engine {evicted_shard}")
+        return engine
+
+    def _open(self, shard):
+        url = self.shard_url(shard)
+        engine = create_engine(url, **pool_options(self._app.config, url))
+        apply_sqlite_pragmas(engine, self.pragmas)
+        if engine.dialect.name == 'postgresql':
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS "{shard}"')
+        tables = shard_tables()
+        tables[0].metadata.create_all(engine, tables=tables)
+        sync_tables(engine, tables)
+        # Instrument afterwards so schema setup is not billed to the request that opened the shard
+        for hook in self.engine_hooks:
+            hook(engine)
+        logger.info(f"Opened shard {shard}")
+        return engine
+
+    # --- ROUTING ---
+    def lookup(self, slug, fresh=False):
+        """(shard, status) of a school, cached for cache_ttl seconds; None if unknown"""
+        now = time.monotonic()
+        cached = self._tenants.get(slug)
+        if cached is not None and cached[1] > now and not fresh:
+            return cached[0]
+        tenant = db.session.get(Tenant, slug, populate_existing=True)
+        entry = (tenant.shard, tenant.status) if tenant is not None else None
+        self._tenants[slug] = (entry, now + self.cache_ttl)
+        return entry
+
+    @staticmethod
+    def claims(user):
+        """Extra access-token claims naming the user's school"""
+        return {'tenant': user.tenant} if user.tenant else {}
+
+    def _route_request(self):
+        if request.method == 'OPTIONS':
+            return None
+        try:
+            verify_jwt_in_request(optional=True)
+            slug = get_jwt().get('tenant')
+        except Exception:
+            return None  # @jwt_required on the view reports bad tokens
+        if not slug:
+            return None
+
+        entry = self.lookup(slug)
+        if entry is None:
+            return jsonify({'error': 'Unknown school'}), 403
+        shard, status = entry
+        if status != 'active':
+            response = jsonify({'error': 'School data is being moved, retry shortly'})
+            response.headers['Retry-After'] = str(max(1, int(self.cache_ttl)))
+            return response, 503
+        g.db_shard = shard
+        g.db_shard_engine = self.engine(shard) if shard is not None else None
+        return None
+
+    @contextmanager
+    def use_shard(self, shard):
+        """Send tenant tables to `shard` (None = primary) inside the block"""
+        previous = g.get('db_shard'), g.get('db_shard_engine')
+        g.db_shard = shard
+        g.db_shard_engine = self.engine(shard) if shard is not None else None
+        try:
+            yield
+        finally:
+            g.db_shard, g.db_shard_engine = previous
+
+    @contextmanager
+    def use_tenant(self, slug):
+        """Bind a school's shard inside the block; raises ValueError if it is unknown or moving"""
+        entry = self.lookup(slug, fresh=True)
+        if entry is None:
+            raise ValueError(f"Unknown school '{slug}'")
+        if entry[1] != 'active':
+            raise ValueError(f"School '{slug}' is being moved")
+        with self.use_shard(entry[0]):
+            yield
+
+    def shards(self):
+        """Every shard in use, None (the primary) first"""
+        if not self.enabled:
+            return [None]
+        names = {shard for (shard,) in db.session.query(Tenant.shard).filter(Tenant.shard.isnot(None)).distinct()}
+        return [None] + sorted(names)
+
+    def each_shard(self):
+        """Yield each shard name with tenant tables bound to it, for jobs that span every school"""
+        for shard in self.shards():
+            with self.use_shard(shard):
+                yield shard
+
+    def users_by_shard(self):
+        """{shard: [user ids]} for every user, grouped by where their data lives"""
+        shard_of = dict(db.session.query(Tenant.slug, Tenant.shard)) if self.enabled else {}
+        grouped = defaultdict(list)
+        for user_id, tenant in db.session.query(User.id, User.tenant):
+            grouped[shard_of.get(tenant)].append(user_id)
+        return grouped
+
+    # --- ADMINISTRATION ---
+    def create_tenant(self, slug, name=None, shard=None):
+        """Register a school on `shard` (default: its own shard named after it; PRIMARY = primary database)"""
+        if not SHARD_NAME.match(slug):
+            raise ValueError(f'Invalid school slug: {slug!r}')
+        if db.session.get(Tenant, slug) is not None:
+            raise ValueError(f"School '{slug}' already exists")
+        shard = shard or slug
+        shard = None if shard == PRIMARY else shard
+        self.engine(shard)
+        tenant = Tenant(slug=slug, name=name, shard=shard, status='active')
+        db.session.add(tenant)
+        db.session.commit()
+        return tenant
+
+    def assign_users(self, slug, user_ids):
+        """Put existing school-less users into a school kept on the primary; returns users updated"""
+        tenant = db.session.get(Tenant, slug)
+        if tenant is None:
+            raise ValueError(f"Unknown school '{slug}'")
+        if tenant.shard is not None:
+            raise ValueError('Users can only be assigned to a school on the primary; move it to its shard afterwards')
+        for hook in self.before_move_hooks:
+            hook()
+        updated = User.query.filter(User.id.in_(user_ids), User.tenant.is_(None)).update(
+            {User.tenant: slug}, synchronize_session=False)
+        db.session.commit()
+        # A bulk UPDATE skips the ORM events that keep the user cache in step (other workers catch up within its TTL)
+        for user_id in user_ids:
+            user_cache.invalidate(user_id)
+        return updated
+
+    def move_tenant(self, slug, target, wait=None):
+        """Copy a school's rows to `target` (None = primary), switch it over and delete the old rows.
+
+        The school is marked 'moving' first. After waiting one cache TTL, no
+        worker routes to the old shard any more, and requests get 503 until
+        the switch. Row ids are kept (delta-sync watermarks stay valid), so
+        the target must not already hold rows with the same ids. Use a new
+        or dedicated shard; a conflict aborts the move. Returns
+        {table: rows copied}.
+        """
+        tenant = db.session.get(Tenant, slug)
+        if tenant is None:
+            raise ValueError(f"Unknown school '{slug}'")
+        if tenant.status != 'active':
+            raise ValueError(f"School '{slug}' is already being moved")
+        if tenant.shard == target:
+            raise ValueError(f"School '{slug}' is already on {target or PRIMARY}")
+        source, destination = self.engine(tenant.shard), self.engine(target)
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).filter_by(tenant=slug)]
+
+        tenant.status = 'moving'
+        db.session.commit()
+        self._tenants.pop(slug, None)
+        time.sleep(self.cache_ttl if wait is None else wait)
+
+        for hook in self.before_move_hooks:
+            hook()
+        copied = {}
+        try:
+            with destination.begin() as dst, source.connect() as src:
+                for table in tenant_tables():
+                    copied[table.name] = 0
+                    for chunk in _chunks(user_ids, COPY_CHUNK):
+                        result = src.execution_options(yield_per=1000).execute(
+                            select(table).where(table.c.user_id.in_(chunk)))
+                        for partition in result.mappings().partitions():
+                            dst.execute(table.insert(), [dict(row) for row in partition])
+                            copied[table.name] += len(partition)
+                _advance_sequences(dst)
+        except Exception:
+            tenant.status = 'active'
+            db.session.commit()
+            raise
+
+        tenant.shard = target
+        tenant.status = 'active'
+        db.session.commit()
+        self._tenants.pop(slug, None)
+
+        with source.begin() as src:
+            for table in reversed(tenant_tables()):
+                for chunk in _chunks(user_ids, COPY_CHUNK):
+                    src.execute(delete(table).where(table.c.user_id.in_(chunk)))
+        logger.info(f"Moved school {slug} to {target or PRIMARY}: {copied}")
+        return copied
+
+
+tenant_router = TenantRouter()
+
+
+# --- CLI ---
+tenants_cli = AppGroup('tenants', help='Schools and their shard databases')
+
+
+def _shard_arg(value):
+    return None if value == PRIMARY else value
+
+
+@tenants_cli.command('list')
+def list_tenants_command():
+    """List schools with their shard, status and number of users"""
+    counts = dict(db.session.query(User.tenant, db.func.count(User.id)).group_by(User.tenant))
+    for tenant in Tenant.query.order_by(Tenant.slug):
+        click.echo(f"{tenant.slug:<24} {tenant.shard or PRIMARY:<24} {tenant.status:<8} {counts.get(tenant.slug, 0)} users")
+
+
+@tenants_cli.command('create-shard')
+@click.argument('shard')
+def create_shard_command(shard):
+    """Create (or bring up to date) the tenant tables of a shard database"""
+    tenant_router.engine(shard)
+    click.echo(f'Shard {shard} ready at {tenant_router.shard_url(shard).render_as_string(hide_password=True)}')
+
+
+@tenants_cli.command('create')
+@click.argument('slug')
+@click.option('--name', default=None, help='Display name of the school')
+@click.option('--shard', default=None, help=f'Shard database; defaults to one named after the school, "{PRIMARY}" keeps it in the main database')
+def create_tenant_command(slug, name, shard):
+    """Register a school and create its shard"""
+    try:
+        tenant = tenant_router.create_tenant(slug, name=name, shard=shard)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Created school {tenant.slug} on {tenant.shard or PRIMARY}')
+
+
+@tenants_cli.command('assign')
+@click.argument('slug')
+@click.argument('user_ids', nargs=-1, type=int, required=True)
+def assign_users_command(slug, user_ids):
+    """Put existing users without a school into SLUG (which must be on the primary)"""
+    try:
+        updated = tenant_router.assign_users(slug, list(user_ids))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Assigned {updated} users to {slug}. Tokens issued before now carry no school, so let them expire '
+               f'(JWT_ACCESS_TOKEN_EXPIRES) before moving {slug} off the primary')
+
+
+@tenants_cli.command('move')
+@click.argument('slug')
+@click.argument('shard')
+@click.option('--wait', type=float, default=None, help='Seconds to let workers see the move; defaults to TENANT_CACHE_TTL')
+def move_tenant_command(slug, shard, wait):
+    """Move a school's data to SHARD ("primary" for the main database)"""
+    try:
+        copied = tenant_router.move_tenant(slug, _shard_arg(shard), wait=wait)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in copied.items():
+        click.echo(f'{table:<24} {count} rows')
+    click.echo(f'Moved {slug} to {shard}')
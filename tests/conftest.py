@@ -0,0 +1,72 @@
+import itertools
+import pytest
+from config import Config, TestingConfig
+from app import create_app
+from models import db
+from write_buffer import game_score_buffer
+
+_names = itertools.count(1)
+
+
+@pytest.fixture
+def make_app(monkeypatch, tmp_path):
+    """Build an app on a fresh SQLite file; keyword arguments override TestingConfig"""
+    def make(**overrides):
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path}/test.db')
+        for key, value in overrides.items():
+            monkeypatch.setattr(TestingConfig, key, value, raising=False)
+        return create_app('testing')
+    yield make
+    # The buffer is shared by every app in the process: leave it empty, and wake
+    # its flusher if a test parked it on a long interval
+    game_score_buffer.flush()
+    with game_score_buffer._cond:
+        game_score_buffer.flush_interval = Config.GAME_SCORE_FLUSH_INTERVAL
+        game_score_buffer._cond.notify()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def sign_up(client, username=None, password='secret123', **extra):
+    """Create an account; returns (auth headers, user id, register response body)"""
+    username = username or f'user{next(_names)}'
+    response = client.post('/api/auth/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': password, **extra
+    })
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    return {'Authorization': f"Bearer {body['access_token']}"}, body['user']['id'], body
+
+
+@pytest.fixture
+def register(client):
+    return lambda *args, **kwargs: sign_up(client, *args, **kwargs)
+
+
+@pytest.fixture
+def headers(register):
+    return register()[0]
+
+
+def save_profile(client, headers, child_age=7):
+    response = client.post('/api/assessment/profile', headers=headers, json={
+        'child_name': 'Sam', 'child_age': child_age, 'parent_name': 'Alex'
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['profile']
+
+
+def save_score(client, headers, module='math', score=3, total=5):
+    response = client.post('/api/assessment/score', headers=headers, json={
+        'module': module, 'score': score, 'total': total
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['score']
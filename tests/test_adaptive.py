@@ -0,0 +1,81 @@
+import random
+import re
+from models import db, AssessmentScore
+from adaptive import adaptive_engine, _gen_estimation
+from conftest import sign_up
+
+
+def _step(client, headers, session=None, answer=None):
+    body = {'session': session}
+    if answer is not None:
+        body['answer'] = answer
+    return client.post('/api/assessment/adaptive/facts/next-item', headers=headers, json=body)
+
+
+def _key(item):
+    pool = adaptive_engine.pool('facts')
+    return pool.items[pool.index[item['id']]]['a']
+
+
+def test_session_runs_to_a_saved_result(app, client, headers):
+    response = _step(client, headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert 'a' not in body['item']
+
+    steps = 0
+    while not body['done']:
+        steps += 1
+        response = _step(client, headers, body['session'], _key(body['item']))
+        assert response.status_code in (200, 201)
+        body = response.get_json()
+
+    assert 5 <= body['answered'] <= 20 and steps == body['answered']
+    assert body['theta'] > 0
+    score = body['score']
+    assert score['module_name'] == 'facts_adaptive'
+    assert score['score'] == score['total_questions'] == body['answered']
+    with app.app_context():
+        assert db.session.get(AssessmentScore, score['id']).answer_key_version == adaptive_engine.pool('facts').version
+
+
+def test_an_answered_step_cannot_be_replayed(client, headers):
+    first = _step(client, headers).get_json()
+    assert _step(client, headers, first['session'], 'not-an-option').status_code == 200
+    replay = _step(client, headers, first['session'], _key(first['item']))
+    assert replay.status_code == 409
+
+
+def test_sessions_are_checked(client, headers):
+    assert _step(client, headers, 'forged').status_code == 400
+    token = _step(client, headers).get_json()['session']
+    other = sign_up(client)[0]
+    assert _step(client, other, token, '1').status_code == 400
+    assert client.post('/api/assessment/adaptive/astronomy/next-item', headers=headers, json={}).status_code == 404
+
+
+def test_wrong_answers_lower_the_estimate():
+    pool = adaptive_engine.pool('facts')
+    items = [pool.select(0.0, [], rng=random.Random(1))]
+    high, _ = pool.estimate(items, [1])
+    low, se = pool.estimate(items, [0])
+    assert low < 0 < high
+    assert se < 1.0
+
+
+def test_selection_skips_administered_items():
+    pool = adaptive_engine.pool('facts')
+    used = []
+    for _ in range(30):
+        used.append(pool.select(0.0, used))
+    assert len(set(used)) == 30
+
+
+def test_estimation_answers_round_halves_up():
+    rng = random.Random(3)
+    for _ in range(500):
+        item, _ = _gen_estimation(rng)
+        a, op, b = re.match(r'(\d+) ([+-]) (\d+)', item['q']).groups()
+        exact = int(a) + int(b) if op == '+' else int(a) - int(b)
+        assert int(item['a']) == (exact // 10 + (exact % 10 >= 5)) * 10
+        assert item['a'] in item['options']
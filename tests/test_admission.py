@@ -0,0 +1,84 @@
+from config import Config
+from admission import MemoryBackend, admission, parse_rate
+from password_hasher import password_hasher
+from conftest import sign_up
+
+
+def _limited(make_app, **limits):
+    return make_app(RATE_LIMIT_ENABLED=True, RATE_LIMITS=dict(Config.RATE_LIMITS, **limits))
+
+
+def _login(client, username, password, **headers):
+    return client.post('/api/auth/login', json={'username': username, 'password': password}, headers=headers)
+
+
+def test_parse_rate():
+    assert parse_rate('10/minute') == (10 / 60, 10)
+    assert parse_rate('3/hours') == (3 / 3600, 3)
+
+
+def test_memory_buckets_refill(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('admission.time.monotonic', lambda: clock[0])
+    backend = MemoryBackend()
+    assert backend.take('k', rate=1, burst=2) == 0
+    assert backend.take('k', rate=1, burst=2) == 0
+    assert backend.take('k', rate=1, burst=2) == 1.0
+    clock[0] += 1
+    assert backend.take('k', rate=1, burst=2, cost=0) == 0  # a check spends nothing
+    assert backend.take('k', rate=1, burst=2) == 0
+
+
+def test_failed_logins_lock_the_account_before_bcrypt(make_app, monkeypatch):
+    client = _limited(make_app, login_failures_account='3/hour').test_client()
+    sign_up(client, username='sam')
+    for _ in range(3):
+        assert _login(client, 'sam', 'wrong').status_code == 401
+
+    calls = []
+    verify = password_hasher.verify
+    monkeypatch.setattr(password_hasher, 'verify', lambda *args: calls.append(args) or verify(*args))
+    locked = _login(client, 'sam', 'secret123')
+    assert locked.status_code == 429
+    assert int(locked.headers['Retry-After']) > 0
+    assert calls == []
+
+
+def test_auth_requests_are_limited_per_client_ip(make_app):
+    client = make_app(RATE_LIMIT_ENABLED=True, TRUSTED_PROXIES=1,
+                      RATE_LIMITS=dict(Config.RATE_LIMITS, auth_ip='2/minute')).test_client()
+    first = {'X-Forwarded-For': '203.0.113.5'}
+    for _ in range(2):
+        assert _login(client, 'nobody', 'x', **first).status_code == 401
+    assert _login(client, 'nobody', 'x', **first).status_code == 429
+    # A spoofed entry left of the proxy's does not change the address
+    assert _login(client, 'nobody', 'x', **{'X-Forwarded-For': '1.2.3.4, 203.0.113.5'}).status_code == 429
+    assert _login(client, 'nobody', 'x', **{'X-Forwarded-For': '198.51.100.7'}).status_code == 401
+
+
+def test_forwarded_header_is_ignored_without_trusted_proxies(make_app):
+    client = _limited(make_app, auth_ip='1/minute').test_client()
+    assert _login(client, 'nobody', 'x', **{'X-Forwarded-For': '10.0.0.1'}).status_code == 401
+    assert _login(client, 'nobody', 'x', **{'X-Forwarded-For': '10.0.0.2'}).status_code == 429
+
+
+def test_full_budget_refuses_but_health_is_exempt(make_app):
+    client = make_app(RATE_LIMIT_ENABLED=True, CONCURRENCY_BUDGETS={'read': 1}).test_client()
+    headers = sign_up(client)[0]
+    admission._budgets['read'].acquire()
+    try:
+        busy = client.get('/api/assessment/scores', headers=headers)
+        assert busy.status_code == 429 and busy.headers['Retry-After'] == '1'
+        assert client.get('/api/health').status_code == 200
+    finally:
+        admission._budgets['read'].release()
+    assert client.get('/api/assessment/scores', headers=headers).status_code == 200
+
+
+def test_budget_is_released_after_each_request(make_app):
+    client = make_app(RATE_LIMIT_ENABLED=True, CONCURRENCY_BUDGETS={'read': 1}).test_client()
+    headers = sign_up(client)[0]
+    for _ in range(3):
+        assert client.get('/api/assessment/scores', headers=headers).status_code == 200
+    assert admission._budgets['read'].acquire(blocking=False)
+    admission._budgets['read'].release()
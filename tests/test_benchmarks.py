@@ -0,0 +1,27 @@
+import json
+from benchmarks import load
+
+
+def test_every_route_has_a_scenario(app):
+    covered = {scenario[0] for scenario in load.scenarios(None, 1)}
+    assert load.uncovered_routes(app, covered) == []
+
+
+def test_percentile():
+    assert load.percentile([], 50) is None
+    assert load.percentile([1, 2, 3, 4, 5], 50) == 3
+    assert load.percentile([1, 2, 3, 4, 5], 99) == 5
+
+
+def test_small_run_succeeds_and_compares(make_app, monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(load, 'build_app', lambda database_url: make_app())
+    results = tmp_path / 'results.json'
+    args = ['--users', '3', '--scores', '2', '--rounds', '3', '--requests', '4', '--concurrency', '2']
+    assert load.main(args + ['--json', str(results)]) == 0
+
+    endpoints = json.loads(results.read_text())['endpoints']
+    assert len(endpoints) == len(load.scenarios(None, 1))
+    assert {name: row['errors'] for name, row in endpoints.items() if row['errors']} == {}
+
+    assert load.main(args + ['--only', 'get_report', '--compare', str(results)]) == 0
+    assert 'assessment.get_report' in capsys.readouterr().out.split('against')[-1]
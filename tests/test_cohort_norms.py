@@ -0,0 +1,79 @@
+import threading
+import time
+from models import db, CohortNorm
+from analytics import cohort_norms, compute_norms
+from conftest import save_profile, save_score
+
+
+def _cohort(client, register, scores, age=7):
+    """One child per score, each with one magnitude attempt out of 5"""
+    children = []
+    for score in scores:
+        headers = register()[0]
+        save_profile(client, headers, child_age=age)
+        save_score(client, headers, module='magnitude', score=score, total=5)
+        children.append(headers)
+    return children
+
+
+def test_norms_and_percentile_ranks(app, client, register):
+    children = _cohort(client, register, [1, 2, 3, 4, 5])
+    output = app.test_cli_runner().invoke(args=['assessment', 'compute-norms']).output
+    assert 'from 5 scores' in output
+    with app.app_context():
+        cohort_norms.load()
+
+    stats = client.get('/api/assessment/cohort-stats', headers=children[0]).get_json()['cohorts']['magnitude']
+    assert (stats['count'], stats['mean'], stats['p25'], stats['median'], stats['p75']) == (5, 60.0, 40, 60, 80)
+    summary = client.get('/api/assessment/report', headers=children[2]).get_json()['summary']
+    assert summary['modules']['magnitude']['percentile_rank'] == 50.0
+
+
+def test_only_the_latest_attempt_counts(app, client, register):
+    children = _cohort(client, register, [1, 1, 1, 1, 1])
+    save_score(client, children[0], module='magnitude', score=5, total=5)
+    with app.app_context():
+        compute_norms()
+        cohort_norms.load()
+        assert cohort_norms.stats('magnitude', 7)['mean'] == 36.0  # (4 * 20 + 100) / 5
+
+
+def test_small_cohorts_report_nothing(app, client, register):
+    _cohort(client, register, [1, 2])
+    with app.app_context():
+        compute_norms()
+        cohort_norms.load()
+        assert cohort_norms.stats('magnitude', 7) is None
+        assert cohort_norms.percentile_rank('magnitude', 7, 40.0) is None
+
+
+def test_one_worker_wins_each_recompute(app):
+    with app.app_context():
+        assert compute_norms() == 0
+    results = []
+
+    def recompute():
+        with app.app_context():
+            results.append(compute_norms(if_older_than=0.5))
+
+    time.sleep(0.6)
+    threads = [threading.Thread(target=recompute) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(None) == 3
+    with app.app_context():
+        assert compute_norms(if_older_than=3600) is None
+
+
+def test_requests_read_norms_from_memory(app, client, register):
+    children = _cohort(client, register, [1, 2, 3, 4, 5])
+    with app.app_context():
+        compute_norms()
+        cohort_norms.load()
+        db.session.query(CohortNorm).delete()
+        db.session.commit()
+    response = client.get('/api/assessment/cohort-stats', headers=children[0], query_string={'age': 7})
+    assert response.headers['X-Query-Count'] == '0'
+    assert response.get_json()['cohorts']['magnitude']['count'] == 5
@@ -0,0 +1,55 @@
+from flask import g
+from sqlalchemy import event, select, text
+from database import REPLICA_BIND, pool_options, use_primary
+from models import db, User, AssessmentScore
+from config import Config
+from conftest import sign_up, save_score
+
+
+def test_sqlite_connections_get_the_pragmas(app):
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == Config.SQLITE_PRAGMAS['busy_timeout']
+
+
+def test_server_databases_get_pool_settings(app):
+    assert pool_options(app.config, 'sqlite:///x.db') == {}
+    options = pool_options(app.config, 'postgresql://db/numskill')
+    assert options['pool_size'] == Config.DB_POOL_SIZE
+    assert options['pool_pre_ping'] is Config.DB_POOL_PRE_PING
+
+
+def _replica_app(make_app, tmp_path):
+    # The replica is the primary's own file, so it always has the rows; what is checked is which engine ran
+    return make_app(DATABASE_READ_URL=f'sqlite:///{tmp_path}/test.db')
+
+
+def test_read_only_views_read_from_the_replica(make_app, tmp_path):
+    app = _replica_app(make_app, tmp_path)
+    client = app.test_client()
+    headers = sign_up(client)[0]
+    save_score(client, headers)
+
+    replica_reads = []
+    with app.app_context():
+        replica = db.engines[REPLICA_BIND]
+    event.listen(replica, 'before_cursor_execute', lambda *args: replica_reads.append(args[2]))
+
+    assert len(client.get('/api/assessment/scores', headers=headers).get_json()['scores']) == 1
+    assert any('assessment_scores' in statement for statement in replica_reads)
+    replica_reads.clear()
+    save_score(client, headers)
+    assert replica_reads == []
+
+
+def test_writes_and_locking_reads_stay_on_the_primary(make_app, tmp_path):
+    app = _replica_app(make_app, tmp_path)
+    with app.test_request_context():
+        replica = db.engines[REPLICA_BIND]
+        g.db_read_only = True
+        assert db.session.get_bind(clause=select(User)) is replica
+        assert db.session.get_bind(clause=select(User).with_for_update()) is not replica
+        assert db.session.get_bind(clause=AssessmentScore.__table__.insert()) is not replica
+        with use_primary():
+            assert db.session.get_bind(clause=select(User)) is not replica
+        assert g.db_read_only is True
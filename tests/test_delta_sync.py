@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db, AssessmentScore
+from retention import compact_game_scores
+from conftest import save_profile, save_score
+import delta_sync
+
+
+@pytest.fixture
+def settled(monkeypatch):
+    """Treat every row as settled, so watermarks move straight past it"""
+    monkeypatch.setattr(delta_sync, 'SETTLE_SECONDS', -60)
+
+
+def _sync(client, headers, since=None, **params):
+    response = client.get('/api/assessment/sync', headers=headers, query_string={'since': since or '', **params})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_second_sync_sends_only_new_rows(client, headers, settled):
+    save_profile(client, headers)
+    first_score = save_score(client, headers)
+    full = _sync(client, headers)
+    assert [row['id'] for row in full['changes']['assessment_scores']] == [first_score['id']]
+    assert full['changes']['profile']['child_name'] == 'Sam'
+
+    quiet = _sync(client, headers, full['watermark'])
+    assert quiet['changes']['assessment_scores'] == [] and 'profile' not in quiet['changes']
+
+    second_score = save_score(client, headers)
+    client.post('/api/assessment/game-score', headers=headers, json={'game_name': 'aqua_math', 'score': 3})
+    save_profile(client, headers, child_age=8)
+    delta = _sync(client, headers, quiet['watermark'])
+    assert [row['id'] for row in delta['changes']['assessment_scores']] == [second_score['id']]
+    assert [row['score'] for row in delta['changes']['game_scores']] == [3]
+    assert delta['changes']['profile']['child_age'] == 8
+
+
+def test_pages_follow_has_more(client, headers, settled):
+    for _ in range(5):
+        save_score(client, headers)
+    seen, since = [], None
+    while True:
+        page = _sync(client, headers, since, limit=2)
+        seen += [row['id'] for row in page['changes']['assessment_scores']]
+        since = page['watermark']
+        if not page['has_more']:
+            break
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_regraded_rows_come_again(app, client, headers, settled):
+    score = save_score(client, headers)
+    mark = _sync(client, headers)['watermark']
+    with app.app_context():
+        db.session.get(AssessmentScore, score['id']).updated_at = datetime.utcnow() + timedelta(seconds=1)
+        db.session.commit()
+    assert [row['id'] for row in _sync(client, headers, mark)['changes']['assessment_scores']] == [score['id']]
+
+
+def test_compacted_rounds_arrive_as_tombstones_and_rollups(app, client, headers, settled):
+    client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': 'aqua_math', 'score': 4}, {'game_name': 'aqua_math', 'score': 6}
+    ]})
+    first = _sync(client, headers)
+    ids = sorted(row['id'] for row in first['changes']['game_scores'])
+    with app.app_context():
+        compact_game_scores(datetime.utcnow() + timedelta(days=1))
+
+    delta = _sync(client, headers, first['watermark'])
+    assert sorted(row['id'] for row in delta['changes']['deleted']) == ids
+    assert {row['table'] for row in delta['changes']['deleted']} == {'game_scores'}
+    assert [(row['rounds'], row['best']) for row in delta['changes']['game_daily']] == [(2, 6)]
+
+
+def test_young_rows_are_sent_again_until_settled(client, headers):
+    score = save_score(client, headers)
+    first = _sync(client, headers)
+    again = _sync(client, headers, first['watermark'])
+    assert [row['id'] for row in again['changes']['assessment_scores']] == [score['id']]
+    assert again['has_more'] is False
+
+
+def test_malformed_watermark_is_rejected(client, headers):
+    assert client.get('/api/assessment/sync', headers=headers, query_string={'since': 'garbage!'}).status_code == 400
+    bad_slot = delta_sync.encode_watermark({'a': ['2024-01-01T00:00:00']})
+    assert client.get('/api/assessment/sync', headers=headers, query_string={'since': bad_slot}).status_code == 400
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import pytest
+from conftest import save_score, sign_up
+import export
+
+TOKEN = {'X-Export-Token': 'export-secret'}
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(EXPORT_TOKEN='export-secret')
+
+
+def test_export_needs_the_token(client):
+    assert client.get('/api/export/assessment_scores').status_code == 403
+    assert client.get('/api/export/assessment_scores', headers={'X-Export-Token': 'wrong'}).status_code == 403
+
+
+def test_ndjson_streams_every_row_with_decoded_json(client, headers, monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 2)
+    for _ in range(5):
+        client.post('/api/assessment/score', headers=headers, json={'module': 'magnitude', 'answers': {'0': '51'}})
+
+    response = client.get('/api/export/assessment_scores', headers=TOKEN)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 5
+    assert [record['id'] for record in records] == sorted(record['id'] for record in records)
+    assert records[0]['answers'] == {'0': '51'}
+
+
+def test_csv_has_a_header_and_filters(client, headers):
+    save_score(client, headers, module='magnitude')
+    save_score(client, headers, module='facts')
+
+    response = client.get('/api/export/assessment_scores', headers=TOKEN, query_string={'format': 'csv', 'module': 'facts'})
+    assert response.headers['Content-Disposition'] == 'attachment; filename=assessment_scores.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['module_name'] for row in rows] == ['facts']
+    assert 'answers' in rows[0]
+
+
+def test_date_window(client, headers):
+    save_score(client, headers)
+    empty = client.get('/api/export/assessment_scores', headers=TOKEN, query_string={'since': '2999-01-01'})
+    assert empty.get_data() == b''
+
+
+def test_bad_arguments_are_rejected(client):
+    assert client.get('/api/export/users', headers=TOKEN).status_code == 400
+    assert client.get('/api/export/game_scores', headers=TOKEN, query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/api/export/game_scores', headers=TOKEN, query_string={'since': 'yesterday'}).status_code == 400
+    assert client.get('/api/export/game_scores', headers=TOKEN, query_string={'shard': 'nowhere'}).status_code == 400
+
+
+def test_cli_writes_a_file(app, client, tmp_path):
+    headers = sign_up(client)[0]
+    client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': 'aqua_math', 'score': 3}, {'game_name': 'neon_runner', 'score': 4}
+    ]})
+    output = tmp_path / 'games.ndjson'
+    result = app.test_cli_runner().invoke(args=['export', 'run', 'game_scores', '--game-name', 'neon_runner',
+                                                '-o', str(output)])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)['score'] for line in output.read_text().splitlines()] == [4]
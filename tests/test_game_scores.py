@@ -0,0 +1,56 @@
+from models import db, GameScore
+from write_buffer import game_score_buffer
+from conftest import sign_up
+
+
+def test_batch_endpoint_saves_every_row(client, headers):
+    response = client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': 'aqua_math', 'score': 10}, {'game_name': 'neon_runner', 'score': 4}
+    ]})
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['count'] == 2
+    assert all(row['id'] for row in body['game_scores'])
+
+    listed = client.get('/api/assessment/game-scores', headers=headers).get_json()
+    assert sorted(row['score'] for row in listed['game_scores']) == [4, 10]
+
+
+def test_batch_endpoint_rejects_bad_rows_by_index(client, headers):
+    response = client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': 'aqua_math', 'score': 1}, {'game_name': 'aqua_math', 'score': 'high'}
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('game_scores[1]')
+    assert client.get('/api/assessment/game-scores', headers=headers).get_json()['game_scores'] == []
+
+
+def test_batch_endpoint_caps_batch_size(make_app):
+    client = make_app(GAME_SCORE_BULK_MAX=2).test_client()
+    headers = sign_up(client)[0]
+    rows = [{'game_name': 'aqua_math', 'score': i} for i in range(3)]
+    assert client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': rows}).status_code == 413
+
+
+def test_async_durability_queues_until_flushed(make_app):
+    app = make_app(GAME_SCORE_DURABILITY='async', GAME_SCORE_FLUSH_INTERVAL=60)
+    client = app.test_client()
+    headers = sign_up(client)[0]
+
+    response = client.post('/api/assessment/game-score', headers=headers, json={'game_name': 'aqua_math', 'score': 7})
+    assert response.status_code == 202
+    with app.app_context():
+        assert GameScore.query.count() == 0
+        assert game_score_buffer.flush() == 1
+        assert db.session.query(GameScore.score).scalar() == 7
+
+
+def test_flush_hooks_update_summary_and_leaderboard(client, headers):
+    client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': 'aqua_math', 'score': 10}, {'game_name': 'aqua_math', 'score': 30}
+    ]})
+    games = client.get('/api/assessment/report', headers=headers).get_json()['summary']['games']
+    assert games['aqua_math']['rounds'] == 2
+    assert games['aqua_math']['best'] == 30
+    board = client.get('/api/assessment/leaderboard/aqua_math', headers=headers).get_json()
+    assert board['entries'] == [{'rank': 1, 'score': 30, 'you': True}]
@@ -0,0 +1,79 @@
+from sqlalchemy import update
+from models import db, AssessmentScore
+from assessment import QUESTION_BANKS
+from grading import GradingEngine, item_id
+from conftest import sign_up
+
+BANK = QUESTION_BANKS['magnitude']
+
+
+def _submit(client, headers, module, answers, **extra):
+    return client.post('/api/assessment/score', headers=headers, json={'module': module, 'answers': answers, **extra})
+
+
+def _engine():
+    engine = GradingEngine()
+    engine.load(QUESTION_BANKS)
+    return engine
+
+
+def test_server_grade_overrides_the_client_score(client, headers):
+    answers = [{'q': q['q'], 'options': q['options'], 'userAnswer': q['a']} for q in BANK[:3]]
+    response = _submit(client, headers, 'magnitude', answers, score=0, total=1)
+    assert response.status_code == 201
+    score = response.get_json()['score']
+    assert (score['score'], score['total_questions']) == (3, len(BANK))
+
+
+def test_answers_match_by_id_text_or_position():
+    engine = _engine()
+    by_id = engine.grade('magnitude', {item_id('magnitude', 1): BANK[1]['a']})
+    by_text = engine.grade('magnitude', {f"  {BANK[1]['q'].upper()} ": BANK[1]['a']})
+    by_position = engine.grade('magnitude', {'1': BANK[1]['a']})
+    assert by_id.score == by_text.score == by_position.score == 1
+    assert by_id.correct_mask == by_text.correct_mask == by_position.correct_mask == 0b10
+
+
+def test_relabelled_options_are_mapped_by_index():
+    engine = _engine()
+    question = BANK[0]
+    labels = [f'Option {option}' for option in question['options']]
+    chosen = labels[question['options'].index(question['a'])]
+    result = engine.grade('magnitude', [{'q': question['q'], 'options': labels, 'userAnswer': chosen}])
+    assert result.score == 1
+
+
+def test_consolidated_is_out_of_the_items_presented():
+    engine = _engine()
+    answers = {item_id('magnitude', 0): BANK[0]['a'], item_id('facts', 0): 'wrong'}
+    result = engine.grade('consolidated', answers)
+    assert (result.score, result.total) == (1, 2)
+
+
+def test_unmatched_answers_keep_the_client_score(client, headers):
+    response = _submit(client, headers, 'magnitude', {'What is your name?': 'Sam'}, score=2, total=4)
+    score = response.get_json()['score']
+    assert (score['score'], score['total_questions'], score['percentage']) == (2, 4, 50.0)
+
+
+def test_require_server_grading_rejects_unmatched_answers(make_app):
+    client = make_app(GRADING_REQUIRE_SERVER=True).test_client()
+    headers = sign_up(client)[0]
+    response = _submit(client, headers, 'magnitude', {'What is your name?': 'Sam'}, score=2, total=4)
+    assert response.status_code == 400
+
+
+def test_regrade_restores_scores_from_stored_answers(app, client, headers):
+    answers = {str(i): q['a'] for i, q in enumerate(BANK)}
+    score_id = _submit(client, headers, 'magnitude', answers).get_json()['score']['id']
+    with app.app_context():
+        db.session.execute(update(AssessmentScore).values(score=0, percentage=0))
+        db.session.commit()
+
+    output = app.test_cli_runner().invoke(args=['assessment', 'regrade', '--module', 'magnitude']).output
+    assert 'updated 1' in output
+    with app.app_context():
+        row = db.session.get(AssessmentScore, score_id)
+        assert (row.score, row.percentage) == (len(BANK), 100.0)
+    summary = client.get('/api/assessment/report', headers=headers).get_json()['summary']
+    assert summary['modules']['magnitude']['best']['score'] == len(BANK)
@@ -0,0 +1,61 @@
+from conftest import save_score
+
+
+def _pages(client, headers, url, **params):
+    """Follow `before` cursors from the newest page to the oldest; returns every response body"""
+    pages = []
+    while True:
+        body = client.get(url, headers=headers, query_string=params).get_json()
+        pages.append(body)
+        if not body['page']['has_more']:
+            return pages
+        params['before'] = body['page']['before']
+
+
+def test_scores_page_newest_first_without_gaps(client, headers):
+    for score in range(5):
+        save_score(client, headers, score=score)
+
+    pages = _pages(client, headers, '/api/assessment/scores', limit=2)
+    assert [len(page['scores']) for page in pages] == [2, 2, 1]
+    assert [row['score'] for page in pages for row in page['scores']] == [4, 3, 2, 1, 0]
+
+
+def test_after_cursor_walks_back_towards_newer_rows(client, headers):
+    for score in range(4):
+        save_score(client, headers, score=score)
+
+    oldest = client.get('/api/assessment/scores', headers=headers, query_string={'limit': 4}).get_json()
+    after = oldest['page']['before']  # position of the oldest row
+    newer = client.get('/api/assessment/scores', headers=headers, query_string={'limit': 2, 'after': after}).get_json()
+    assert [row['score'] for row in newer['scores']] == [2, 1]
+    assert newer['page']['has_more'] is True
+
+
+def test_scores_filter_by_module(client, headers):
+    save_score(client, headers, module='math')
+    save_score(client, headers, module='reading')
+
+    body = client.get('/api/assessment/scores', headers=headers, query_string={'module': 'reading'}).get_json()
+    assert [row['module_name'] for row in body['scores']] == ['reading']
+
+
+def test_game_scores_page_through_rounds(client, headers):
+    client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': 'aqua_math', 'score': score} for score in range(5)
+    ]})
+
+    pages = _pages(client, headers, '/api/assessment/game-scores', limit=3)
+    assert sorted(row['score'] for page in pages for row in page['game_scores']) == [0, 1, 2, 3, 4]
+    assert pages[-1]['daily'] == []
+
+
+def test_bad_paging_arguments_are_rejected(client, headers):
+    for params in ({'before': 'not-a-cursor'}, {'limit': 'ten'}, {'limit': 0}, {'before': 'a', 'after': 'b'}):
+        response = client.get('/api/assessment/scores', headers=headers, query_string=params)
+        assert response.status_code == 400, params
+
+
+def test_limit_is_capped(client, headers):
+    body = client.get('/api/assessment/scores', headers=headers, query_string={'limit': 100000}).get_json()
+    assert body['page']['limit'] == 500
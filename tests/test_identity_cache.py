@@ -0,0 +1,57 @@
+from models import db, User
+from identity_cache import UserCache, user_cache
+
+
+def _queries(response):
+    return int(response.headers['X-Query-Count'])
+
+
+def test_verify_reads_the_user_once(client, headers):
+    first = client.get('/api/auth/verify', headers=headers)
+    second = client.get('/api/auth/verify', headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert _queries(first) > 0
+    assert _queries(second) == 0
+    assert second.get_json() == first.get_json()
+
+
+def test_orm_update_invalidates_the_entry(app, client, register):
+    headers, user_id, _ = register()
+    client.get('/api/auth/profile', headers=headers)
+    with app.app_context():
+        db.session.get(User, user_id).email = 'new@example.com'
+        db.session.commit()
+    assert client.get('/api/auth/profile', headers=headers).get_json()['email'] == 'new@example.com'
+
+
+def test_deleted_user_is_not_served_from_cache(app, client, register):
+    headers, user_id, _ = register()
+    client.get('/api/auth/verify', headers=headers)
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+    assert client.get('/api/auth/verify', headers=headers).status_code == 404
+
+
+def test_entries_expire_and_are_evicted(app, register, monkeypatch):
+    ids = [register()[1] for _ in range(3)]
+    cache = UserCache(maxsize=2, ttl=60)
+    with app.app_context():
+        for user_id in ids:
+            cache.get(user_id)
+        assert list(cache._entries) == ids[1:]
+
+        clock = [1000.0]
+        monkeypatch.setattr('identity_cache.time.monotonic', lambda: clock[0])
+        cache.clear()
+        cache.get(ids[0])
+        clock[0] += 61
+        monkeypatch.setattr(db.session, 'get', lambda *args: None)
+        assert cache.get(ids[0]) is None  # expired, so it went back to the database
+
+
+def test_init_app_starts_empty(app, client, headers):
+    client.get('/api/auth/verify', headers=headers)
+    assert user_cache._entries
+    user_cache.init_app(app)
+    assert not user_cache._entries
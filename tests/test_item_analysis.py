@@ -0,0 +1,106 @@
+import json
+from datetime import datetime, timedelta
+from models import db, AssessmentScore, ChecklistResponse
+from assessment import QUESTION_BANKS, CHECKLIST_QUESTIONS
+from delta_sync import SETTLE_SECONDS
+import item_analysis
+
+BANK = QUESTION_BANKS['magnitude']
+
+
+def _answer(client, headers, correct):
+    """Answer every magnitude item, the first `correct` of them right"""
+    answers = {str(i): q['a'] if i < correct else next(o for o in q['options'] if o != q['a'])
+               for i, q in enumerate(BANK)}
+    response = client.post('/api/assessment/score', headers=headers, json={'module': 'magnitude', 'answers': answers})
+    assert response.status_code == 201
+
+
+def _settle(app):
+    """Age every stored score past the settle window"""
+    with app.app_context():
+        for row in AssessmentScore.query:
+            row.created_at -= timedelta(seconds=SETTLE_SECONDS + 1)
+        db.session.commit()
+
+
+def _p_values(app):
+    with app.app_context():
+        return {item['item_index']: (item['presented'], item['p_value'])
+                for item in item_analysis.item_report(module='magnitude')}
+
+
+def test_pack_checklist_by_position_or_text():
+    answered, yes = item_analysis.pack_checklist({'0': True, CHECKLIST_QUESTIONS[2]: False, '99': True,
+                                                  'unknown': True, '3': None}, CHECKLIST_QUESTIONS)
+    assert (answered, yes) == (0b101, 0b001)
+
+
+def test_saved_checklists_are_packed(app, client, headers):
+    client.post('/api/assessment/checklist', headers=headers, json={'responses': {'1': True, '2': False}})
+    with app.app_context():
+        row = ChecklistResponse.query.one()
+        assert (row.answered_mask, row.yes_mask) == (0b110, 0b010)
+
+
+def test_item_statistics_from_settled_scores(app, client, register):
+    for correct in (5, 2, 0):
+        _answer(client, register()[0], correct)
+    _settle(app)
+
+    with app.app_context():
+        assert item_analysis.update_item_statistics() == 3
+    stats = _p_values(app)
+    assert stats[0] == (3, 0.667)
+    assert stats[4] == (3, 0.333)
+
+    with app.app_context():
+        assert item_analysis.update_item_statistics() == 0
+    assert _p_values(app) == stats
+
+
+def test_late_commits_inside_the_settle_window_are_counted(app, client, register, monkeypatch):
+    now = datetime.utcnow()
+    clock = [now + timedelta(seconds=1)]
+
+    class Clock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock[0]
+
+    monkeypatch.setattr(item_analysis, 'datetime', Clock)
+    _answer(client, register()[0], 5)
+    with app.app_context():
+        assert item_analysis.update_item_statistics() == 0  # younger than the settle window
+
+    # A transaction that started before the first run commits after it
+    _answer(client, register()[0], 5)
+    with app.app_context():
+        late = AssessmentScore.query.order_by(AssessmentScore.id.desc()).first()
+        late.created_at = now - timedelta(seconds=1)
+        db.session.commit()
+
+        clock[0] = now + timedelta(seconds=SETTLE_SECONDS + 1)
+        assert item_analysis.update_item_statistics() == 2
+
+
+def test_discrimination_and_cli(app, client, register):
+    for correct in (5, 4, 3, 1, 0):
+        _answer(client, register()[0], correct)
+    _settle(app)
+
+    result = app.test_cli_runner().invoke(args=['assessment', 'item-analysis', '--module', 'magnitude', '--json'])
+    report = json.loads(result.output)
+    assert [item['presented'] for item in report] == [5] * len(BANK)
+    assert all(item['discrimination'] > 0 for item in report)
+    assert report[0]['question'] == BANK[0]['q']
+
+
+def test_reset_starts_over(app, client, headers):
+    _answer(client, headers, 3)
+    _settle(app)
+    with app.app_context():
+        item_analysis.update_item_statistics()
+        item_analysis.reset_item_statistics()
+        assert item_analysis.item_report() == []
+        assert item_analysis.update_item_statistics() == 1
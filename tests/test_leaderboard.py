@@ -0,0 +1,82 @@
+import random
+from leaderboard import OrderStatisticTree, leaderboards, parse_age_bands
+from conftest import save_profile
+
+
+def _play(client, headers, *scores, game_name='aqua_math'):
+    response = client.post('/api/assessment/game-scores', headers=headers, json={'game_scores': [
+        {'game_name': game_name, 'score': score} for score in scores
+    ]})
+    assert response.status_code == 201, response.get_json()
+
+
+def test_order_statistic_tree_matches_a_sorted_list():
+    tree = OrderStatisticTree()
+    keys = random.Random(7).sample(range(1000), 200)
+    for key in keys:
+        tree.insert(key)
+    for key in keys[:50]:
+        tree.remove(key)
+    remaining = sorted(keys[50:])
+    assert len(tree) == len(remaining)
+    assert tree.first(10) == remaining[:10]
+    for probe in (0, 250, 500, 999, 1000):
+        assert tree.count_less(probe) == sum(1 for key in remaining if key < probe)
+
+
+def test_parse_age_bands():
+    assert parse_age_bands('4-5, 6-7') == [(4, 5), (6, 7)]
+    assert parse_age_bands('') == []
+
+
+def test_top_uses_best_scores_and_competition_ranking(client, register):
+    players = [register()[0] for _ in range(3)]
+    _play(client, players[0], 10, 50)
+    _play(client, players[1], 50)
+    _play(client, players[2], 20)
+
+    entries = client.get('/api/assessment/leaderboard/aqua_math', headers=players[2]).get_json()['entries']
+    assert entries == [{'rank': 1, 'score': 50, 'you': False}, {'rank': 1, 'score': 50, 'you': False},
+                       {'rank': 3, 'score': 20, 'you': True}]
+
+
+def test_rank_within_age_band(client, register):
+    young, older, peer = (register()[0] for _ in range(3))
+    save_profile(client, young, child_age=5)
+    save_profile(client, older, child_age=9)
+    save_profile(client, peer, child_age=4)
+    _play(client, young, 30)
+    _play(client, older, 90)
+    _play(client, peer, 40)
+
+    body = client.get('/api/assessment/leaderboard/aqua_math/rank', headers=young).get_json()
+    assert body['overall'] == {'rank': 3, 'score': 30, 'players': 3}
+    assert body['age_band'] == '4-5'
+    assert body['in_age_band'] == {'rank': 2, 'score': 30, 'players': 2}
+
+    mine = client.get('/api/assessment/leaderboard/aqua_math', headers=young, query_string={'age_band': 'mine'})
+    assert [entry['score'] for entry in mine.get_json()['entries']] == [40, 30]
+
+
+def test_profile_change_moves_a_child_between_bands(client, headers):
+    save_profile(client, headers, child_age=5)
+    _play(client, headers, 30)
+    save_profile(client, headers, child_age=8)
+    assert client.get('/api/assessment/leaderboard/aqua_math/rank', headers=headers).get_json()['age_band'] == '8-9'
+    band = client.get('/api/assessment/leaderboard/aqua_math', headers=headers, query_string={'age_band': '4-5'})
+    assert band.get_json()['entries'] == []
+
+
+def test_reload_rebuilds_from_the_database(app, client, headers):
+    _play(client, headers, 12)
+    with app.app_context():
+        leaderboards._reset()
+        leaderboards.load()
+    assert leaderboards.top('aqua_math')[0][2] == 12
+
+
+def test_unknown_games_are_rejected(client, headers):
+    response = client.post('/api/assessment/game-score', headers=headers, json={'game_name': 'made_up', 'score': 1})
+    assert response.status_code == 400
+    assert client.get('/api/assessment/leaderboard/made_up', headers=headers).status_code == 404
+    assert client.get('/api/assessment/leaderboard/made_up/rank', headers=headers).status_code == 404
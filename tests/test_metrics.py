@@ -0,0 +1,70 @@
+import pytest
+from metrics import Counter, Histogram
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(METRICS_TOKEN='scrape-secret')
+
+
+def _scrape(client):
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def _sample(text, prefix):
+    """Value of the first sample line starting with `prefix`"""
+    return float(next(line for line in text.splitlines() if line.startswith(prefix)).rsplit(' ', 1)[1])
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('t_seconds', 'Test', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, '/x')
+    lines = histogram.render()
+    assert lines[:2] == ['# HELP t_seconds Test', '# TYPE t_seconds histogram']
+    assert lines[2:] == [
+        't_seconds_bucket{route="/x",le="0.1"} 1',
+        't_seconds_bucket{route="/x",le="1.0"} 3',
+        't_seconds_bucket{route="/x",le="+Inf"} 4',
+        't_seconds_sum{route="/x"} 4.05',
+        't_seconds_count{route="/x"} 4'
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter('t_total', 'Test', ('path',))
+    counter.inc('a"b\\c\nd')
+    assert counter.render()[-1] == 't_total{path="a\\"b\\\\c\\nd"} 1'
+
+
+def test_scrapes_need_the_token(client):
+    assert client.get('/api/metrics').status_code == 403
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+
+def test_scrapes_are_disabled_without_a_token(make_app):
+    client = make_app(METRICS_TOKEN=None).test_client()
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer '}).status_code == 403
+
+
+def test_requests_are_recorded_by_route_template(client, headers):
+    route = 'numskill_requests_total{method="GET",route="/api/assessment/leaderboard/<game_name>",status="200"}'
+    before = _scrape(client)
+    start = _sample(before, route) if route in before else 0
+    for game in ('aqua_math', 'neon_runner'):
+        client.get(f'/api/assessment/leaderboard/{game}', headers=headers)
+
+    text = _scrape(client)
+    assert _sample(text, route) == start + 2
+    assert '/leaderboard/aqua_math' not in text
+    assert 'numskill_request_duration_seconds_count{method="GET",route="/api/assessment/leaderboard/<game_name>"}' in text
+
+
+def test_database_and_bcrypt_time_are_recorded(client, register):
+    register()
+    text = _scrape(client)
+    assert _sample(text, 'numskill_request_db_queries_count{method="POST",route="/api/auth/register"}') >= 1
+    assert _sample(text, 'numskill_db_query_duration_seconds_count') > 0
+    assert _sample(text, 'numskill_bcrypt_duration_seconds_count{operation="hash"}') >= 1
@@ -0,0 +1,70 @@
+import json
+import pytest
+from models import db, User, CandidateProfile, UserSummary
+from leaderboard import leaderboards
+
+TOKEN = {'X-Admin-Token': 'onboard-secret'}
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(ONBOARDING_TOKEN='onboard-secret')
+
+
+def _row(name, **overrides):
+    return {'username': name, 'email': f'{name}@school.example', 'password': 'secret123',
+            'child_name': name.title(), 'child_age': 7, 'parent_name': 'Parent', **overrides}
+
+
+def test_import_creates_accounts_profiles_and_summaries(app, client):
+    response = client.post('/api/onboarding/users', headers=TOKEN, json={'users': [_row('ana'), _row('ben', child_age='8')]})
+    assert response.get_json() == {'created': 2, 'failed': 0, 'errors': []}
+
+    login = client.post('/api/auth/login', json={'username': 'ben', 'password': 'secret123'})
+    assert login.status_code == 200
+    user_id = login.get_json()['user']['id']
+    with app.app_context():
+        assert CandidateProfile.query.filter_by(user_id=user_id).one().child_age == 8
+        assert db.session.get(UserSummary, user_id).get_profile()['child_name'] == 'Ben'
+    assert leaderboards.band_of(user_id) == '8-9'
+
+
+def test_bad_rows_are_reported_by_row_number(app, client, register):
+    _, _, existing = register(username='taken')
+    response = client.post('/api/onboarding/users', headers=TOKEN, json=[
+        _row('ok'),
+        _row('noage', child_age='seven'),
+        _row('taken'),
+        _row('ok', email='other@school.example'),
+        {'username': 'partial'}
+    ])
+    body = response.get_json()
+    assert body['created'] == 1
+    assert [(error['row'], error['error']) for error in body['errors']] == [
+        (2, 'child_age must be an integer'),
+        (3, 'Username already exists'),
+        (4, 'Duplicate username in upload'),
+        (5, 'Missing required fields: email, password, child_name, child_age, parent_name')
+    ]
+
+
+def test_csv_upload(app, client):
+    text = 'username,email,password,child_name,child_age,parent_name\ncal,cal@school.example,secret123,Cal,6,Dee\n'
+    response = client.post('/api/onboarding/users', headers={**TOKEN, 'Content-Type': 'text/csv'}, data=text)
+    assert response.get_json()['created'] == 1
+
+
+def test_endpoint_limits(make_app):
+    client = make_app(ONBOARDING_TOKEN='onboard-secret', ONBOARDING_MAX_ROWS=1).test_client()
+    assert client.post('/api/onboarding/users', json={'users': [_row('a')]}).status_code == 403
+    assert client.post('/api/onboarding/users', headers=TOKEN, json={'users': []}).status_code == 400
+    assert client.post('/api/onboarding/users', headers=TOKEN, json={'users': [_row('a'), _row('b')]}).status_code == 413
+
+
+def test_cli_import_from_file(app, tmp_path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({'users': [_row('dan'), _row('eve', email='')]}))
+    result = app.test_cli_runner().invoke(args=['onboarding', 'import-users', str(path)])
+    assert 'Created 1 accounts, 1 rows failed' in result.output
+    with app.app_context():
+        assert User.query.filter_by(username='dan').count() == 1
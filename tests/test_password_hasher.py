@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import os
+import pytest
+from models import db, User
+from password_hasher import PasswordHasher, HasherBusy, hash_cost, password_hasher, _check, _hash
+import password_hasher as password_hasher_module
+
+
+def _pooled(workers=1, max_pending=0, timeout=5.0):
+    """A pooled hasher on a thread pool, so tests can hold jobs open"""
+    hasher = PasswordHasher()
+    hasher.use_pool = True
+    hasher.rounds = 4
+    hasher.workers = workers
+    hasher.max_pending = max_pending
+    hasher.timeout = timeout
+    hasher._slots = threading.BoundedSemaphore(workers + max_pending)
+    hasher._pool = ThreadPoolExecutor(max_workers=workers)
+    hasher._pid = os.getpid()
+    return hasher
+
+
+def test_pool_hashes_and_verifies():
+    hasher = _pooled()
+    password_hash = hasher.hash('secret123')
+    assert hash_cost(password_hash) == 4
+    assert hasher.verify('secret123', password_hash)
+    assert not hasher.verify('wrong', password_hash)
+
+
+def test_full_queue_raises_busy_immediately():
+    hasher = _pooled()
+    release = threading.Event()
+    hasher._slots.acquire()
+    hasher._submit(release.wait)
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret123')
+    release.set()
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    hasher = _pooled(timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(HasherBusy):
+        hasher._run(release.wait)
+    # The abandoned job still occupies the only worker
+    assert not hasher._slots.acquire(blocking=False)
+    release.set()
+    hasher._pool.shutdown(wait=True)
+    assert hasher._slots.acquire(blocking=False)
+
+
+def test_hash_many_leaves_room_for_logins(monkeypatch):
+    hasher = _pooled(workers=4, max_pending=4)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def counting_hash(password, rounds):
+        with lock:
+            running.append(password)
+            peak.append(len(running))
+        try:
+            time.sleep(0.05)  # long enough for the rest of the step to start
+            return _hash(password, rounds)
+        finally:
+            with lock:
+                running.remove(password)
+
+    monkeypatch.setattr(password_hasher_module, '_hash', counting_hash)
+    hashes = hasher.hash_many([f'pw{i}' for i in range(6)])
+    assert max(peak) == 2  # half the pool by default
+    assert all(_check(f'pw{i}', password_hash) for i, password_hash in enumerate(hashes))
+    peak.clear()
+    hasher.hash_many(['a', 'b', 'c', 'd'], workers=4)
+    assert max(peak) == 4
+
+
+def test_busy_hasher_answers_503(client, monkeypatch):
+    def busy(*args):
+        raise HasherBusy(retry_after=3)
+    monkeypatch.setattr(password_hasher, '_run', busy)
+    response = client.post('/api/auth/register', json={'username': 'sam', 'email': 'sam@example.com', 'password': 'secret123'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+
+
+def test_login_upgrades_hash_to_configured_cost(app, client, register, monkeypatch):
+    _, user_id, body = register(password='secret123')
+    monkeypatch.setattr(password_hasher, 'rounds', 5)
+    response = client.post('/api/auth/login', json={'username': body['user']['username'], 'password': 'secret123'})
+    assert response.status_code == 200
+    with app.app_context():
+        assert hash_cost(db.session.get(User, user_id).password_hash) == 5
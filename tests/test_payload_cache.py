@@ -0,0 +1,36 @@
+import gzip
+import json
+from assessment import QUESTION_BANKS
+
+
+def test_question_bank_is_served_with_an_etag(client, headers):
+    response = client.get('/api/assessment/questions/magnitude', headers=headers)
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.get_json() == json.loads(json.dumps({'questions': QUESTION_BANKS['magnitude']}))
+
+
+def test_matching_etag_answers_304(client, headers):
+    etag = client.get('/api/assessment/checklist/questions', headers=headers).headers['ETag']
+    response = client.get('/api/assessment/checklist/questions', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_gzip_body_is_precompressed(client, headers):
+    plain = client.get('/api/assessment/questions', headers=headers)
+    compressed = client.get('/api/assessment/questions', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert gzip.decompress(compressed.data) == plain.data
+
+    # Either representation's tag revalidates
+    response = client.get('/api/assessment/questions', headers={**headers, 'If-None-Match': plain.headers['ETag'],
+                                                               'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304
+
+
+def test_unknown_module_is_rejected(client, headers):
+    assert client.get('/api/assessment/questions/astronomy', headers=headers).status_code == 400
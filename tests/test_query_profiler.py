@@ -0,0 +1,69 @@
+import logging
+import pytest
+from flask import jsonify
+from models import db, User
+from query_profiler import QueryBudgetExceeded, query_profiler, statement_shape
+from conftest import save_profile, save_score, sign_up
+
+
+def _queries(response):
+    return int(response.headers['X-Query-Count'])
+
+
+def test_statement_shapes_ignore_parameters_and_in_lists():
+    assert statement_shape('SELECT *\n  FROM t WHERE id IN (?, ?, ?)') == statement_shape('SELECT * FROM t WHERE id IN (?)')
+    assert statement_shape('SELECT * FROM t WHERE a = %(a)s AND b IN (%s, %s)') == 'SELECT * FROM t WHERE a = %(a)s AND b IN (?)'
+
+
+def test_assert_max_queries(app):
+    with app.app_context():
+        with query_profiler.assert_max_queries(1) as collector:
+            User.query.count()
+        assert len(collector.queries) == 1
+        with pytest.raises(QueryBudgetExceeded, match='block ran 2 queries'):
+            with query_profiler.assert_max_queries(1):
+                User.query.count()
+                User.query.count()
+
+
+def _looping_app(make_app, **overrides):
+    app = make_app(**overrides)
+
+    @app.route('/loop')
+    def loop():
+        return jsonify([db.session.get(User, user_id) is None for user_id in range(6)])
+    return app
+
+
+def test_repeated_statements_are_reported(make_app, caplog):
+    client = _looping_app(make_app, QUERY_BUDGETS={'loop': None}).test_client()
+    with caplog.at_level(logging.WARNING, logger='query_profiler'):
+        response = client.get('/loop')
+    assert _queries(response) == 6
+    assert float(response.headers['X-Query-Time-Ms']) >= 0
+    assert 'Possible N+1 in loop: 6 x' in caplog.text
+
+
+def test_over_budget_requests_fail_when_enforced(make_app):
+    client = _looping_app(make_app, QUERY_BUDGETS={'loop': 3}).test_client()
+    with pytest.raises(QueryBudgetExceeded, match='loop ran 6 queries'):
+        client.get('/loop')
+
+
+def test_over_budget_requests_only_warn_otherwise(make_app, caplog):
+    client = _looping_app(make_app, QUERY_BUDGETS={'loop': 3}, QUERY_BUDGET_ENFORCE=False).test_client()
+    with caplog.at_level(logging.WARNING, logger='query_profiler'):
+        assert client.get('/loop').status_code == 200
+    assert 'loop ran 6 queries (budget 3)' in caplog.text
+
+
+def test_a_new_account_stays_within_report_budgets(client):
+    # The summary row is created with the account, so the first report reads it instead of building it
+    headers, _, _ = sign_up(client)
+    first_report = client.get('/api/assessment/report', headers=headers)
+    assert first_report.status_code == 200
+    assert _queries(first_report) <= 5
+
+    save_profile(client, headers)
+    save_score(client, headers)
+    assert _queries(client.get('/api/assessment/report', headers=headers)) <= 5
@@ -0,0 +1,105 @@
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import insert, text
+from models import db, AssessmentScore, GameScore, UserSummary
+from conftest import save_profile, save_score, sign_up
+import report_summary
+
+
+def _report_summary(client, headers):
+    return client.get('/api/assessment/report', headers=headers).get_json()['summary']
+
+
+def test_report_reads_summary_kept_up_to_date_by_writes(client, headers):
+    save_profile(client, headers)
+    save_score(client, headers, module='math', score=2, total=5)
+    save_score(client, headers, module='math', score=4, total=5)
+    client.post('/api/assessment/game-score', headers=headers, json={'game_name': 'aqua_math', 'score': 9})
+
+    summary = _report_summary(client, headers)
+    assert summary['modules']['math']['attempts'] == 2
+    assert summary['modules']['math']['best']['score'] == 4
+    assert summary['modules']['math']['latest']['score'] == 4
+    assert summary['games']['aqua_math']['rounds'] == 1
+
+
+def test_incremental_summary_matches_a_rebuild(app, register):
+    _, user_id, _ = register()
+    started = datetime.utcnow() - timedelta(minutes=5)
+    with app.app_context():
+        for i, (score, module) in enumerate([(3, 'math'), (5, 'math'), (5, 'reading'), (1, 'math')]):
+            row = AssessmentScore(user_id=user_id, module_name=module, score=score, total_questions=5,
+                                  percentage=score * 20.0, created_at=started + timedelta(seconds=i))
+            db.session.add(row)
+            db.session.flush()
+            report_summary.apply_score(user_id, row)
+        db.session.commit()
+        incremental = db.session.get(UserSummary, user_id).to_dict()
+        db.session.expire_all()
+        rebuilt = report_summary.rebuild(user_id).to_dict()
+    incremental.pop('updated_at'), rebuilt.pop('updated_at')
+    assert incremental == rebuilt
+
+
+def test_best_attempt_ties_go_to_the_earliest(app, register):
+    _, user_id, _ = register()
+    later = datetime.utcnow()
+    earlier = later - timedelta(minutes=1)
+    with app.app_context():
+        # Folded newest first, as a late commit would be
+        for created_at in (later, earlier):
+            row = AssessmentScore(user_id=user_id, module_name='math', score=4, total_questions=5,
+                                  percentage=80.0, created_at=created_at)
+            db.session.add(row)
+            db.session.flush()
+            report_summary.apply_score(user_id, row)
+        db.session.commit()
+        best = db.session.get(UserSummary, user_id).get_modules()['math']['best']
+    assert best['created_at'] == earlier.isoformat()
+
+
+def test_concurrent_folds_do_not_lose_updates(app, register):
+    _, user_id, _ = register()
+    errors = []
+
+    def play(n):
+        with app.app_context():
+            try:
+                for i in range(10):
+                    row = {'user_id': user_id, 'game_name': 'aqua_math', 'score': n * 10 + i,
+                           'created_at': datetime.utcnow()}
+                    db.session.execute(insert(GameScore), [row])
+                    report_summary.apply_game_scores([SimpleNamespace(row=row)])
+                    db.session.commit()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=play, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with app.app_context():
+        games = db.session.get(UserSummary, user_id).get_games()
+    assert games['aqua_math']['rounds'] == 40
+    assert games['aqua_math']['total'] == sum(n * 10 + i for n in range(4) for i in range(10))
+    assert games['aqua_math']['best'] == 39
+
+
+def test_legacy_json_summary_is_rebuilt_on_first_read(make_app):
+    # The rebuild is a one-off backfill, outside the per-request query budget
+    app = make_app(QUERY_BUDGET_ENFORCE=False)
+    client = app.test_client()
+    headers, user_id, _ = sign_up(client)
+    save_score(client, headers, module='math', score=3, total=5)
+    with app.app_context():
+        db.session.execute(text("UPDATE user_summaries SET modules_json = '{}', games_json = '{}'"))
+        db.session.execute(text('DELETE FROM summary_modules'))
+        db.session.commit()
+
+    assert _report_summary(client, headers)['modules']['math']['attempts'] == 1
+    with app.app_context():
+        assert not db.session.get(UserSummary, user_id).is_legacy
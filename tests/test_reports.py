@@ -0,0 +1,126 @@
+import os
+import time
+import pytest
+from datetime import datetime, timedelta
+from models import db, ReportJob
+from reports import report_jobs
+import reports
+from conftest import save_profile, save_score
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(REPORT_CACHE_DIR=str(tmp_path / 'reports'))
+
+
+def _submit(client, headers, fmt='html'):
+    return client.post('/api/reports', headers=headers, json={'format': fmt})
+
+
+def _wait(client, headers, job_id, timeout=10):
+    """Poll a job until the worker threads have finished it"""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f'/api/reports/{job_id}', headers=headers).get_json()['job']
+        if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_report_is_rendered_in_the_background(client, headers):
+    save_profile(client, headers)
+    save_score(client, headers, module='magnitude', score=4, total=5)
+
+    response = _submit(client, headers)
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+    assert response.headers['Location'].endswith(f'/api/reports/{job_id}')
+    assert _wait(client, headers, job_id)['status'] == 'done'
+
+    page = client.get(f'/api/reports/{job_id}/file', headers=headers)
+    assert page.status_code == 200
+    assert page.mimetype == 'text/html'
+    assert 'Assessment report: Sam' in page.get_data(as_text=True)
+    assert 'Magnitude' in page.get_data(as_text=True)
+    assert client.get(f'/api/reports/{job_id}/file', headers={**headers, 'If-None-Match': page.headers['ETag']}).status_code == 304
+
+
+def test_unchanged_data_reuses_the_rendered_file(app, client, headers):
+    save_score(client, headers, module='magnitude')
+    first = _submit(client, headers).get_json()['job']['id']
+    assert _wait(client, headers, first)['status'] == 'done'
+
+    again = _submit(client, headers)
+    assert again.status_code == 200
+    assert again.get_json()['job']['id'] == first
+
+    save_score(client, headers, module='magnitude', score=5)
+    changed = _submit(client, headers)
+    assert changed.status_code == 202
+    assert changed.get_json()['job']['id'] != first
+    assert _wait(client, headers, changed.get_json()['job']['id'])['status'] == 'done'
+    assert len(os.listdir(report_jobs.cache.directory)) == 2
+
+
+def test_unknown_format_and_other_users_jobs(client, register):
+    headers, _, _ = register()
+    other, _, _ = register()
+    assert _submit(client, headers, fmt='docx').status_code == 400
+    job_id = _submit(client, headers).get_json()['job']['id']
+    assert client.get(f'/api/reports/{job_id}', headers=other).status_code == 404
+    assert client.get(f'/api/reports/{job_id}/file', headers=other).status_code == 404
+
+
+def test_a_missing_file_is_rendered_again(client, headers):
+    job_id = _submit(client, headers).get_json()['job']['id']
+    _wait(client, headers, job_id)
+    for name in os.listdir(report_jobs.cache.directory):
+        os.remove(os.path.join(report_jobs.cache.directory, name))
+
+    assert client.get(f'/api/reports/{job_id}/file', headers=headers).status_code == 202
+    assert _wait(client, headers, job_id)['status'] == 'done'
+    assert client.get(f'/api/reports/{job_id}/file', headers=headers).status_code == 200
+
+
+def test_a_failed_render_is_reported(client, headers, monkeypatch):
+    def broken(data, fmt):
+        raise RuntimeError('no fonts')
+    monkeypatch.setattr(reports, 'render', broken)
+
+    job_id = _submit(client, headers).get_json()['job']['id']
+    assert _wait(client, headers, job_id)['status'] == 'failed'
+    response = client.get(f'/api/reports/{job_id}/file', headers=headers)
+    assert response.status_code == 409
+    assert 'no fonts' in response.get_json()['error']
+
+
+def test_stalled_jobs_are_claimed_again(app, register):
+    _, user_id, _ = register()
+    long_ago = datetime.utcnow() - timedelta(seconds=report_jobs.timeout + 60)
+    with app.app_context():
+        db.session.add_all([
+            ReportJob(id='stalled', user_id=user_id, format='html', data_hash='x', status='running', started_at=long_ago),
+            ReportJob(id='busy', user_id=user_id, format='html', data_hash='x', status='running',
+                      started_at=datetime.utcnow())
+        ])
+        db.session.commit()
+        assert report_jobs.process('busy') is False
+        assert report_jobs.run_pending() == 1
+        stalled = db.session.get(ReportJob, 'stalled')
+        assert (stalled.status, stalled.attempts) == ('done', 1)
+
+
+def test_purge_removes_old_jobs_and_files(app, client, headers):
+    job_id = _submit(client, headers).get_json()['job']['id']
+    _wait(client, headers, job_id)
+    with app.app_context():
+        job = db.session.get(ReportJob, job_id)
+        job.created_at = datetime.utcnow() - timedelta(days=40)
+        db.session.commit()
+        path = report_jobs.cache.path(job.data_hash, job.format)
+    old = time.time() - 40 * 86400
+    os.utime(path, (old, old))
+
+    result = app.test_cli_runner().invoke(args=['reports', 'purge'])
+    assert 'Deleted 1 report jobs and 1 cached files' in result.output
+    assert not os.path.exists(path)
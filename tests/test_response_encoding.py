@@ -0,0 +1,62 @@
+import gzip
+import json
+from datetime import datetime, date
+from decimal import Decimal
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from conftest import save_score, sign_up
+
+
+def test_fast_provider_matches_the_stdlib(app):
+    pytest.importorskip('orjson')
+    assert app.json.fast
+    obj = {'b': [1, 2.5, None, True], 'a': {'when': datetime(2024, 5, 6, 7, 8, 9), 'day': date(2024, 5, 6)},
+           'amount': Decimal('1.50'), 'name': 'Zoë'}
+    stdlib = DefaultJSONProvider(app)
+    assert json.loads(app.json.dumps(obj)) == json.loads(stdlib.dumps(obj))
+    assert list(json.loads(app.json.dumps(obj))) == ['a', 'amount', 'b', 'name']
+    assert 'Zoë' in app.json.dumps(obj)
+
+
+def test_stdlib_fallback_when_disabled(make_app):
+    app = make_app(JSON_FAST_ENCODER=False)
+    assert not app.json.fast
+    assert app.json.dumps({'b': 1, 'a': 2}) == '{"a": 2, "b": 1}'
+
+
+def _scores(client, headers, encoding=None):
+    extra = {'Accept-Encoding': encoding} if encoding else {}
+    return client.get('/api/assessment/scores', headers={**headers, **extra})
+
+
+def test_large_bodies_are_compressed(client, headers):
+    for _ in range(20):
+        save_score(client, headers)
+    plain = _scores(client, headers)
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.data) >= 1024
+
+    compressed = _scores(client, headers, 'gzip')
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_brotli_is_preferred(client, headers):
+    brotli = pytest.importorskip('brotli')
+    for _ in range(20):
+        save_score(client, headers)
+    response = _scores(client, headers, 'gzip, br')
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == _scores(client, headers).data
+
+
+def test_small_bodies_are_left_alone(client, headers):
+    response = _scores(client, headers, 'gzip')
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compression_can_be_switched_off(make_app):
+    client = make_app(COMPRESS_RESPONSES=False, COMPRESS_MIN_SIZE=0).test_client()
+    headers = sign_up(client)[0]
+    assert 'Content-Encoding' not in _scores(client, headers, 'gzip').headers
@@ -0,0 +1,84 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from models import db, GameScore, GameScoreDaily, GameScoreArchive
+from leaderboard import leaderboards
+from retention import retention_cutoff
+import report_summary
+
+
+def _rounds(app, user_id, *rows):
+    """Insert (score, days ago) rounds of aqua_math directly, as if played back then"""
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all(GameScore(user_id=user_id, game_name='aqua_math', score=score,
+                                     created_at=now - timedelta(days=days_ago, seconds=i))
+                           for i, (score, days_ago) in enumerate(rows))
+        db.session.commit()
+
+
+def _compact(app, *args):
+    result = app.test_cli_runner().invoke(args=['assessment', 'compact-game-scores', '--days', '2', *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_retention_cutoff_is_the_start_of_a_day():
+    assert retention_cutoff(2, now=datetime(2024, 3, 10, 15, 30)) == datetime(2024, 3, 8)
+
+
+def test_old_rounds_roll_up_and_move_to_the_archive(app, register):
+    _, user_id, _ = register()
+    _rounds(app, user_id, (5, 10), (9, 10), (2, 10), (7, 20), (4, 0))
+    assert 'Compacted 4 game rounds into 2 daily rollups' in _compact(app)
+
+    with app.app_context():
+        assert [row.score for row in GameScore.query] == [4]
+        assert GameScoreArchive.query.count() == 4
+        day = GameScoreDaily.query.filter_by(day=(datetime.utcnow() - timedelta(days=10)).date()).one()
+        assert (day.rounds, day.total, day.best, day.worst, day.latest) == (3, 16, 9, 2, 5)
+
+    assert 'Compacted 0 game rounds' in _compact(app)
+
+
+def test_summary_and_leaderboard_survive_compaction(app, register):
+    _, user_id, _ = register()
+    _rounds(app, user_id, (30, 10), (12, 0))
+    with app.app_context():
+        before = report_summary.rebuild(user_id).get_games()
+    _compact(app)
+    with app.app_context():
+        assert report_summary.rebuild(user_id).get_games() == before
+        leaderboards.load()
+    assert leaderboards.rank('aqua_math', user_id)[1] == 30
+
+
+def test_history_pages_continue_into_rollups(app, client, register):
+    headers, user_id, _ = register()
+    _rounds(app, user_id, (1, 12), (2, 11), (3, 10), (4, 0))
+    _compact(app)
+
+    page = client.get('/api/assessment/game-scores', headers=headers, query_string={'limit': 2}).get_json()
+    assert [row['score'] for row in page['game_scores']] == [4]
+    assert len(page['daily']) == 2 and page['page']['daily_has_more']
+    rest = client.get('/api/assessment/game-scores', headers=headers,
+                      query_string={'limit': 2, 'daily_before': page['page']['daily_before']}).get_json()
+    assert rest['game_scores'] == [] and len(rest['daily']) == 1
+    assert [row['day'] for row in page['daily'] + rest['daily']] == sorted(
+        (row['day'] for row in page['daily'] + rest['daily']), reverse=True)
+
+
+def test_archive_to_gzipped_files(app, register, tmp_path):
+    _, user_id, _ = register()
+    _rounds(app, user_id, (8, 10))
+    _compact(app, '--archive-dir', str(tmp_path))
+    [path] = tmp_path.glob('game_scores_*.ndjson.gz')
+    with gzip.open(path, 'rt') as f:
+        assert [json.loads(line)['score'] for line in f] == [8]
+    with app.app_context():
+        assert GameScoreArchive.query.count() == 0
+
+
+def test_zero_days_is_refused(app):
+    result = app.test_cli_runner().invoke(args=['assessment', 'compact-game-scores', '--days', '0'])
+    assert result.exit_code != 0
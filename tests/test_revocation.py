@@ -0,0 +1,110 @@
+import uuid
+from datetime import datetime, timedelta
+from models import db, TokenFamily, TokenRevocation
+from revocation import BloomFilter, token_denylist
+from conftest import sign_up
+
+
+def _bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _login(client, username):
+    response = client.post('/api/auth/login', json={'username': username, 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _refresh(client, token):
+    return client.post('/api/auth/refresh', headers=_bearer(token))
+
+
+def _verified(client, token):
+    return client.get('/api/auth/verify', headers=_bearer(token)).status_code == 200
+
+
+def test_refresh_rotates_the_token(client, register):
+    _, _, body = register()
+    first = _refresh(client, body['refresh_token'])
+    assert first.status_code == 200
+    tokens = first.get_json()
+    assert _verified(client, tokens['access_token'])
+
+    # A retry of the just-rotated token is still answered, within the grace period
+    assert _refresh(client, body['refresh_token']).status_code == 200
+    assert _refresh(client, tokens['refresh_token']).status_code == 200
+
+
+def test_reusing_an_old_refresh_token_ends_the_sign_in(make_app):
+    client = make_app(JWT_REFRESH_REUSE_GRACE=0).test_client()
+    sign_up(client, 'reuser')
+    stolen = _login(client, 'reuser')
+    other = _login(client, 'reuser')
+    rotated = _refresh(client, stolen['refresh_token']).get_json()
+
+    response = _refresh(client, stolen['refresh_token'])
+    assert response.status_code == 401
+    assert not _verified(client, rotated['access_token'])
+    assert _refresh(client, rotated['refresh_token']).status_code == 401
+    assert _verified(client, other['access_token'])  # only that sign-in is revoked
+
+
+def test_logout_with_either_token(client, register):
+    headers, _, body = register()
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert not _verified(client, body['access_token'])
+    assert _refresh(client, body['refresh_token']).status_code == 401
+
+    _, _, body = register()
+    assert client.post('/api/auth/logout', headers=_bearer(body['refresh_token'])).status_code == 200
+    assert not _verified(client, body['access_token'])
+
+
+def test_revocations_from_other_workers_are_synced(app, register):
+    _, user_id, _ = register()
+    with app.app_context():
+        family = TokenFamily.query.filter_by(user_id=user_id).one()
+        assert not token_denylist.is_revoked(family.id)
+        # As another worker would: only the table row, not this process's denylist
+        now = datetime.utcnow()
+        db.session.add(TokenRevocation(family=family.id, user_id=user_id, reason='admin',
+                                       revoked_at=now, expires_at=now + timedelta(days=1)))
+        db.session.commit()
+        token_denylist.sync()  # the background thread may have got there first
+        assert token_denylist.is_revoked(family.id)
+        assert token_denylist.sync() == 0
+
+
+def test_rebuild_forgets_expired_revocations(app, register):
+    _, user_id, _ = register()
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.add_all([
+            TokenRevocation(family='expired', user_id=user_id, reason='logout',
+                            revoked_at=now - timedelta(days=40), expires_at=now - timedelta(days=10)),
+            TokenRevocation(family='live', user_id=user_id, reason='logout',
+                            revoked_at=now, expires_at=now + timedelta(days=30))
+        ])
+        db.session.commit()
+        token_denylist.rebuild()
+        assert token_denylist.is_revoked('live')
+        assert not token_denylist.is_revoked('expired')
+
+
+def test_cli_revokes_a_user_and_purges(app, client, register):
+    _, user_id, body = register()
+    runner = app.test_cli_runner()
+    assert f'Revoked 1 sign-ins of user {user_id}' in runner.invoke(args=['tokens', 'revoke-user', str(user_id)]).output
+    assert not _verified(client, body['access_token'])
+    assert 'Revoked 0 sign-ins' in runner.invoke(args=['tokens', 'revoke-user', str(user_id)]).output
+    assert 'Deleted 0 expired revocations and 0 expired sign-ins' in runner.invoke(args=['tokens', 'purge']).output
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    keys = [uuid.uuid4().hex for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
@@ -0,0 +1,58 @@
+import gzip
+import re
+from static_assets import StaticAssets, IMMUTABLE
+
+
+def _linked(html):
+    return re.findall(r'(?:src|href)="(/assets/[^"]+)"', html)
+
+
+def test_shell_links_hashed_assets(client):
+    shell = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert shell.status_code == 200
+    assert shell.headers['Cache-Control'] == 'no-cache'
+    html = shell.get_data(as_text=True)
+    links = _linked(html)
+    assert links
+
+    for link in links:
+        asset = client.get(link)
+        assert asset.status_code == 200
+        assert asset.headers['Cache-Control'] == IMMUTABLE
+        assert asset.mimetype in ('text/javascript', 'text/css')
+
+
+def test_build_only_moves_large_blocks():
+    assets = StaticAssets()
+    assets.path, assets.inline_max = 'page.html', 20
+    shell, built = assets.build('<style>a{}</style><script>' + 'let x = 1;' * 5 + '</script>')
+    html = shell.variants[None].decode('utf-8')
+    assert html.startswith('<style>a{}</style><script src="/assets/page.')
+    assert len(built) == 1
+    name, asset = next(iter(built.items()))
+    assert name == f'page.{asset.digest[:12]}.js'
+
+
+def test_precompressed_variants_and_revalidation(client):
+    link = _linked(client.get('/').get_data(as_text=True))[0]
+    plain = client.get(link)
+    gzipped = client.get(link, headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == plain.data
+    assert 'Accept-Encoding' in gzipped.headers['Vary']
+
+    shell = client.get('/')
+    again = client.get('/', headers={'If-None-Match': shell.headers['ETag']})
+    assert again.status_code == 304
+    assert client.get(link, headers={'If-None-Match': plain.headers['ETag'], 'Accept-Encoding': 'gzip'}).status_code == 304
+
+
+def test_unknown_assets_are_404(client):
+    assert client.get('/assets/index.000000000000.js').status_code == 404
+
+
+def test_build_assets_writes_compressed_files(app, tmp_path):
+    result = app.test_cli_runner().invoke(args=['build-assets', str(tmp_path)])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / 'index.html').exists() and (tmp_path / 'index.html.gz').exists()
+    assert list((tmp_path / 'assets').glob('*.js.gz'))
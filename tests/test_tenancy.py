@@ -0,0 +1,113 @@
+import sqlite3
+import pytest
+from models import db, Tenant
+from tenancy import tenant_router
+from write_buffer import game_score_buffer
+from conftest import save_profile, save_score, sign_up
+
+
+@pytest.fixture
+def make_tenant_app(make_app, tmp_path):
+    def make(**overrides):
+        return make_app(TENANT_SHARD_URL=f'sqlite:///{tmp_path}/shards/{{shard}}.db', TENANT_CACHE_TTL=0, **overrides)
+    yield make
+    # The router is shared by every app in the process; drop engines for this test's files
+    for engine in tenant_router._engines.values():
+        engine.dispose()
+    tenant_router._engines.clear()
+    tenant_router._tenants.clear()
+
+
+@pytest.fixture
+def app(make_tenant_app):
+    return make_tenant_app()
+
+
+def _cli(app, *args):
+    result = app.test_cli_runner().invoke(args=['tenants', *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def _count(path, table):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_school_data_lives_on_its_shard(app, client, tmp_path):
+    _cli(app, 'create', 'oak', '--name', 'Oak School')
+    headers, _, body = sign_up(client, school='oak')
+    assert body['user']['school'] == 'oak'
+    save_profile(client, headers)
+    save_score(client, headers)
+    client.post('/api/assessment/game-score', headers=headers, json={'game_name': 'aqua_math', 'score': 5})
+
+    shard = tmp_path / 'shards' / 'oak.db'
+    assert _count(shard, 'assessment_scores') == 1 and _count(shard, 'game_scores') == 1
+    assert _count(tmp_path / 'test.db', 'assessment_scores') == 0
+    assert _count(tmp_path / 'test.db', 'users') == 1
+
+    report = client.get('/api/assessment/report', headers=headers).get_json()
+    assert report['profile']['child_name'] == 'Sam'
+    assert report['summary']['games']['aqua_math']['rounds'] == 1
+
+
+def test_unknown_school_is_refused(client):
+    response = client.post('/api/auth/register', json={'username': 'x', 'email': 'x@example.com',
+                                                        'password': 'secret123', 'school': 'nowhere'})
+    assert response.status_code == 400
+
+
+def test_moving_school_answers_503(app, client):
+    _cli(app, 'create', 'oak')
+    headers = sign_up(client, school='oak')[0]
+    with app.app_context():
+        db.session.get(Tenant, 'oak').status = 'moving'
+        db.session.commit()
+    response = client.get('/api/assessment/report', headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_move_copies_rows_and_switches_over(app, client, tmp_path):
+    _cli(app, 'create', 'oak')
+    headers = sign_up(client, school='oak')[0]
+    score = save_score(client, headers)
+
+    output = _cli(app, 'move', 'oak', 'oak-2', '--wait', '0')
+    assert 'assessment_scores        1 rows' in output
+    assert _count(tmp_path / 'shards' / 'oak.db', 'assessment_scores') == 0
+    assert _count(tmp_path / 'shards' / 'oak-2.db', 'assessment_scores') == 1
+
+    scores = client.get('/api/assessment/scores', headers=headers).get_json()['scores']
+    assert [row['id'] for row in scores] == [score['id']]
+    assert 'oak-2' in _cli(app, 'list')
+
+
+def test_assign_then_move_keeps_buffered_writes(make_tenant_app, tmp_path):
+    app = make_tenant_app(GAME_SCORE_DURABILITY='async', GAME_SCORE_FLUSH_INTERVAL=60)
+    client = app.test_client()
+    headers, user_id, _ = sign_up(client)
+    client.get('/api/auth/verify', headers=headers)  # caches the user without a school
+    _cli(app, 'create', 'legacy', '--shard', 'primary')
+    client.post('/api/assessment/game-score', headers=headers, json={'game_name': 'aqua_math', 'score': 9})
+
+    assert 'Assigned 1 users' in _cli(app, 'assign', 'legacy', str(user_id))
+    assert client.get('/api/auth/verify', headers=headers).get_json()['user']['school'] == 'legacy'
+    _cli(app, 'move', 'legacy', 'legacy-shard', '--wait', '0')
+
+    assert game_score_buffer.flush() == 0  # flushed to the primary before the move
+    assert _count(tmp_path / 'shards' / 'legacy-shard.db', 'game_scores') == 1
+
+
+def test_bad_names_and_duplicate_schools(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            tenant_router.create_tenant('Bad Name')
+        tenant_router.create_tenant('oak')
+        with pytest.raises(ValueError, match='already exists'):
+            tenant_router.create_tenant('oak')
+        assert tenant_router.shards() == [None, 'oak']
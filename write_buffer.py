@@ -0,0 +1,165 @@
+from sqlalchemy import insert
+from flask import g, has_app_context
+from models import db, GameScore
+from tenancy import tenant_router
+from datetime import datetime
+import threading
+import logging
+import atexit
+import os
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('immediate', 'group', 'async')
+
+
+class PendingWrite:
+    """A buffered row; `done` is set once the batch holding it has been committed"""
+    __slots__ = ('row', 'shard', 'id', 'error', 'done')
+
+    def __init__(self, row, shard=None):
+        self.row = row
+        self.shard = shard  # tenant shard of the submitting request (None = primary)
+        self.id = None
+        self.error = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {'id': self.id}
+        data.update({k: v for k, v in self.row.items() if k != 'user_id'})
+        data['created_at'] = self.row['created_at'].isoformat()
+        return data
+
+
+class WriteBehindBuffer:
+    """Group inserts for one model across requests and commit them in a single transaction.
+
+    Durability modes:
+      immediate - insert and commit inside the calling request (no buffering)
+      group     - buffer, but the caller blocks until its batch is committed
+      async     - buffer and return at once; rows pending at a crash are lost
+    """
+
+    def __init__(self, model, config_prefix):
+        self.model = model
+        self.config_prefix = config_prefix
+        self.durability = 'immediate'
+        self.flush_interval = 0.05
+        self.batch_size = 200
+        self.flush_hooks = []  # called with the batch inside the insert transaction
+        self.commit_hooks = []  # called with the batch once it is committed
+        self._app = None
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """Read buffer settings from the app config and flush on interpreter exit"""
+        prefix = self.config_prefix
+        durability = app.config.get(f'{prefix}_DURABILITY', self.durability)
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"{prefix}_DURABILITY must be one of {DURABILITY_MODES}, got {durability!r}")
+        self.durability = durability
+        self.flush_interval = float(app.config.get(f'{prefix}_FLUSH_INTERVAL', self.flush_interval))
+        self.batch_size = int(app.config.get(f'{prefix}_FLUSH_BATCH_SIZE', self.batch_size))
+        self._app = app
+        atexit.register(self.flush)
+
+    def submit(self, rows):
+        """Queue rows for insertion and return their PendingWrite handles"""
+        now = datetime.utcnow()
+        shard = g.get('db_shard') if has_app_context() else None
+        pending = []
+        for row in rows:
+            row.setdefault('created_at', now)
+            pending.append(PendingWrite(row, shard))
+
+        if self.durability == 'immediate':
+            self._write(pending)
+            self._raise_on_error(pending)
+            return pending
+
+        self._ensure_worker()
+        with self._cond:
+            self._pending.extend(pending)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+        if self.durability == 'group':
+            timeout = self.flush_interval + 30
+            for p in pending:
+                if not p.done.wait(timeout):
+                    raise TimeoutError('Timed out waiting for buffered write to commit')
+            self._raise_on_error(pending)
+        return pending
+
+    def flush(self):
+        """Commit everything currently buffered; returns the number of rows written"""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch or self._app is None:
+                return 0
+            by_shard = {}
+            for p in batch:
+                by_shard.setdefault(p.shard, []).append(p)
+            with self._app.app_context():
+                for shard, rows in by_shard.items():
+                    with tenant_router.use_shard(shard):
+                        self._write(rows)
+            return len(batch)
+
+    def _write(self, batch):
+        try:
+            stmt = insert(self.model).returning(self.model.id, sort_by_parameter_order=True)
+            ids = db.session.execute(stmt, [p.row for p in batch]).scalars().all()
+            for hook in self.flush_hooks:
+                hook(batch)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Write-behind flush of {len(batch)} {self.model.__tablename__} rows failed: {e}")
+            for p in batch:
+                p.error = e
+        else:
+            for p, row_id in zip(batch, ids):
+                p.id = row_id
+            for hook in self.commit_hooks:
+                try:
+                    hook(batch)
+                except Exception as e:
+                    logger.error(f"Write-behind commit hook failed: {e}")
+        finally:
+            for p in batch:
+                p.done.set()
+
+    def _raise_on_error(self, pending):
+        for p in pending:
+            if p.error is not None:
+                raise p.error
+
+    def _ensure_worker(self):
+        # Started lazily (and restarted after fork) so gunicorn workers each own a flusher
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'{self.model.__tablename__}-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flusher error: {e}")
+
+
+game_score_buffer = WriteBehindBuffer(GameScore, 'GAME_SCORE')